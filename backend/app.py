@@ -1,22 +1,150 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, g, request, jsonify, send_file
 from flask_cors import CORS
+import io
 import os
 import tempfile
+import time
+import uuid
+import zipfile
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
-from bpmn_converter import BPMNConverter
+from bpmn_converter import (BPMNConverter, STREAMING_THRESHOLD, convert_document, validate_document,
+                            validate_schema_document)
+from bpmn_export import GRAPH_FORMATS
+from bpmn_schema import preload_schemas
+from batch_converter import ArchiveTooLargeError, BatchConverter, extract_archive
+from chunked_upload import (ChunkedUploadStore, UploadError, UploadNotFoundError, UploadOffsetError,
+                            UploadTooLargeError, open_decompressed)
+from job_queue import MAX_DECOMPRESSED_SIZE, ConversionJobQueue, QueueFullError
+from metrics import MetricsRegistry, SharedMetrics
+from resource_limits import LimitExceededError, ResourceLimits, check_document, run_limited, start_sandbox
+from result_cache import ResultCache
+from response_stream import (ConversionStream, compress_bytes, compress_chunks, iter_file, negotiate_encoding,
+                             tee_chunks)
 import traceback
+from typing import Optional
 
 app = Flask(__name__)
 CORS(app)
 
 # Конфигурация
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# Максимальный размер запроса (BPMN_MAX_UPLOAD_MB, по умолчанию 16MB)
+MAX_UPLOAD_SIZE = int(os.environ.get('BPMN_MAX_UPLOAD_MB', 16)) * 1024 * 1024
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_SIZE
 UPLOAD_FOLDER = 'uploads'
 OUTPUT_FOLDER = 'outputs'
 
-# Создаём папки если их нет
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+# Метрики сервиса (отдаются в формате Prometheus на /api/metrics)
+metrics = MetricsRegistry()
+# Каталог снимков метрик рабочих процессов gunicorn (задается в gunicorn.conf.py);
+# без него /api/metrics отдает метрики одного процесса
+METRICS_FOLDER = os.environ.get('BPMN_METRICS_DIR')
+
+# Пакетная конвертация: столько файлов обрабатывается одновременно (по умолчанию - по числу ядер;
+# при нескольких процессах сервиса ядра делятся через BPMN_BATCH_WORKERS)
+BATCH_WORKERS = int(os.environ.get('BPMN_BATCH_WORKERS', 0)) or None
+
+# Очередь фоновых конвертаций: 2 исполнителя, не более 16 активных заданий
+JOB_WORKERS = 2
+JOB_QUEUE_SIZE = 16
+# Состояние заданий на диске: статус виден из любого процесса сервиса
+JOB_STATE_FOLDER = os.path.join(OUTPUT_FOLDER, 'jobs')
+
+# Кэш результатов: 64MB в памяти и дисковый уровень в outputs/cache
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_DISK_FOLDER = os.path.join(OUTPUT_FOLDER, 'cache')
+
+# Загрузки по частям: каждая порция - отдельный запрос не больше MAX_CONTENT_LENGTH,
+# вся загрузка - до 1GB; незавершенные удаляются через сутки
+CHUNKED_UPLOAD_FOLDER = os.path.join(UPLOAD_FOLDER, 'chunks')
+CHUNKED_UPLOAD_MAX_SIZE = 1024 * 1024 * 1024
+# Объем распакованных данных, по которому при завершении загрузки проверяется сжатый файл
+UPLOAD_PROBE_SIZE = 64 * 1024
+
+# Результат конвертации держится в памяти до этого размера, больше - во временном файле
+RESPONSE_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+# Бюджет обработки одного запроса /api/convert, /api/validate и файла /api/convert/batch
+# (переменные BPMN_MAX_*): вложенность, число элементов и атрибутов проверяются до разбора,
+# время и память - в изолированном процессе. Документы больше бюджета - через /api/uploads и /api/jobs
+request_limits = ResourceLimits.from_env()
+
+# Бюджет фонового задания (BPMN_JOB_MAX_ELEMENTS, BPMN_JOB_MAX_SECONDS): больше документы
+# и время, вложенность, атрибуты и память - как у запроса
+job_limits = ResourceLimits.from_env('BPMN_JOB_', max_elements=50000000, max_seconds=3600)
+
+# Тип содержимого ответа /api/convert по формату результата
+OUTPUT_MIMETYPES = {
+    'xml': 'application/xml',
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson'
+}
+
+# Службы процесса создаются в create_app, а не при импорте модуля: каталоги, пулы
+# и потоки появляются только в процессе, который будет обслуживать запросы
+batch_converter: Optional[BatchConverter] = None
+job_queue: Optional[ConversionJobQueue] = None
+result_cache: Optional[ResultCache] = None
+upload_store: Optional[ChunkedUploadStore] = None
+shared_metrics: Optional[SharedMetrics] = None
+
+# Небольшой документ для прогрева конвертера
+WARMUP_DOCUMENT = (b'<definitions xmlns="http://www.omg.org/BPMN20/2009/10/1.0" targetNamespace="warmup">'
+                   b'<process id="warmup"><startEvent id="start"/><task id="task"/>'
+                   b'<sequenceFlow id="flow" sourceRef="start" targetRef="task"/></process></definitions>')
+
+def warm_up():
+    """Подготовка процесса до первого запроса: схемы, XML бэкенд, таблицы и кэши конвертера"""
+    # XSD схемы компилируются один раз и используются всеми запросами процесса
+    preload_schemas()
+    converter = BPMNConverter()
+    converter.validate_bpmn(io.BytesIO(WARMUP_DOCUMENT))
+    converter.convert_bytes(WARMUP_DOCUMENT)
+    converter.convert_bytes(WARMUP_DOCUMENT, streaming=True)
+
+def update_process_gauges():
+    """Показатели, относящиеся к текущему процессу: кэш в памяти и задания"""
+    metrics.set_gauge('bpmn_cache_bytes', result_cache.memory_bytes, tier='memory')
+    for status, count in job_queue.stats().items():
+        if status != 'capacity':
+            metrics.set_gauge('bpmn_jobs', count, status=status)
+
+def create_app():
+    """Фабрика приложения: каталоги, службы процесса и прогрев.
+
+    Вызывается в каждом рабочем процессе gunicorn (wsgi_app = 'app:create_app()')
+    и при запуске сервера разработки; повторный вызов возвращает готовое приложение"""
+    global batch_converter, job_queue, result_cache, upload_store, shared_metrics
+    if batch_converter is not None:
+        return app
+
+    # Создаём папки если их нет
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+
+    # Сервер изолированных процессов запускается до потоков процесса
+    start_sandbox()
+    batch_converter = BatchConverter(max_workers=BATCH_WORKERS, limits=request_limits)
+    job_queue = ConversionJobQueue(max_workers=JOB_WORKERS, max_pending=JOB_QUEUE_SIZE, metrics=metrics,
+                                   state_dir=JOB_STATE_FOLDER, limits=job_limits)
+    result_cache = ResultCache(max_bytes=CACHE_MAX_BYTES, disk_dir=CACHE_DISK_FOLDER)
+    upload_store = ChunkedUploadStore(CHUNKED_UPLOAD_FOLDER, max_size=CHUNKED_UPLOAD_MAX_SIZE)
+    if METRICS_FOLDER:
+        shared_metrics = SharedMetrics(metrics, METRICS_FOLDER, refresh=update_process_gauges)
+        shared_metrics.start()
+
+    warm_up()
+    return app
+
+def shutdown():
+    """Плавная остановка: ожидание фоновых заданий, остановка пула пакетной конвертации
+    и последний снимок метрик процесса"""
+    if job_queue is not None:
+        job_queue.shutdown()
+    if batch_converter is not None:
+        batch_converter.shutdown()
+    if shared_metrics is not None:
+        shared_metrics.stop()
 
 ALLOWED_EXTENSIONS = {'xml', 'bpmn'}
 
@@ -24,11 +152,121 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def form_flag(name, default=False):
+    """Булев параметр запроса (форма или query string)"""
+    value = request.values.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes')
+
+def read_upload(file):
+    """Чтение загруженного файла с замером фазы загрузки"""
+    with metrics.timer('bpmn_phase_duration_seconds', phase='upload'):
+        return file.read()
+
+def upload_stream(file):
+    """Поток загруженного файла и его размер (позиция - в начале)"""
+    with metrics.timer('bpmn_phase_duration_seconds', phase='upload'):
+        stream = file.stream
+        size = stream.seek(0, io.SEEK_END)
+        stream.seek(0)
+    return stream, size
+
+def cache_lookup(key, kind):
+    """Поиск результата в кэше с учётом попаданий в метриках"""
+    cached = result_cache.get(key)
+    metrics.inc('bpmn_cache_events_total', kind=kind, event='miss' if cached is None else 'hit')
+    return cached
+
+def record_error(stage, error):
+    """Учёт внутренней ошибки обработчика"""
+    metrics.inc('bpmn_errors_total', stage=stage, type=type(error).__name__)
+
+def limit_response(error):
+    """Ответ на превышение бюджета запроса: 422 - недопустимая структура, 413 - слишком большой документ"""
+    metrics.inc('bpmn_limit_rejections_total', limit=error.kind)
+    return jsonify({'error': str(error), 'limit': error.kind}), error.status
+
+def run_conversion(output, source, method, *args):
+    """Конвертация методом BPMNConverter в изолированном процессе в пределах бюджета запроса"""
+    result = run_limited(convert_document, (source, method, *args), output, request_limits)
+    metrics.merge(result['metrics'])
+    return result['success']
+
+def run_schema_check(source, lazy):
+    """Проверка по схеме BPMN 2.0 в изолированном процессе в пределах бюджета запроса"""
+    result = run_limited(validate_schema_document, (source, '2.0', lazy), None, request_limits)
+    metrics.merge(result['metrics'])
+    return result['result']
+
+def xml_download(body, filename, encoding, mimetype='application/xml'):
+    """Ответ с XML для скачивания; body - байты или итератор порций (уже в кодировке encoding)"""
+    response = app.response_class(body, mimetype=mimetype)
+    response.headers.set('Content-Disposition', 'attachment', filename=filename)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+def send_xml(source, filename, encoding, mimetype='application/xml'):
+    """XML для скачивания со сжатием encoding; source - байты, путь или бинарный поток"""
+    if encoding == 'identity':
+        if isinstance(source, bytes):
+            source = io.BytesIO(source)
+        response = send_file(source, as_attachment=True, download_name=filename, mimetype=mimetype)
+        response.vary.add('Accept-Encoding')
+        return response
+    if isinstance(source, bytes):
+        return xml_download(compress_bytes(source, encoding), filename, encoding, mimetype)
+    if isinstance(source, str):
+        source = open(source, 'rb')
+    return xml_download(compress_chunks(iter_file(source), encoding), filename, encoding, mimetype)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    """Учёт количества и длительности HTTP запросов"""
+    # Шаблон маршрута, а не путь: идентификаторы заданий не размножают серии
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.inc('bpmn_http_requests_total', endpoint=endpoint, method=request.method,
+                status=response.status_code)
+    started = g.get('request_started')
+    if started is not None:
+        metrics.observe('bpmn_http_request_duration_seconds', time.perf_counter() - started,
+                        endpoint=endpoint)
+    return response
+
+@app.errorhandler(413)
+def request_too_large(error):
+    """Тело запроса больше MAX_CONTENT_LENGTH"""
+    return jsonify({'error': f'Файл больше {MAX_UPLOAD_SIZE // (1024 * 1024)} МБ. '
+                             f'Крупные файлы загружаются по частям через /api/uploads'}), 413
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Проверка работоспособности сервиса"""
     return jsonify({'status': 'OK', 'message': 'BPMN Converter Service is running'})
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Метрики сервиса в текстовом формате Prometheus (сумма по всем рабочим процессам)"""
+    if shared_metrics is not None:
+        registry = shared_metrics.collect()
+    else:
+        update_process_gauges()
+        registry = metrics
+    # Дисковый кэш общий для процессов, поэтому его объем не суммируется
+    registry.set_gauge('bpmn_cache_bytes', result_cache.stats()['disk_bytes'], tier='disk')
+    return app.response_class(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Статистика кэша результатов"""
+    return jsonify(result_cache.stats())
+
 @app.route('/api/convert', methods=['POST'])
 def convert_bpmn():
     """Конвертация BPMN файла"""
@@ -42,35 +280,372 @@ def convert_bpmn():
         
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            input_path = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(input_path)
+            source, size = upload_stream(file)
             
-            # Конвертация
-            converter = BPMNConverter()
+            # Формат результата: BPMN 2.0 XML или граф процессов (JSON, NDJSON)
+            output_format = request.values.get('format', 'xml').lower()
+            if output_format not in OUTPUT_MIMETYPES:
+                return jsonify({'error': f'Неизвестный формат результата: {output_format}. '
+                                         f'Допустимы: {", ".join(OUTPUT_MIMETYPES)}'}), 400
+            mimetype = OUTPUT_MIMETYPES[output_format]
             
             # Определяем выходное имя файла
-            output_filename = f"converted_{filename}"
-            output_path = os.path.join(OUTPUT_FOLDER, output_filename)
+            if output_format in GRAPH_FORMATS:
+                output_filename = f"converted_{filename.rsplit('.', 1)[0]}.{output_format}"
+            else:
+                output_filename = f"converted_{filename}"
+            
+            streaming = form_flag('streaming') or size > STREAMING_THRESHOLD
+            pretty = form_flag('pretty', default=True)
+            # Строгая проверка результата по схеме BPMN 2.0
+            validate_output = form_flag('validate')
+            if validate_output and output_format in GRAPH_FORMATS:
+                return jsonify({'error': 'Проверка по схеме доступна только для результата в формате xml'}), 400
             
-            # Выполняем конвертацию
-            success = converter.convert_to_bpmn20(input_path, output_path)
+            # Сжатие ответа по Accept-Encoding
+            encoding = negotiate_encoding(request.accept_encodings)
+            
+            # Файлы, уже переведенные в BPMN 2.0, возвращаются без разбора и без кэша:
+            # хэш для ключа кэша стоил бы столько же, сколько само копирование
+            converter = BPMNConverter(metrics=metrics)
+            if output_format == 'xml' and converter.is_bpmn20(source):
+                if validate_output:
+                    check_document(source, request_limits)
+                    schema_result = run_schema_check(source, streaming)
+                    if schema_result['schema_valid'] is False:
+                        return jsonify({'error': 'Файл не соответствует схеме BPMN 2.0', **schema_result}), 422
+                    source.seek(0)
+                metrics.inc('bpmn_conversions_total', mode='passthrough', result='success')
+                # Ответ забирает поток загрузки себе: Flask закрывает файлы запроса до отправки
+                # тела ответа. Загрузка на диске без сжатия отдается сервером через sendfile
+                # (wsgi.file_wrapper)
+                file.stream = io.BytesIO()
+                return send_xml(source, output_filename, encoding)
+            
+            # Повторный запрос с тем же содержимым отдаётся из кэша без разбора
+            if output_format in GRAPH_FORMATS:
+                cache_key = ResultCache.make_key(source, 'graph', format=output_format)
+            else:
+                cache_key = ResultCache.make_key(source, 'convert', pretty=pretty, streaming=streaming,
+                                                 validate=validate_output)
+            cached = cache_lookup(cache_key, 'convert')
+            if cached is not None:
+                return send_xml(cached, output_filename, encoding, mimetype)
+            
+            # Документ сверх бюджета отклоняется до разбора
+            check_document(source, request_limits)
+            
+            # Граф процессов пишется по мере конвертации, без промежуточного XML;
+            # крупные файлы (и граф крупного файла) - потоково, без дерева документа
+            if output_format in GRAPH_FORMATS:
+                method, args = 'export_graph', (output_format, streaming)
+            elif streaming:
+                method, args = 'convert_to_bpmn20_streaming', (pretty,)
+            else:
+                method, args = 'convert_to_bpmn20', (pretty,)
+            
+            if not validate_output:
+                # Результат передается клиенту по мере сериализации: поток загрузки
+                # переходит к конвертации, которая идет во время отправки ответа
+                file.stream = io.BytesIO()
+                
+                def produce(output):
+                    try:
+                        return run_conversion(output, source, method, *args)
+                    finally:
+                        source.close()
+                
+                stream = ConversionStream(produce)
+                if not stream.start():
+                    if isinstance(stream.exception, LimitExceededError):
+                        return limit_response(stream.exception)
+                    return jsonify({'error': 'Ошибка конвертации BPMN'}), 500
+                # Результат до max_item_bytes попадает в кэш после успешной отправки
+                chunks = tee_chunks(stream, result_cache.max_item_bytes,
+                                    lambda result: result_cache.put(cache_key, result))
+                return xml_download(compress_chunks(chunks, encoding), output_filename, encoding, mimetype)
+            
+            # С проверкой по схеме результат нужен целиком до ответа:
+            # конвертация из потока запроса в буфер, без промежуточных файлов
+            output = tempfile.SpooledTemporaryFile(max_size=RESPONSE_SPOOL_MAX_SIZE)
+            
+            try:
+                success = run_conversion(output, source, method, *args)
+            except LimitExceededError:
+                output.close()
+                raise
             
             if success:
+                output_size = output.tell()
+                output.seek(0)
+                try:
+                    schema_result = run_schema_check(output, streaming)
+                except LimitExceededError:
+                    output.close()
+                    raise
+                if schema_result['schema_valid'] is False:
+                    output.close()
+                    return jsonify({'error': 'Результат конвертации не соответствует схеме BPMN 2.0',
+                                    **schema_result}), 422
+                output.seek(0)
+                if output_size <= result_cache.max_item_bytes:
+                    result = output.read()
+                    output.close()
+                    result_cache.put(cache_key, result)
+                    return send_xml(result, output_filename, encoding)
+                
                 # Возвращаем результат
-                return send_file(output_path, 
-                               as_attachment=True, 
-                               download_name=output_filename,
-                               mimetype='application/xml')
+                return send_xml(output, output_filename, encoding)
             else:
+                output.close()
                 return jsonify({'error': 'Ошибка конвертации BPMN'}), 500
         else:
             return jsonify({'error': 'Недопустимый формат файла. Разрешены только .xml и .bpmn'}), 400
             
+    except LimitExceededError as e:
+        return limit_response(e)
+    except RequestEntityTooLarge as e:
+        return request_too_large(e)
     except Exception as e:
+        record_error('convert', e)
         app.logger.error(f'Ошибка при конвертации: {str(e)}')
         app.logger.error(traceback.format_exc())
         return jsonify({'error': f'Внутренняя ошибка сервера: {str(e)}'}), 500
 
+@app.route('/api/convert/batch', methods=['POST'])
+def convert_batch():
+    """Пакетная конвертация BPMN файлов"""
+    try:
+        files = [(file.filename, read_upload(file))
+                 for file in request.files.getlist('files') if file.filename]
+        
+        # Файлы также можно передать одним zip архивом
+        archive = request.files.get('archive')
+        if archive and archive.filename:
+            files.extend(extract_archive(archive.stream))
+        
+        if not files:
+            return jsonify({'error': 'Файлы не найдены'}), 400
+        
+        # Каждый файл конвертируется в изолированном процессе в пределах бюджета запроса
+        results = batch_converter.convert(files, allowed_file, pretty=form_flag('pretty', default=True))
+        for result in results:
+            metrics.inc('bpmn_conversions_total', mode='batch', result=result['status'])
+            if 'limit' in result:
+                metrics.inc('bpmn_limit_rejections_total', limit=result['limit'])
+        
+        output = io.BytesIO()
+        batch_converter.write_archive(results, output)
+        output.seek(0)
+        
+        return send_file(output,
+                       as_attachment=True,
+                       download_name='converted_bpmn.zip',
+                       mimetype='application/zip')
+            
+    except zipfile.BadZipFile:
+        return jsonify({'error': 'Архив повреждён или не является zip файлом'}), 400
+    except ArchiveTooLargeError as e:
+        return jsonify({'error': str(e)}), 413
+    except RequestEntityTooLarge as e:
+        return request_too_large(e)
+    except Exception as e:
+        record_error('batch', e)
+        app.logger.error(f'Ошибка при пакетной конвертации: {str(e)}')
+        app.logger.error(traceback.format_exc())
+        return jsonify({'error': f'Внутренняя ошибка сервера: {str(e)}'}), 500
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Постановка файла в очередь фоновой конвертации"""
+    try:
+        if 'file' not in request.files:
+            return jsonify({'error': 'Файл не найден'}), 400
+        
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'error': 'Файл не выбран'}), 400
+        
+        if not allowed_file(file.filename):
+            return jsonify({'error': 'Недопустимый формат файла. Разрешены только .xml и .bpmn'}), 400
+        
+        filename = secure_filename(file.filename)
+        # Уникальный префикс исключает коллизии одноимённых загрузок
+        prefix = uuid.uuid4().hex
+        input_path = os.path.join(UPLOAD_FOLDER, f'{prefix}_{filename}')
+        output_path = os.path.join(OUTPUT_FOLDER, f'{prefix}_converted_{filename}')
+        file.save(input_path)
+        
+        # Документ сверх бюджета задания отклоняется сразу, а не после ожидания в очереди
+        try:
+            with open(input_path, 'rb') as source:
+                check_document(source, job_limits)
+        except LimitExceededError as e:
+            os.remove(input_path)
+            return limit_response(e)
+        
+        try:
+            job = job_queue.submit(filename, input_path, output_path, pretty=form_flag('pretty', default=True))
+        except QueueFullError as e:
+            metrics.inc('bpmn_errors_total', stage='jobs', type='QueueFullError')
+            os.remove(input_path)
+            response = jsonify({'error': str(e)})
+            response.headers['Retry-After'] = '5'
+            return response, 429
+        
+        return jsonify(job_response(job)), 202
+            
+    except RequestEntityTooLarge as e:
+        return request_too_large(e)
+    except Exception as e:
+        record_error('jobs', e)
+        app.logger.error(f'Ошибка при постановке задания: {str(e)}')
+        app.logger.error(traceback.format_exc())
+        return jsonify({'error': f'Внутренняя ошибка сервера: {str(e)}'}), 500
+
+def job_response(job):
+    """Состояние поставленного задания со ссылками на статус и результат"""
+    result = job.to_dict()
+    result['status_url'] = f'/api/jobs/{job.id}'
+    result['result_url'] = f'/api/jobs/{job.id}/result'
+    return result
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Статус и прогресс задания"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Задание не найдено'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """Скачивание результата завершённого задания"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Задание не найдено'}), 404
+    if job.status == 'failed':
+        return jsonify({'error': f'Ошибка конвертации BPMN: {job.error}'}), 500
+    if job.status != 'completed':
+        return jsonify({'error': 'Конвертация ещё не завершена', 'status': job.status}), 409
+    
+    return send_xml(os.path.abspath(job.output_path), f'converted_{job.filename}',
+                    negotiate_encoding(request.accept_encodings))
+
+def upload_response(state):
+    """Состояние загрузки по частям для ответа API"""
+    result = {name: state[name] for name in ('upload_id', 'filename', 'size', 'offset', 'encoding')}
+    result['upload_url'] = f'/api/uploads/{state["upload_id"]}'
+    result['finalize_url'] = f'/api/uploads/{state["upload_id"]}/finalize'
+    return result
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """Начало загрузки по частям"""
+    try:
+        filename = secure_filename(request.values.get('filename', ''))
+        if not filename:
+            return jsonify({'error': 'Не указано имя файла'}), 400
+        if not allowed_file(filename):
+            return jsonify({'error': 'Недопустимый формат файла. Разрешены только .xml и .bpmn'}), 400
+        
+        size = request.values.get('size')
+        encoding = request.values.get('encoding', 'auto')
+        state = upload_store.create(filename, int(size) if size else None, encoding)
+        return jsonify(upload_response(state)), 201
+    
+    except ValueError:
+        return jsonify({'error': 'Размер загрузки должен быть целым числом'}), 400
+    except UploadTooLargeError as e:
+        return jsonify({'error': str(e)}), 413
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        record_error('uploads', e)
+        app.logger.error(f'Ошибка при создании загрузки: {str(e)}')
+        return jsonify({'error': f'Внутренняя ошибка сервера: {str(e)}'}), 500
+
+@app.route('/api/uploads/<upload_id>', methods=['GET', 'PATCH', 'DELETE'])
+def upload_chunk(upload_id):
+    """Состояние загрузки (GET), очередная порция (PATCH) или отмена (DELETE)"""
+    try:
+        if request.method == 'GET':
+            return jsonify(upload_response(upload_store.status(upload_id)))
+        if request.method == 'DELETE':
+            upload_store.remove(upload_id)
+            return '', 204
+        
+        # Порция - тело запроса целиком, смещение - в заголовке Upload-Offset
+        offset = request.headers.get('Upload-Offset', request.args.get('offset'))
+        if offset is None:
+            return jsonify({'error': 'Не указано смещение порции (заголовок Upload-Offset)'}), 400
+        with metrics.timer('bpmn_phase_duration_seconds', phase='upload'):
+            state = upload_store.append(upload_id, int(offset), request.stream)
+        return jsonify(upload_response(state))
+    
+    except ValueError:
+        return jsonify({'error': 'Смещение порции должно быть целым числом'}), 400
+    except UploadNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except UploadOffsetError as e:
+        return jsonify({'error': str(e), 'offset': e.offset}), 409
+    except UploadTooLargeError as e:
+        return jsonify({'error': str(e)}), 413
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    except RequestEntityTooLarge as e:
+        return request_too_large(e)
+    except Exception as e:
+        record_error('uploads', e)
+        app.logger.error(f'Ошибка при приёме порции: {str(e)}')
+        return jsonify({'error': f'Внутренняя ошибка сервера: {str(e)}'}), 500
+
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    """Завершение загрузки по частям и постановка конвертации в очередь"""
+    try:
+        state = upload_store.finish(upload_id)
+        filename = state['filename']
+        output_path = os.path.join(OUTPUT_FOLDER, f'{upload_id}_converted_{filename}')
+        
+        # Поврежденный сжатый файл отклоняется сразу по началу данных, загрузка удаляется.
+        # Бюджет задания проверяется при конвертации: разбор большого файла не умещается в запрос
+        try:
+            with open_decompressed(state['part_path'], state['encoding'], MAX_DECOMPRESSED_SIZE) as source:
+                source.read(UPLOAD_PROBE_SIZE)
+        except UploadError:
+            upload_store.remove(upload_id)
+            raise
+        
+        # Файл порций становится входным файлом задания; сжатый распаковывается
+        # потоково в фоне перед конвертацией
+        try:
+            job = job_queue.submit(filename, state['part_path'], output_path,
+                                   pretty=form_flag('pretty', default=True), encoding=state['encoding'])
+        except QueueFullError as e:
+            # Загрузка сохраняется: завершение можно повторить позже
+            metrics.inc('bpmn_errors_total', stage='jobs', type='QueueFullError')
+            response = jsonify({'error': str(e)})
+            response.headers['Retry-After'] = '5'
+            return response, 429
+        upload_store.release(upload_id)
+        
+        return jsonify(job_response(job)), 202
+    
+    except UploadNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except UploadOffsetError as e:
+        return jsonify({'error': str(e), 'offset': e.offset}), 409
+    except UploadTooLargeError as e:
+        return jsonify({'error': str(e)}), 413
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        record_error('uploads', e)
+        app.logger.error(f'Ошибка при завершении загрузки: {str(e)}')
+        app.logger.error(traceback.format_exc())
+        return jsonify({'error': f'Внутренняя ошибка сервера: {str(e)}'}), 500
+
 @app.route('/api/validate', methods=['POST'])
 def validate_bpmn():
     """Валидация BPMN файла"""
@@ -83,24 +658,48 @@ def validate_bpmn():
             return jsonify({'error': 'Файл не выбран'}), 400
         
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            temp_path = os.path.join(tempfile.gettempdir(), filename)
-            file.save(temp_path)
+            source, size = upload_stream(file)
+            
+            # Быстрая проверка: версия по началу файла, без разбора и без кэша
+            # (хэш для ключа кэша читает файл целиком)
+            if form_flag('quick'):
+                converter = BPMNConverter(metrics=metrics)
+                return jsonify(converter.validate_bpmn(source, quick=True))
+            
+            schema = form_flag('schema')
+            # Крупные файлы проверяются по схеме потоково
+            lazy = form_flag('lazy') or size > STREAMING_THRESHOLD
+            # Проверка ссылочной целостности процессов (integrity=0 - отключить)
+            integrity = form_flag('integrity', default=True)
             
-            # Валидация
-            converter = BPMNConverter()
-            validation_result = converter.validate_bpmn(temp_path)
+            # Повторная валидация того же содержимого отдаётся из кэша
+            cache_key = ResultCache.make_key(source, 'validate', schema=schema, lazy=lazy, integrity=integrity)
+            cached = cache_lookup(cache_key, 'validate')
+            if cached is not None:
+                return app.response_class(cached, mimetype='application/json')
             
-            # Удаляем временный файл
-            os.remove(temp_path)
+            # Валидация прямо из потока запроса в пределах бюджета запроса
+            check_document(source, request_limits)
+            validated = run_limited(validate_document, (source, schema, lazy, integrity), None, request_limits)
+            metrics.merge(validated['metrics'])
+            validation_result = validated['result']
             
-            return jsonify(validation_result)
+            response = jsonify(validation_result)
+            result_cache.put(cache_key, response.get_data())
+            return response
         else:
             return jsonify({'error': 'Недопустимый формат файла. Разрешены только .xml и .bpmn'}), 400
             
+    except LimitExceededError as e:
+        return limit_response(e)
+    except RequestEntityTooLarge as e:
+        return request_too_large(e)
     except Exception as e:
+        record_error('validate', e)
         app.logger.error(f'Ошибка при валидации: {str(e)}')
         return jsonify({'error': f'Внутренняя ошибка сервера: {str(e)}'}), 500
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5001) 
\ No newline at end of file
+    # Сервер разработки; для нагрузки - gunicorn -c gunicorn.conf.py.
+    # Отладчик Werkzeug выполняет код из браузера, поэтому включается только явно (BPMN_DEBUG=1)
+    create_app().run(debug=os.environ.get('BPMN_DEBUG', '0') == '1', host='0.0.0.0', port=5001) 
\ No newline at end of file
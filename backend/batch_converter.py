@@ -0,0 +1,191 @@
+import io
+import json
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from werkzeug.utils import secure_filename
+
+from bpmn_converter import STREAMING_THRESHOLD, convert_document
+from resource_limits import LimitExceededError, ResourceLimits, check_document, run_limited
+
+# Ограничения zip архива: число файлов, распакованный размер одного файла и всего архива
+ARCHIVE_MAX_ENTRIES = 1000
+ARCHIVE_MAX_ENTRY_SIZE = 32 * 1024 * 1024
+ARCHIVE_MAX_TOTAL_SIZE = 128 * 1024 * 1024
+
+# Порция чтения файла из архива
+ARCHIVE_READ_SIZE = 1024 * 1024
+
+def convert_member(item: Tuple[str, bytes, bool], limits: ResourceLimits) -> Dict[str, Any]:
+    """Конвертация одного документа пакета в изолированном процессе в пределах бюджета"""
+    name, data, pretty = item
+    started = time.perf_counter()
+    result = {'file': name, 'size': len(data)}
+
+    try:
+        check_document(io.BytesIO(data), limits)
+        # Конвертация в памяти, без временных файлов; крупные документы - потоково
+        method = 'convert_to_bpmn20_streaming' if len(data) > STREAMING_THRESHOLD else 'convert_to_bpmn20'
+        output = io.BytesIO()
+        converted = run_limited(convert_document, (io.BytesIO(data), method, pretty), output, limits)
+        if converted['success']:
+            result['output'] = output.getvalue()
+            result['status'] = 'converted'
+        else:
+            result['status'] = 'failed'
+            result['error'] = converted['error'] or 'Ошибка конвертации BPMN'
+    except LimitExceededError as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+        result['limit'] = e.kind
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+
+    result['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+class ArchiveTooLargeError(Exception):
+    """Архив содержит слишком много файлов или слишком большой в распакованном виде"""
+
+
+def _read_entry(archive: zipfile.ZipFile, info: zipfile.ZipInfo, limit: int) -> bytes:
+    """Чтение файла архива порциями, не больше limit байт.
+
+    Размер из заголовка архива может не совпадать с данными, поэтому
+    ограничивается фактически распакованный объем.
+    """
+    chunks = []
+    size = 0
+    with archive.open(info) as entry:
+        while True:
+            chunk = entry.read(min(ARCHIVE_READ_SIZE, limit - size + 1))
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > limit:
+                raise ArchiveTooLargeError(f'Файл {info.filename} в архиве больше допустимого размера')
+            chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def extract_archive(stream: BinaryIO, max_entries: int = ARCHIVE_MAX_ENTRIES,
+                    max_entry_size: int = ARCHIVE_MAX_ENTRY_SIZE,
+                    max_total_size: int = ARCHIVE_MAX_TOTAL_SIZE) -> List[Tuple[str, bytes]]:
+    """Чтение файлов из zip архива без распаковки на диск.
+
+    Число файлов, распакованный размер каждого файла и всего архива ограничены
+    (ArchiveTooLargeError): заявленные размеры проверяются до распаковки, фактические - при чтении.
+    """
+    files = []
+    with zipfile.ZipFile(stream) as archive:
+        entries = [info for info in archive.infolist() if not info.is_dir()]
+        if len(entries) > max_entries:
+            raise ArchiveTooLargeError(f'Архив содержит больше {max_entries} файлов')
+        if any(info.file_size > max_entry_size for info in entries):
+            raise ArchiveTooLargeError(f'Файл в архиве больше {max_entry_size // (1024 * 1024)} МБ')
+        if sum(info.file_size for info in entries) > max_total_size:
+            raise ArchiveTooLargeError(f'Распакованный архив больше {max_total_size // (1024 * 1024)} МБ')
+
+        total = 0
+        for info in entries:
+            data = _read_entry(archive, info, min(max_entry_size, max_total_size - total))
+            total += len(data)
+            files.append((info.filename, data))
+    return files
+
+
+class BatchConverter:
+    """Пакетная конвертация BPMN файлов: каждый файл - в изолированном процессе с бюджетом запроса"""
+
+    def __init__(self, max_workers: Optional[int] = None, limits: Optional[ResourceLimits] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.limits = limits or ResourceLimits()
+        # Потоки только ожидают изолированные процессы, конвертация идет в них
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        """Пул создается при первом обращении и переиспользуется между запросами"""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='bpmn-batch')
+            return self._pool
+
+    def shutdown(self):
+        """Остановка пула с ожиданием текущих конвертаций"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def convert(self, files: List[Tuple[str, bytes]], allowed: Callable[[str], bool],
+                pretty: bool = True) -> List[Dict[str, Any]]:
+        """Конвертация набора файлов; ошибки и превышения бюджета отдельных файлов не прерывают пакет"""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(files)
+        tasks = []
+
+        for position, (name, data) in enumerate(files):
+            if allowed(name):
+                tasks.append((position, (name, data, pretty)))
+            else:
+                results[position] = {
+                    'file': name,
+                    'size': len(data),
+                    'status': 'skipped',
+                    'error': 'Недопустимый формат файла. Разрешены только .xml и .bpmn'
+                }
+
+        if tasks:
+            converted = self._get_pool().map(lambda task: convert_member(task, self.limits),
+                                              [task for _, task in tasks])
+            for (position, _), result in zip(tasks, converted):
+                results[position] = result
+
+        return results
+
+    def write_archive(self, results: List[Dict[str, Any]], output: BinaryIO):
+        """Упаковка результатов и манифеста со статусами в zip архив"""
+        used_names = set()
+        manifest = []
+
+        with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for result in results:
+                entry = {key: value for key, value in result.items() if key != 'output'}
+
+                if result.get('status') == 'converted':
+                    output_name = self._output_name(result['file'], used_names)
+                    archive.writestr(output_name, result['output'])
+                    entry['output'] = output_name
+
+                manifest.append(entry)
+
+            summary = {
+                'total': len(results),
+                'converted': sum(1 for r in results if r.get('status') == 'converted'),
+                'failed': sum(1 for r in results if r.get('status') == 'failed'),
+                'skipped': sum(1 for r in results if r.get('status') == 'skipped')
+            }
+            archive.writestr('manifest.json', json.dumps({'summary': summary, 'files': manifest},
+                                                         ensure_ascii=False, indent=2))
+
+    def _output_name(self, name: str, used_names: set) -> str:
+        """Безопасное уникальное имя результата с сохранением структуры каталогов"""
+        parts = [secure_filename(part) for part in name.replace('\\', '/').split('/')]
+        parts = [part for part in parts if part] or ['file.xml']
+        parts[-1] = f'converted_{parts[-1]}'
+        output_name = '/'.join(parts)
+
+        base, ext = os.path.splitext(output_name)
+        counter = 1
+        while output_name in used_names or output_name == 'manifest.json':
+            output_name = f'{base}_{counter}{ext}'
+            counter += 1
+
+        used_names.add(output_name)
+        return output_name
@@ -1,14 +1,449 @@
 import xml.etree.ElementTree as ET
-from xml.dom import minidom
+import io
 import os
 import re
-from typing import Dict, Any, List, Optional
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple, TextIO, BinaryIO, Union
 from datetime import datetime
 
+from bpmn_di import DI_ELEMENTS, CoordinateBuffer, DITransform
+from bpmn_export import (GRAPH_FORMATS, custom_process_graph, diagram_bounds, empty_process_graph,
+                         extend_process_graph, process_graph, write_graph)
+from bpmn_graph import analyze_integrity
+from bpmn_index import BPMNIndex
+from bpmn_schema import (MAX_SCHEMA_ERRORS, SchemaUnavailableError, get_schema, iter_document_errors,
+                         iter_element_errors)
+from custom_model import (CustomNode, CustomProcess, custom_process_id, default_nodes, read_custom_diagram,
+                          read_custom_document, read_custom_nodes)
+from metrics import MetricsRegistry
+from resource_limits import is_well_formed
+from result_cache import ResultCache
+from xml_backend import get_backend
+
+# Порог, после которого буферы потоковой конвертации сбрасываются на диск
+STREAM_SPOOL_MAX_SIZE = 4 * 1024 * 1024
+
+# Файлы больше этого размера конвертируются потоково
+STREAMING_THRESHOLD = 4 * 1024 * 1024
+
+# Версия определяется по началу документа: не больше SNIFF_MAX_SIZE байт порциями по SNIFF_CHUNK_SIZE
+SNIFF_CHUNK_SIZE = 4 * 1024
+SNIFF_MAX_SIZE = 64 * 1024
+
+# Фигуры и ребра диаграммы при потоковой конвертации записываются порциями
+# этого размера (координаты порции пересчитываются разом)
+STREAM_DI_BATCH_SIZE = 1024
+
+# Вход и выход конвертера: путь к файлу или бинарный поток
+Document = Union[str, BinaryIO]
+
+# Обработчик элемента: (исходный элемент, новый элемент, индекс документа)
+ElementHandler = Callable[[ET.Element, ET.Element, Any], None]
+
+# Namespace префикса xml (объявлен всегда)
+XML_NAMESPACE = 'http://www.w3.org/XML/1998/namespace'
+
+# Кэш локальных имен тегов; ограничен, чтобы документ с произвольными
+# тегами не разрастил его
+_LOCAL_NAMES: Dict[str, str] = {}
+_LOCAL_NAMES_MAX_SIZE = 10000
+
+
+def _local_name(tag: str) -> str:
+    """Локальное имя тега без namespace"""
+    name = _LOCAL_NAMES.get(tag)
+    if name is None:
+        name = sys.intern(tag.split('}')[-1] if '}' in tag else tag)
+        if len(_LOCAL_NAMES) < _LOCAL_NAMES_MAX_SIZE:
+            _LOCAL_NAMES[tag] = name
+    return name
+
+
+def _is_path(document: Document) -> bool:
+    return isinstance(document, (str, os.PathLike))
+
+
+def _document_size(document: Document) -> Optional[int]:
+    """Размер файла или потока с произвольным доступом (None, если неизвестен)"""
+    if _is_path(document):
+        return os.path.getsize(document) if os.path.exists(document) else None
+    try:
+        position = document.tell()
+        size = document.seek(0, io.SEEK_END)
+        document.seek(position)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def _rewindable(stream: BinaryIO) -> BinaryIO:
+    """Поток, который можно перечитать; непозиционируемый копируется в буфер"""
+    if stream.seekable():
+        return stream
+    spool = tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_MAX_SIZE)
+    shutil.copyfileobj(stream, spool)
+    spool.seek(0)
+    return spool
+
+
+@contextmanager
+def _open_input(document: Document):
+    """Бинарный поток для чтения; переданный поток не закрывается"""
+    if _is_path(document):
+        with open(document, 'rb') as f:
+            yield f
+    else:
+        yield document
+
+
+@contextmanager
+def _open_output(document: Document):
+    """Текстовый поток UTF-8 для записи; переданный бинарный поток не закрывается"""
+    if _is_path(document):
+        with open(document, 'w', encoding='utf-8', newline='\n') as f:
+            yield f
+    else:
+        stream = io.TextIOWrapper(document, encoding='utf-8', newline='\n')
+        try:
+            yield stream
+            stream.flush()
+        finally:
+            stream.detach()
+
+
+def _copy_document(source: Document, output: Document):
+    """Побайтовое копирование документа (пути или бинарные потоки)"""
+    if _is_path(source) and _is_path(output):
+        shutil.copyfile(source, output)
+        return
+    with _open_input(source) as src:
+        if _is_path(output):
+            with open(output, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+        else:
+            shutil.copyfileobj(src, output)
+
+
+def _escape_xml(data: str) -> str:
+    """Экранирование текста и атрибутов (как в minidom)"""
+    if '&' in data:
+        data = data.replace('&', '&amp;')
+    if '<' in data:
+        data = data.replace('<', '&lt;')
+    if '"' in data:
+        data = data.replace('"', '&quot;')
+    if '>' in data:
+        data = data.replace('>', '&gt;')
+    return data
+
+
+class _XMLSerializer:
+    """Однопроходная запись XML в поток с отступами в формате minidom.toprettyxml"""
+
+    # Размер порции, которой текст передается в выходной поток
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, stream: TextIO, pretty: bool = True, indent: str = '  '):
+        self.stream = stream
+        self.pretty = pretty
+        self.indent = indent if pretty else ''
+        self.newline = '\n' if pretty else ''
+        self._chunks = []
+        self._size = 0
+
+    def declaration(self):
+        """Запись XML декларации"""
+        self._emit('<?xml version="1.0" encoding="utf-8"?>' + self.newline)
+
+    def element(self, element: ET.Element, level: int = 0, namespaces: Optional[Dict[str, str]] = None,
+                declare: Optional[Dict[str, str]] = None):
+        """Запись элемента со всем поддеревом.
+
+        namespaces - префиксы, объявленные во внешних элементах, declare - объявляемые
+        на самом элементе. Остальные namespace объявляются на использующем их элементе.
+        """
+        self._element(element, level, namespaces or {}, declare)
+
+    def start_tag(self, element: ET.Element, level: int = 0, namespaces: Optional[Dict[str, str]] = None,
+                  declare: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Запись открывающего тега элемента без потомков; возвращает префиксы, действующие в поддереве"""
+        namespaces, declare = self.scope(element, namespaces or {}, declare)
+        self._emit(self.indent * level + self._open_tag(element, namespaces, declare) + '>' + self.newline)
+        return namespaces
+
+    def end_tag(self, tag: str, level: int = 0):
+        """Запись закрывающего тега"""
+        self._emit(f'{self.indent * level}</{tag}>{self.newline}')
+
+    def open_element(self, tag: str, attributes: List[Tuple[str, str]], level: int = 0):
+        """Запись открывающего тега по имени и атрибутам без namespace"""
+        self._emit(self.indent * level + self._simple_tag(tag, attributes) + '>' + self.newline)
+
+    def empty_element(self, tag: str, attributes: List[Tuple[str, str]], level: int = 0):
+        """Запись элемента без потомков по имени и атрибутам без namespace"""
+        self._emit(self.indent * level + self._simple_tag(tag, attributes) + '/>' + self.newline)
+
+    def raw(self, text: str):
+        """Запись готового XML текста"""
+        self._emit(text)
+
+    def flush(self):
+        """Передача накопленного текста в выходной поток"""
+        if self._chunks:
+            self.stream.write(''.join(self._chunks))
+            self._chunks = []
+            self._size = 0
+
+    def _emit(self, text: str):
+        self._chunks.append(text)
+        self._size += len(text)
+        if self._size >= self.CHUNK_SIZE:
+            self.flush()
+
+    def _element(self, element: ET.Element, level: int, namespaces: Dict[str, str],
+                 declare: Optional[Dict[str, str]] = None):
+        if declare or self._undeclared(element, namespaces):
+            namespaces, declare = self.scope(element, namespaces, declare)
+        indent = self.indent * level
+        head = indent + self._open_tag(element, namespaces, declare)
+        text = element.text
+        children = [child for child in element if isinstance(child.tag, str)]
+        
+        if children:
+            self._emit(head + '>' + self.newline)
+            child_indent = indent + self.indent
+            if text:
+                self._emit(child_indent + _escape_xml(text) + self.newline)
+            for child in children:
+                self._element(child, level + 1, namespaces)
+                if child.tail:
+                    self._emit(child_indent + _escape_xml(child.tail) + self.newline)
+            self._emit(f'{indent}</{self._qname(element.tag, namespaces)}>{self.newline}')
+        elif text:
+            # Единственный текстовый узел пишется в одну строку
+            self._emit(f'{head}>{_escape_xml(text)}</{self._qname(element.tag, namespaces)}>{self.newline}')
+        else:
+            self._emit(head + '/>' + self.newline)
+
+    def _open_tag(self, element: ET.Element, namespaces: Dict[str, str],
+                  declare: Optional[Dict[str, str]]) -> str:
+        parts = ['<', self._qname(element.tag, namespaces)]
+        if declare:
+            # Объявления namespace идут первыми, как в ElementTree
+            for uri, prefix in sorted(declare.items(), key=lambda item: item[1]):
+                parts.append(f' xmlns:{prefix}="{_escape_xml(uri)}"')
+        for name, value in element.attrib.items():
+            parts.append(f' {self._qname(name, namespaces)}="{_escape_xml(value)}"')
+        return ''.join(parts)
+
+    @staticmethod
+    def _simple_tag(tag: str, attributes: List[Tuple[str, str]]) -> str:
+        return '<' + tag + ''.join(f' {name}="{_escape_xml(value)}"' for name, value in attributes)
+
+    def scope(self, element: ET.Element, namespaces: Dict[str, str],
+              declare: Optional[Dict[str, str]] = None) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Префиксы, действующие в поддереве элемента, и объявляемые на нем самом:
+        declare и namespace элемента, которых нет среди namespaces"""
+        declare = dict(declare or {})
+        namespaces = {**namespaces, **declare}
+        for uri in self._undeclared(element, namespaces):
+            prefix = ET._namespace_map.get(uri)
+            if not prefix or prefix in namespaces.values():
+                number = len(namespaces)
+                while f'ns{number}' in namespaces.values():
+                    number += 1
+                prefix = f'ns{number}'
+            namespaces[uri] = declare[uri] = prefix
+        return namespaces, declare
+
+    @staticmethod
+    def _undeclared(element: ET.Element, namespaces: Dict[str, str]) -> List[str]:
+        """Namespace тега и атрибутов элемента без объявленного префикса"""
+        uris = []
+        for name in (element.tag, *element.attrib):
+            if name[:1] == '{':
+                uri = name[1:].split('}', 1)[0]
+                if uri not in namespaces and uri != XML_NAMESPACE and uri not in uris:
+                    uris.append(uri)
+        return uris
+
+    @staticmethod
+    def assign_prefixes(uris: List[str]) -> Dict[str, str]:
+        """Префиксы для namespace: зарегистрированные в ElementTree или ns0, ns1, ..."""
+        namespaces = {}
+        for position, uri in enumerate(uris):
+            namespaces[uri] = ET._namespace_map.get(uri) or f'ns{position}'
+        namespaces.pop(XML_NAMESPACE, None)
+        return namespaces
+
+    def _qname(self, name: str, namespaces: Dict[str, str]) -> str:
+        if name[:1] != '{':
+            return name
+        uri, local = name[1:].split('}', 1)
+        if uri == XML_NAMESPACE:
+            return 'xml:' + local
+        return f'{namespaces[uri]}:{local}'
+
+
+class _StreamWriter:
+    """Инкрементальная запись XML фрагментов с отложенным открытием тегов"""
+
+    def __init__(self, serializer: _XMLSerializer):
+        self.serializer = serializer
+        # Стек открытых элементов: [элемент, уровень, записан ли открывающий тег,
+        # префиксы в поддереве, префиксы, объявляемые на элементе]
+        self._open = []
+
+    @property
+    def namespaces(self) -> Dict[str, str]:
+        """Префиксы namespace, действующие внутри последнего открытого элемента"""
+        return self._open[-1][3] if self._open else {}
+
+    def open(self, element: ET.Element, level: int, namespaces: Optional[Dict[str, str]] = None,
+             declare: Optional[Dict[str, str]] = None):
+        """Открытие элемента; тег пишется только при появлении первого потомка.
+
+        namespaces - уже объявленные префиксы (по умолчанию - действующие во внешнем элементе),
+        declare - объявляемые на элементе.
+        """
+        if namespaces is None:
+            namespaces = self.namespaces
+        scope, declare = self.serializer.scope(element, namespaces, declare)
+        self._open.append([element, level, False, scope, declare])
+
+    def fragment(self, element: ET.Element, level: int):
+        """Запись готового поддерева"""
+        self._flush_pending()
+        self.serializer.element(element, level, self.namespaces)
+
+    def text(self, fragment: str):
+        """Запись ранее сериализованного поддерева"""
+        self._flush_pending()
+        self.serializer.raw(fragment)
+
+    def direct(self) -> _XMLSerializer:
+        """Сериализатор для записи поддерева напрямую (открытые теги записываются заранее)"""
+        self._flush_pending()
+        return self.serializer
+
+    def copy(self, source: TextIO):
+        """Копирование ранее записанных фрагментов из буфера"""
+        if source.tell() == 0:
+            return
+        self._flush_pending()
+        self.serializer.flush()
+        source.seek(0)
+        shutil.copyfileobj(source, self.serializer.stream)
+
+    def close(self):
+        """Закрытие последнего открытого элемента"""
+        element, level, written, namespaces, declare = self._open.pop()
+        if written:
+            self.serializer.end_tag(element.tag, level)
+        else:
+            # Пустой элемент - потомок внешних, их открывающие теги пишутся перед ним
+            self._flush_pending()
+            self.serializer.element(element, level, namespaces, declare)
+
+    def _flush_pending(self):
+        for entry in self._open:
+            if not entry[2]:
+                self.serializer.start_tag(entry[0], entry[1], entry[3], entry[4])
+                entry[2] = True
+
+
+# Конвертер рабочего процесса параллельной конвертации
+_unit_converter = None
+
+
+def _init_unit_worker(converter_class: type, backend: str, registrations: List[tuple], di_transform: DITransform):
+    """Инициализация рабочего процесса параллельной конвертации"""
+    global _unit_converter
+    _unit_converter = converter_class(backend=backend, di_transform=di_transform)
+    for registration in registrations:
+        _unit_converter.register_element(*registration)
+
+
+def _convert_unit(task: Tuple[str, bytes, Optional[int], bool, Dict[str, str]]) -> str:
+    """Конвертация одной части документа в рабочем процессе"""
+    kind, data, number, pretty, namespaces = task
+    element = _unit_converter.backend.parse(io.BytesIO(data)).getroot()
+    return _unit_converter._convert_unit(kind, element, number, _unit_converter.backend.index(element), pretty,
+                                         namespaces)
+
+
+def _failed_by_memory(registry: MetricsRegistry, stage: str, source: BinaryIO, start: int) -> bool:
+    """Ошибка из-за нехватки памяти: MemoryError или ошибка разбора корректного XML
+    (при ограничении памяти процесса парсеры сообщают о ней как о синтаксической ошибке)"""
+    if registry.get('bpmn_errors_total', stage=stage, type='MemoryError'):
+        return True
+    parse_failed = any(registry.get('bpmn_errors_total', stage=stage, type=name)
+                       for name in ('ParseError', 'XMLSyntaxError'))
+    if not parse_failed:
+        return False
+    source.seek(start)
+    return is_well_formed(source)
+
+
+def convert_document(output: BinaryIO, source: BinaryIO, method: str, *args) -> Dict[str, Any]:
+    """Конвертация потока методом BPMNConverter по имени (для изолированного процесса).
+    
+    Возвращает {'success', 'error', 'metrics'}: метрики передаются процессу сервиса
+    снимком MetricsRegistry. Нехватка памяти при конвертации - MemoryError.
+    """
+    registry = MetricsRegistry()
+    converter = BPMNConverter(metrics=registry)
+    start = source.tell()
+    success = getattr(converter, method)(source, output, *args)
+    if not success and _failed_by_memory(registry, 'convert', source, start):
+        raise MemoryError(converter.last_error)
+    return {'success': success, 'error': converter.last_error, 'metrics': registry.snapshot()}
+
+
+def validate_document(output: Optional[BinaryIO], source: BinaryIO, schema: bool = False, lazy: bool = False,
+                      integrity: bool = True) -> Dict[str, Any]:
+    """Валидация потока (для изолированного процесса): {'result', 'metrics'}"""
+    registry = MetricsRegistry()
+    start = source.tell()
+    result = BPMNConverter(metrics=registry).validate_bpmn(source, schema=schema, lazy=lazy, integrity=integrity)
+    if not result['valid'] and _failed_by_memory(registry, 'validate', source, start):
+        raise MemoryError(result.get('error'))
+    return {'result': result, 'metrics': registry.snapshot()}
+
+
+def validate_schema_document(output: Optional[BinaryIO], source: BinaryIO, version: Optional[str] = None,
+                             lazy: bool = False) -> Dict[str, Any]:
+    """Проверка потока по XSD схеме (для изолированного процесса): {'result', 'metrics'}"""
+    registry = MetricsRegistry()
+    result = BPMNConverter(metrics=registry).validate_schema(source, version, lazy=lazy)
+    return {'result': result, 'metrics': registry.snapshot()}
+
+
 class BPMNConverter:
     """Конвертер BPMN файлов из версии 1.8/1.9 в версию 2.0"""
     
-    def __init__(self):
+    # Версия экспортера, записываемая в результат (exporterVersion).
+    # Для сброса кэша результатов служит result_cache.CACHE_VERSION
+    VERSION = '1.0'
+    
+    def __init__(self, metrics: Optional[MetricsRegistry] = None, backend: Optional[str] = None,
+                 di_transform: Optional[DITransform] = None):
+        # Текст последней ошибки конвертации
+        self.last_error: Optional[str] = None
+        # Статистика фрагментов последней инкрементальной конвертации
+        self.last_fragments: Dict[str, int] = {}
+        # Реестр метрик (None - замеры отключены)
+        self.metrics = metrics
+        # Бэкенд разбора XML: stdlib, lxml или auto (lxml при наличии).
+        # Выходное дерево строится и сериализуется одинаково для обоих бэкендов
+        self.backend = get_backend(backend)
+        # Преобразование координат диаграмм (по умолчанию переносятся как есть)
+        self.di_transform = di_transform or DITransform()
+        
         self.namespaces = {
             'bpmn18': 'http://www.omg.org/BPMN20/2010/04/1.0',
             'bpmn19': 'http://www.omg.org/BPMN20/2009/10/1.0',
@@ -47,34 +482,156 @@ class BPMNConverter:
             'intermediateThrowEvent': 'intermediateThrowEvent',
             'boundaryEvent': 'boundaryEvent'
         }
+        
+        # Таблица конвертации: тег с namespace -> (тег BPMN 2.0, обработчик).
+        # Заполняется заранее для известных namespace, остальные теги
+        # разрешаются по локальному имени при первой встрече
+        self._dispatch: Dict[str, Optional[Tuple[str, Optional[ElementHandler]]]] = {}
+        # Зарегистрированные элементы: (namespace или None, локальное имя) -> (тег, обработчик)
+        self._registry: Dict[Tuple[Optional[str], str], Tuple[str, Optional[ElementHandler]]] = {}
+        # Аргументы вызовов register_element для повторения в рабочих процессах
+        self._registrations: List[Tuple[str, str, Optional[ElementHandler], Optional[str]]] = []
+        for name, new_tag in self.element_mapping.items():
+            self._registry[(None, name)] = (new_tag, self._default_handler(new_tag))
+        self._build_dispatch()
+    
+    def _default_handler(self, new_tag: str) -> Optional[ElementHandler]:
+        """Стандартный обработчик по тегу BPMN 2.0"""
+        if new_tag == 'sequenceFlow':
+            return self._convert_sequence_flow
+        elif new_tag in ['startEvent', 'endEvent', 'intermediateCatchEvent', 'intermediateThrowEvent']:
+            return self._convert_event
+        elif new_tag in ['exclusiveGateway', 'parallelGateway', 'inclusiveGateway']:
+            return self._convert_gateway
+        elif 'Task' in new_tag:
+            return self._convert_task
+        return None
+    
+    def _build_dispatch(self):
+        """Заполнение таблицы конвертации для исходных namespace BPMN 1.8/1.9 и тегов без namespace"""
+        self._dispatch = {}
+        for namespace in ('', self.namespaces['bpmn18'], self.namespaces['bpmn19']):
+            for (_, name) in list(self._registry):
+                tag = f'{{{namespace}}}{name}' if namespace else name
+                self._dispatch[sys.intern(tag)] = self._resolve(tag)
+        
+        # Описание таблицы для ключей фрагментов инкрементальной конвертации
+        self._dispatch_signature = ';'.join(
+            f'{namespace or "*"}|{name}={new_tag}:{getattr(handler, "__qualname__", handler)}'
+            for (namespace, name), (new_tag, handler) in sorted(self._registry.items(), key=lambda item: str(item[0])))
+    
+    def _resolve(self, tag: str) -> Optional[Tuple[str, Optional[ElementHandler]]]:
+        """Поиск конвертации тега: сначала для его namespace, затем для любого"""
+        namespace = tag[1:].split('}')[0] if tag.startswith('{') else ''
+        name = _local_name(tag)
+        return self._registry.get((namespace, name)) or self._registry.get((None, name))
+    
+    def _lookup(self, tag: str) -> Optional[Tuple[str, Optional[ElementHandler]]]:
+        """Конвертация тега из таблицы (None - элемент не переносится)"""
+        try:
+            return self._dispatch[tag]
+        except KeyError:
+            entry = self._resolve(tag)
+            if len(self._dispatch) < _LOCAL_NAMES_MAX_SIZE:
+                self._dispatch[tag] = entry
+            return entry
+    
+    def register_element(self, name: str, new_tag: str, handler: Optional[ElementHandler] = None,
+                         namespace: Optional[str] = None):
+        """Регистрация конвертации элемента процесса, в том числе нестандартного.
+        
+        name - локальное имя исходного элемента, namespace - его namespace
+        (None - любой). Обработчик вызывается как handler(old, new, index) после
+        копирования атрибутов; без обработчика используется стандартный для new_tag.
+        """
+        self._registry[(namespace, name)] = (new_tag, handler or self._default_handler(new_tag))
+        self._registrations.append((name, new_tag, handler, namespace))
+        if namespace is None:
+            self.element_mapping[name] = new_tag
+        self._build_dispatch()
+    
+    @contextmanager
+    def _phase(self, name: str):
+        """Замер длительности фазы обработки"""
+        if self.metrics is None:
+            yield
+            return
+        with self.metrics.timer('bpmn_phase_duration_seconds', phase=name):
+            yield
+    
+    def _record_conversion(self, mode: str, input_path: Document, output_path: Document,
+                           error: Optional[Exception] = None):
+        """Учет результата конвертации в метриках"""
+        if self.metrics is None:
+            return
+        self.metrics.inc('bpmn_conversions_total', mode=mode, result='error' if error else 'success')
+        if error is not None:
+            self.metrics.inc('bpmn_errors_total', stage='convert', type=type(error).__name__)
+        input_size = _document_size(input_path)
+        if input_size is not None:
+            self.metrics.observe('bpmn_input_bytes', input_size)
+        output_size = _document_size(output_path) if error is None else None
+        if output_size is not None:
+            self.metrics.observe('bpmn_output_bytes', output_size)
     
-    def validate_bpmn(self, file_path: str) -> Dict[str, Any]:
-        """Валидация BPMN файла"""
+    def _record_validation(self, result: str, file_path: Document, elements: Optional[int] = None,
+                           error: Optional[Exception] = None):
+        """Учет результата валидации в метриках"""
+        if self.metrics is None:
+            return
+        self.metrics.inc('bpmn_validations_total', result=result)
+        if error is not None:
+            self.metrics.inc('bpmn_errors_total', stage='validate', type=type(error).__name__)
+        if elements is not None:
+            self.metrics.observe('bpmn_document_elements', elements)
+        input_size = _document_size(file_path)
+        if input_size is not None:
+            self.metrics.observe('bpmn_input_bytes', input_size)
+    
+    def validate_bpmn(self, file_path: Document, schema: bool = False, lazy: bool = False,
+                      integrity: bool = True, quick: bool = False) -> Dict[str, Any]:
+        """Валидация BPMN файла (путь или бинарный поток).
+        
+        schema - строгая проверка по XSD схеме обнаруженной версии (см. validate_schema),
+        lazy - потоковая проверка по схеме для больших файлов,
+        integrity - проверка ссылочной целостности процессов (см. validate_integrity),
+        quick - только версия и формат по началу файла, без полного разбора (см. sniff_bpmn_version).
+        """
+        if quick:
+            return self._validate_quick(file_path)
+        
+        start = None
+        if schema and not _is_path(file_path):
+            # Поток читается повторно при проверке по схеме
+            file_path = _rewindable(file_path)
+            start = file_path.tell()
         try:
-            tree = ET.parse(file_path)
+            with self._phase('parse'):
+                tree = self.backend.parse(file_path)
             root = tree.getroot()
             
             # Определяем версию BPMN
             namespace = root.tag.split('}')[0].strip('{') if '}' in root.tag else ''
             version = self._detect_bpmn_version(namespace, root)
             
+            # Индексируем документ за один обход
+            with self._phase('index'):
+                index = self.backend.index(root)
+            
             # Проверяем структуру - ищем процессы в разных форматах
             processes = []
             
             # Стандартные BPMN процессы
-            processes.extend(root.findall('.//process'))
-            processes.extend(root.findall('.//{*}process'))
+            processes.extend(index.elements('process'))
             
             # Нестандартные форматы
-            processes.extend(root.findall('.//Process'))
-            processes.extend(root.findall('.//BusinessProcessDiagram'))
-            processes.extend(root.findall('.//{*}Process'))
-            processes.extend(root.findall('.//{*}BusinessProcessDiagram'))
+            processes.extend(index.elements('Process'))
+            processes.extend(index.elements('BusinessProcessDiagram'))
             
             # Считаем все элементы
-            total_elements = len(root.findall('.//*'))
+            total_elements = index.element_count
             
-            return {
+            result = {
                 'valid': True,
                 'version': version,
                 'processes': len(processes),
@@ -82,19 +639,148 @@ class BPMNConverter:
                 'message': f'Файл валиден. Обнаружена версия BPMN {version}',
                 'format': 'Custom' if 'Custom' in version else 'Standard'
             }
-        except ET.ParseError as e:
+            
+            if integrity and 'Custom' not in version and root.tag != 'BPMN':
+                result.update(self.validate_integrity(index, version))
+            
+            if schema:
+                if start is not None:
+                    file_path.seek(start)
+                result.update(self.validate_schema(file_path, version, lazy))
+                if result['schema_valid'] is False:
+                    result['valid'] = False
+                    result['message'] = f'Файл не соответствует схеме BPMN {version}'
+            
+            self._record_validation('valid' if result['valid'] else 'invalid', file_path, total_elements)
+            return result
+        except self.backend.ParseError as e:
+            self._record_validation('invalid', file_path, error=e)
+            return {
+                'valid': False,
+                'error': f'Ошибка парсинга XML: {str(e)}',
+                'message': 'Файл не является валидным XML'
+            }
+        except Exception as e:
+            self._record_validation('error', file_path, error=e)
+            return {
+                'valid': False,
+                'error': f'Ошибка валидации: {str(e)}',
+                'message': 'Не удалось валидировать файл'
+            }
+    
+    def _validate_quick(self, file_path: Document) -> Dict[str, Any]:
+        """Быстрая проверка: корректность начала документа и версия BPMN"""
+        try:
+            sniffed = self.sniff_bpmn_version(file_path)
+            version = sniffed['version'] or 'unknown'
+            result = {
+                'valid': True,
+                'quick': True,
+                'version': version,
+                'format': sniffed['format'],
+                'message': f'Обнаружена версия BPMN {version} (по началу файла, без полной проверки)'
+            }
+            self._record_validation('valid', file_path)
+            return result
+        except self.backend.ParseError as e:
+            self._record_validation('invalid', file_path, error=e)
             return {
                 'valid': False,
+                'quick': True,
                 'error': f'Ошибка парсинга XML: {str(e)}',
                 'message': 'Файл не является валидным XML'
             }
         except Exception as e:
+            self._record_validation('error', file_path, error=e)
             return {
                 'valid': False,
+                'quick': True,
                 'error': f'Ошибка валидации: {str(e)}',
                 'message': 'Не удалось валидировать файл'
             }
     
+    def validate_integrity(self, index: BPMNIndex, version: str) -> Dict[str, Any]:
+        """Ссылочная целостность процессов после конвертации: sourceRef/targetRef и attachedToRef,
+        указывающие на отсутствующие или не переносимые конвертером элементы, недостижимые узлы,
+        процессы без стартовых и конечных событий.
+        """
+        if version == '2.0':
+            # Документ 2.0 переносится без изменений
+            resolve = _local_name
+        else:
+            resolve = self._converted_tag
+        with self._phase('graph'):
+            return analyze_integrity(index.elements('process'), resolve)
+    
+    def _converted_tag(self, tag: str) -> Optional[str]:
+        """Тег BPMN 2.0 элемента процесса (None - элемент не переносится)"""
+        entry = self._lookup(tag)
+        return entry[0] if entry is not None else None
+    
+    def validate_schema(self, file_path: Document, version: Optional[str] = None,
+                        lazy: bool = False) -> Dict[str, Any]:
+        """Проверка документа по XSD схеме его версии BPMN (путь или бинарный поток).
+        
+        Схема компилируется один раз на процесс. lazy - потоковая проверка каждого
+        элемента верхнего уровня отдельно: память ограничена одним процессом или
+        диаграммой, но ссылки между ними и порядок элементов корня не проверяются.
+        """
+        if not _is_path(file_path):
+            file_path = _rewindable(file_path)
+        if version is None:
+            start = None if _is_path(file_path) else file_path.tell()
+            version, _ = self._sniff_bpmn_version(file_path)
+            if start is not None:
+                file_path.seek(start)
+        
+        try:
+            xsd = get_schema(version)
+        except SchemaUnavailableError as e:
+            return {'schema_valid': None, 'schema_version': version, 'schema_message': str(e)}
+        
+        with self._phase('schema'):
+            if lazy:
+                errors = self._iter_lazy_schema_errors(xsd, file_path)
+            else:
+                errors = iter_document_errors(xsd, file_path)
+            messages = []
+            count = 0
+            for count, message in enumerate(errors, 1):
+                if count <= MAX_SCHEMA_ERRORS:
+                    messages.append(message)
+        
+        return {
+            'schema_valid': count == 0,
+            'schema_version': version,
+            'schema_errors': messages,
+            'schema_error_count': count
+        }
+    
+    def _iter_lazy_schema_errors(self, xsd, source: Document):
+        """Ошибки схемы по элементам верхнего уровня без загрузки всего документа"""
+        namespaces: Dict[str, str] = {}
+        root = None
+        depth = 0
+        for event, elem in self.backend.iterparse(source, events=('start-ns', 'start', 'end')):
+            if event == 'start-ns':
+                prefix, uri = elem
+                namespaces.setdefault(prefix or '', uri)
+                continue
+            if event == 'start':
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+            
+            depth -= 1
+            if depth == 1:
+                yield from iter_element_errors(xsd, elem, namespaces)
+                root.remove(elem)
+        
+        if root is not None:
+            # Корень проверяется без потомков - они уже проверены по одному
+            yield from iter_element_errors(xsd, ET.Element(root.tag, dict(root.attrib)), namespaces)
+    
     def _detect_bpmn_version(self, namespace: str, root: ET.Element) -> str:
         """Определение версии BPMN по namespace и структуре"""
         # Стандартные namespace версии
@@ -123,50 +809,896 @@ class BPMNConverter:
         
         # Пробуем определить по дочерним элементам
         for child in root:
-            if 'BusinessProcessDiagram' in child.tag:
-                return '1.9 (Custom)'
-            elif 'process' in child.tag.lower():
-                return '1.8/1.9'
+            version = self._detect_version_by_child(child.tag)
+            if version:
+                return version
         
         return 'unknown'
     
-    def convert_to_bpmn20(self, input_path: str, output_path: str) -> bool:
-        """Конвертация BPMN файла в версию 2.0"""
-        try:
-            # Парсим входной файл
-            tree = ET.parse(input_path)
-            root = tree.getroot()
+    def _detect_version_by_child(self, tag: str) -> Optional[str]:
+        """Определение версии по тегу дочернего элемента корня"""
+        if 'BusinessProcessDiagram' in tag:
+            return '1.9 (Custom)'
+        elif 'process' in tag.lower():
+            return '1.8/1.9'
+        return None
+    
+    def sniff_bpmn_version(self, document: Document) -> Dict[str, Any]:
+        """Версия и формат BPMN по началу документа (не больше SNIFF_MAX_SIZE байт) без полного разбора.
+        
+        Позиция переданного потока восстанавливается. Если по началу версию определить
+        нельзя, version равна None.
+        """
+        with self._phase('sniff'):
+            version, root_tag = self._sniff_prefix(document)
+        return {
+            'version': version,
+            'format': 'Custom' if version and 'Custom' in version else 'Standard',
+            'root': _local_name(root_tag),
+            'namespace': root_tag[1:].split('}')[0] if root_tag.startswith('{') else ''
+        }
+    
+    def _sniff_bpmn_version(self, input_path: Document) -> Tuple[str, str]:
+        """Определение версии BPMN: по началу документа, а если его не хватило -
+        инкрементальным разбором без загрузки всего файла"""
+        version, root_tag = self._sniff_prefix(input_path)
+        if version is not None:
+            return version, root_tag
+        # Версию задает дочерний элемент корня далеко от начала документа
+        version, root_tag = self._sniff_events(self.backend.iterparse(input_path, events=('start', 'end')))
+        return version or 'unknown', root_tag
+    
+    def _sniff_prefix(self, document: Document) -> Tuple[Optional[str], str]:
+        """Определение версии по первым SNIFF_MAX_SIZE байтам документа порциями по SNIFF_CHUNK_SIZE.
+        
+        Версия None - начала документа не хватило. Ошибка разбора начала документа
+        передается вызывающему (ParseError бэкенда).
+        """
+        parser = self.backend.pullparser(('start', 'end'))
+        complete = False
+        
+        def events(source: BinaryIO):
+            nonlocal complete
+            for _ in range(SNIFF_MAX_SIZE // SNIFF_CHUNK_SIZE):
+                chunk = source.read(SNIFF_CHUNK_SIZE)
+                if not chunk:
+                    # Документ прочитан целиком: close сообщает об обрыве и пустом документе
+                    complete = True
+                    parser.close()
+                    yield from parser.read_events()
+                    return
+                parser.feed(chunk)
+                yield from parser.read_events()
+        
+        with _open_input(document) as source:
+            start = None if _is_path(document) else source.tell()
+            try:
+                version, root_tag = self._sniff_events(events(source))
+            finally:
+                if start is not None:
+                    source.seek(start)
+        if version is None and complete:
+            version = 'unknown'
+        return version, root_tag
+    
+    def _sniff_events(self, events) -> Tuple[Optional[str], str]:
+        """Версия по событиям (start/end) начала документа: корень и его дочерние элементы.
+        
+        Версия None - события закончились раньше, чем она определилась.
+        """
+        root = None
+        depth = 0
+        for event, elem in events:
+            if event == 'end':
+                depth -= 1
+                if depth == 1:
+                    # Дочерние элементы корня больше не нужны
+                    root.remove(elem)
+                continue
             
-            # Определяем версию
+            depth += 1
+            if root is None:
+                root = elem
+                namespace = root.tag.split('}')[0].strip('{') if '}' in root.tag else ''
+                # Проверяем только сам корень: дочерние элементы могли быть
+                # разобраны заранее и проверяются ниже по одному
+                version = self._detect_bpmn_version(namespace, ET.Element(root.tag, dict(root.attrib)))
+                if version != 'unknown':
+                    return version, root.tag
+            elif depth == 2:
+                version = self._detect_version_by_child(elem.tag)
+                if version:
+                    return version, root.tag
+        
+        return None, root.tag if root is not None else ''
+    
+    def is_bpmn20(self, document: Document) -> bool:
+        """Документ уже в формате BPMN 2.0 (по началу документа, без полного разбора).
+        
+        Ошибки разбора начала документа не передаются: о них сообщит конвертация.
+        """
+        try:
+            version, _ = self._sniff_prefix(document)
+        except self.backend.ParseError:
+            return False
+        return version == '2.0'
+    
+    def _passthrough(self, input_path: Document, output_path: Document) -> bool:
+        """Копирование документа BPMN 2.0 без разбора; False - документ нужно конвертировать"""
+        with self._phase('sniff'):
+            if not self.is_bpmn20(input_path):
+                return False
+        with self._phase('serialize'):
+            _copy_document(input_path, output_path)
+        self._record_conversion('passthrough', input_path, output_path)
+        return True
+    
+    def _parse_for_conversion(self, input_path: Document, output_path: Document
+                              ) -> Optional[Tuple[Document, ET.Element, str, Dict[str, str]]]:
+        """Разбор документа перед конвертацией деревом.
+        
+        Документ BPMN 2.0 копируется без изменений, тогда возвращается None; иначе -
+        (вход с возможностью перечитать, корень, версия, объявления namespace корня).
+        """
+        # Файл уже в формате 2.0 - копируем без разбора
+        start = None
+        if not _is_path(input_path):
+            input_path = _rewindable(input_path)
+            start = input_path.tell()
+        if self._passthrough(input_path, output_path):
+            return None
+        
+        # Парсим входной файл; объявления namespace корня читаются из начала
+        # документа отдельно: ElementTree их не сохраняет
+        with self._phase('parse'):
+            root_namespaces = self._root_namespaces(input_path)
+            root = self.backend.parse(input_path).getroot()
+        
+        # Определяем версию
+        with self._phase('detect'):
             namespace = root.tag.split('}')[0].strip('{') if '}' in root.tag else ''
             version = self._detect_bpmn_version(namespace, root)
+        
+        if version == '2.0':
+            # Корень не уместился в начало документа - копируем документ как есть:
+            # сериализация разобранного дерева зависит от бэкенда
+            del root
+            if start is not None:
+                input_path.seek(start)
+            with self._phase('serialize'):
+                _copy_document(input_path, output_path)
+            self._record_conversion('passthrough', input_path, output_path)
+            return None
+        return input_path, root, version, root_namespaces
+    
+    def convert_to_bpmn20(self, input_path: Document, output_path: Document, pretty: bool = True) -> bool:
+        """Конвертация BPMN файла в версию 2.0 (пути или бинарные потоки)"""
+        self.last_error = None
+        try:
+            parsed = self._parse_for_conversion(input_path, output_path)
+            if parsed is None:
+                return True
+            input_path, root, version, root_namespaces = parsed
+            
+            if self._is_custom_format(root, version):
+                # Нестандартный формат: промежуточная модель вместо дерева результата
+                with self._phase('convert'):
+                    processes, element_count = read_custom_document(root)
+                if self.metrics is not None:
+                    self.metrics.observe('bpmn_document_elements', element_count)
+                # Исходное дерево для записи не нужно
+                del parsed, root
+                with self._phase('serialize'):
+                    self._save_custom_model(processes, output_path, pretty, root_namespaces)
+            else:
+                # Конвертируем дерево
+                with self._phase('convert'):
+                    bpmn20_root = self._convert_tree(root)
+                
+                # Сохраняем результат
+                with self._phase('serialize'):
+                    self._save_formatted_xml(bpmn20_root, output_path, pretty, root_namespaces)
+            
+            self._record_conversion('tree', input_path, output_path)
+            return True
+            
+        except Exception as e:
+            self.last_error = str(e)
+            self._record_conversion('tree', input_path, output_path, e)
+            print(f"Ошибка конвертации: {str(e)}")
+            return False
+    
+    def _convert_tree(self, root: ET.Element) -> ET.Element:
+        """Построение дерева BPMN 2.0 по разобранному документу стандартного формата
+        (нестандартный формат пишется из промежуточной модели, см. _save_custom_model)"""
+        # Создаем новый BPMN 2.0 документ
+        bpmn20_root = self._create_bpmn20_structure()
+        
+        # Индексируем документ за один обход
+        index = self.backend.index(root)
+        if self.metrics is not None:
+            self.metrics.observe('bpmn_document_elements', index.element_count)
+        
+        self._convert_processes(index, bpmn20_root)
+        self._convert_diagrams(index, bpmn20_root)
+        
+        return bpmn20_root
+    
+    @staticmethod
+    def _is_custom_format(root: ET.Element, version: str) -> bool:
+        """Нестандартный формат <BPMN> (BusinessProcessDiagram вместо process)"""
+        return 'Custom' in version or root.tag == 'BPMN'
+    
+    def convert_to_bpmn20_incremental(self, input_path: Document, output_path: Document, store: ResultCache,
+                                      pretty: bool = True) -> bool:
+        """Конвертация с повторным использованием фрагментов неизмененных процессов и диаграмм.
+        
+        Каждый process, BPMNDiagram и BusinessProcessDiagram получает отпечаток
+        содержимого; результат для него берется из store, если поддерево не менялось
+        с прошлой конвертации, иначе конвертируется заново и сохраняется в store.
+        """
+        self.last_error = None
+        self.last_fragments = {'reused': 0, 'converted': 0}
+        try:
+            parsed = self._parse_for_conversion(input_path, output_path)
+            if parsed is None:
+                return True
+            input_path, root, version, root_namespaces = parsed
+            
+            with self._phase('index'):
+                index = self.backend.index(root)
+                units = self._collect_units(root, version, index)
+            
+            with self._phase('fragments'), _open_output(output_path) as output:
+                serializer = _XMLSerializer(output, pretty)
+                serializer.declaration()
+                writer = _StreamWriter(serializer)
+                writer.open(self._create_bpmn20_structure(), 0, self._output_prefixes(), root_namespaces)
+                for kind, element, number in units:
+                    writer.text(self._convert_fragment(kind, element, number, index, store, pretty,
+                                                       writer.namespaces))
+                writer.close()
+                serializer.flush()
+            
+            if self.metrics is not None:
+                for result, count in self.last_fragments.items():
+                    self.metrics.inc('bpmn_fragments_total', count, result=result)
+            self._record_conversion('incremental', input_path, output_path)
+            return True
+            
+        except Exception as e:
+            self.last_error = str(e)
+            self._record_conversion('incremental', input_path, output_path, e)
+            print(f"Ошибка инкрементальной конвертации: {str(e)}")
+            return False
+    
+    def _convert_fragment(self, kind: str, element: ET.Element, number: Optional[int], index: BPMNIndex,
+                          store: ResultCache, pretty: bool, namespaces: Dict[str, str]) -> str:
+        """Сериализованный результат конвертации поддерева (из store или заново);
+        namespaces - префиксы, объявленные на корне результата"""
+        # Номер процесса влияет на результат только при отсутствии id
+        if element.get('id') is not None:
+            number = None
+        key = ResultCache.make_key(self.backend.fingerprint(element), f'fragment:{kind}',
+                                   number=number, pretty=pretty, dispatch=self._dispatch_signature,
+                                   di=repr(self.di_transform), namespaces=sorted(namespaces.items()))
+        cached = store.get(key)
+        if cached is not None:
+            self.last_fragments['reused'] += 1
+            return cached.decode('utf-8')
+        
+        if kind == 'custom':
+            fragment = self._serialize_custom_process(element, pretty)
+        else:
+            new_element = self._build_unit(kind, element, number, index)
+            buffer = io.StringIO()
+            serializer = _XMLSerializer(buffer, pretty)
+            serializer.element(new_element, 1, namespaces)
+            serializer.flush()
+            fragment = buffer.getvalue()
+        
+        store.put(key, fragment.encode('utf-8'))
+        self.last_fragments['converted'] += 1
+        return fragment
+    
+    def _collect_units(self, root: ET.Element, version: str, index: BPMNIndex) -> List[Tuple[str, ET.Element, Optional[int]]]:
+        """Независимо конвертируемые части документа в порядке вывода: (вид, элемент, номер процесса)"""
+        if self._is_custom_format(root, version):
+            return [('custom', diagram, None) for diagram in index.elements('BusinessProcessDiagram')]
+        units = [('process', process, number) for number, process in enumerate(index.elements('process'), 1)]
+        units.extend(('diagram', diagram, None) for diagram in index.elements('BPMNDiagram'))
+        return units
+    
+    def _build_unit(self, kind: str, element: ET.Element, number: Optional[int], index: BPMNIndex) -> ET.Element:
+        """Конвертация процесса или диаграммы (BusinessProcessDiagram пишется без дерева,
+        см. _serialize_custom_process)"""
+        if kind == 'process':
+            return self._build_process(element, number or 0, index)
+        return self._build_diagram(element, index)
+    
+    def convert_to_bpmn20_parallel(self, input_path: Document, output_path: Document, pretty: bool = True,
+                                   workers: Optional[int] = None) -> bool:
+        """Конвертация большого документа с распределением процессов по пулу процессов.
+        
+        Каждый process, BPMNDiagram и BusinessProcessDiagram передается рабочему
+        процессу в сериализованном виде, конвертируется и записывается там же;
+        фрагменты собираются в исходном порядке, результат совпадает с convert_to_bpmn20.
+        Обработчики из register_element должны сериализоваться pickle.
+        """
+        self.last_error = None
+        try:
+            parsed = self._parse_for_conversion(input_path, output_path)
+            if parsed is None:
+                return True
+            input_path, root, version, root_namespaces = parsed
+            
+            with self._phase('index'):
+                index = self.backend.index(root)
+                units = self._collect_units(root, version, index)
+            if self.metrics is not None:
+                self.metrics.observe('bpmn_document_elements', index.element_count)
+            
+            # Фрагменты сериализуются с префиксами, объявленными на корне результата
+            namespaces = {**self._output_prefixes(), **root_namespaces}
+            workers = min(workers or os.cpu_count() or 1, len(units))
+            with self._phase('convert'):
+                if workers > 1:
+                    tasks = [(kind, self.backend.tostring(element), number, pretty, namespaces)
+                             for kind, element, number in units]
+                    # Освобождаем исходное дерево до запуска рабочих процессов
+                    del parsed, root, index, units
+                    initargs = (type(self), self.backend.name, self._registrations, self.di_transform)
+                    with ProcessPoolExecutor(max_workers=workers, initializer=_init_unit_worker,
+                                             initargs=initargs) as pool:
+                        # map сохраняет порядок задач, поэтому результат детерминирован
+                        fragments = list(pool.map(_convert_unit, tasks,
+                                                  chunksize=max(1, len(tasks) // (workers * 4))))
+                else:
+                    fragments = [self._convert_unit(kind, element, number, index, pretty, namespaces)
+                                 for kind, element, number in units]
+            
+            with self._phase('serialize'):
+                self._write_fragments(fragments, output_path, pretty, root_namespaces)
+            
+            self._record_conversion('parallel', input_path, output_path)
+            return True
+            
+        except Exception as e:
+            self.last_error = str(e)
+            self._record_conversion('parallel', input_path, output_path, e)
+            print(f"Ошибка параллельной конвертации: {str(e)}")
+            return False
+    
+    def _convert_unit(self, kind: str, element: ET.Element, number: Optional[int], index: BPMNIndex,
+                      pretty: bool, namespaces: Dict[str, str]) -> str:
+        """Конвертация и сериализация части документа; namespaces - префиксы, объявленные на корне"""
+        if kind == 'custom':
+            return self._serialize_custom_process(element, pretty)
+        buffer = io.StringIO()
+        serializer = _XMLSerializer(buffer, pretty)
+        serializer.element(self._build_unit(kind, element, number, index), 1, namespaces)
+        serializer.flush()
+        return buffer.getvalue()
+    
+    def _write_fragments(self, fragments: List[str], output_path: Document, pretty: bool,
+                         root_namespaces: Dict[str, str]):
+        """Сборка документа из фрагментов с объявлением namespace на корне, как в convert_to_bpmn20"""
+        root = self._create_bpmn20_structure()
+        with _open_output(output_path) as output:
+            serializer = _XMLSerializer(output, pretty)
+            serializer.declaration()
+            if not fragments:
+                serializer.element(root, 0, self._output_prefixes(), root_namespaces)
+            else:
+                serializer.start_tag(root, 0, self._output_prefixes(), root_namespaces)
+                for fragment in fragments:
+                    serializer.raw(fragment)
+                serializer.end_tag(root.tag, 0)
+            serializer.flush()
+    
+    def convert_to_bpmn20_streaming(self, input_path: Document, output_path: Document, pretty: bool = True,
+                                    progress: Optional[Callable[[float], None]] = None) -> bool:
+        """Потоковая конвертация BPMN файла в версию 2.0 с ограниченным потреблением памяти"""
+        self.last_error = None
+        try:
+            # Поток читается дважды: определение версии и конвертация
+            start = None
+            if not _is_path(input_path):
+                input_path = _rewindable(input_path)
+                start = input_path.tell()
+            
+            with self._phase('sniff'):
+                version, root_tag = self._sniff_bpmn_version(input_path)
+                if start is not None:
+                    input_path.seek(start)
+                root_namespaces = self._root_namespaces(input_path) if version != '2.0' else {}
             
             if version == '2.0':
-                # Файл уже в формате 2.0, просто копируем
-                tree.write(output_path, encoding='utf-8', xml_declaration=True)
+                # Файл уже в формате 2.0, копируем без разбора
+                _copy_document(input_path, output_path)
+                if progress:
+                    progress(1.0)
+                self._record_conversion('passthrough', input_path, output_path)
                 return True
             
-            # Создаем новый BPMN 2.0 документ
-            bpmn20_root = self._create_bpmn20_structure()
+            with self._phase('stream'), _open_input(input_path) as source, \
+                    _open_output(output_path) as output:
+                serializer = _XMLSerializer(output, pretty)
+                serializer.declaration()
+                writer = _StreamWriter(serializer)
+                writer.open(self._create_bpmn20_structure(), 0, self._output_prefixes(), root_namespaces)
+                
+                events = self.backend.iterparse(source, events=('start', 'end'))
+                if progress:
+                    events = self._track_progress(events, source, progress)
+                if self.metrics is not None:
+                    events = self._count_elements(events)
+                if 'Custom' in version or root_tag == 'BPMN':
+                    self._stream_custom_format(events, writer)
+                else:
+                    self._stream_processes(events, writer)
+                
+                writer.close()
+                serializer.flush()
+            
+            if progress:
+                progress(1.0)
+            self._record_conversion('streaming', input_path, output_path)
+            return True
+            
+        except Exception as e:
+            self.last_error = str(e)
+            self._record_conversion('streaming', input_path, output_path, e)
+            print(f"Ошибка потоковой конвертации: {str(e)}")
+            if _is_path(output_path) and os.path.exists(output_path):
+                os.remove(output_path)
+            return False
+    
+    def convert_bytes(self, data: bytes, pretty: bool = True, streaming: bool = False) -> Optional[bytes]:
+        """Конвертация документа в памяти; None при ошибке (текст в last_error)"""
+        output = io.BytesIO()
+        if streaming:
+            success = self.convert_to_bpmn20_streaming(io.BytesIO(data), output, pretty)
+        else:
+            success = self.convert_to_bpmn20(io.BytesIO(data), output, pretty)
+        return output.getvalue() if success else None
+    
+    def export_graph(self, input_path: Document, output_path: Document, graph_format: str = 'json',
+                     streaming: bool = False) -> bool:
+        """Граф процессов в JSON или NDJSON: узлы с типом и именем, потоки управления и границы фигур.
+        
+        Процессы и диаграммы конвертируются так же, как в convert_to_bpmn20 (с пересчетом
+        координат), но результат пишется сразу в виде графа, без записи и разбора XML;
+        документ BPMN 2.0 выгружается без конвертации. Процессы пишутся по одному.
+        streaming - без дерева документа: первый проход собирает границы фигур,
+        второй строит граф каждого процесса по мере разбора.
+        """
+        self.last_error = None
+        mode = 'graph_streaming' if streaming else 'graph'
+        try:
+            if graph_format not in GRAPH_FORMATS:
+                raise ValueError(f'Неизвестный формат графа: {graph_format}')
             
-            # Проверяем тип файла и конвертируем соответственно
-            if 'Custom' in version or root.tag == 'BPMN':
-                # Нестандартный формат - специальная обработка
-                self._convert_custom_format(root, bpmn20_root)
+            if streaming:
+                graphs = self._stream_process_graphs(input_path)
             else:
-                # Стандартный формат
-                self._convert_processes(root, bpmn20_root)
-                self._convert_diagrams(root, bpmn20_root)
+                with self._phase('parse'):
+                    tree = self.backend.parse(input_path)
+                root = tree.getroot()
+                
+                with self._phase('detect'):
+                    namespace = root.tag.split('}')[0].strip('{') if '}' in root.tag else ''
+                    version = self._detect_bpmn_version(namespace, root)
+                graphs = self._iter_process_graphs(root, version)
             
-            # Сохраняем результат
-            self._save_formatted_xml(bpmn20_root, output_path)
+            with self._phase('graph'), _open_output(output_path) as output:
+                write_graph(graphs, output, graph_format)
             
+            self._record_conversion(mode, input_path, output_path)
             return True
             
         except Exception as e:
-            print(f"Ошибка конвертации: {str(e)}")
+            self.last_error = str(e)
+            self._record_conversion(mode, input_path, output_path, e)
+            print(f"Ошибка выгрузки графа: {str(e)}")
             return False
     
+    def _stream_process_graphs(self, document: Document) -> Iterator[Dict[str, Any]]:
+        """Графы процессов без построения дерева документа, в порядке export_graph"""
+        # Поток читается несколько раз: определение версии, границы фигур и процессы
+        start = None
+        if not _is_path(document):
+            document = _rewindable(document)
+            start = document.tell()
+        
+        version, root_tag = self._sniff_bpmn_version(document)
+        if 'Custom' in version or root_tag == 'BPMN':
+            with _open_input(document) as source:
+                if start is not None:
+                    source.seek(start)
+                events = self.backend.iterparse(source, events=('start', 'end'))
+                if self.metrics is not None:
+                    events = self._count_elements(events)
+                yield from self._stream_custom_graphs(events)
+            return
+        
+        # Диаграммы идут после процессов, поэтому границы фигур собираются первым проходом
+        with _open_input(document) as source:
+            if start is not None:
+                source.seek(start)
+            bounds = self._stream_graph_bounds(self.backend.iterparse(source, events=('start', 'end')), version)
+        
+        with _open_input(document) as source:
+            if start is not None:
+                source.seek(start)
+            events = self.backend.iterparse(source, events=('start', 'end'))
+            if self.metrics is not None:
+                events = self._count_elements(events)
+            yield from self._stream_graph_processes(events, version, bounds)
+    
+    def _stream_graph_bounds(self, events, version: str) -> Dict[str, List[float]]:
+        """Границы фигур всех диаграмм документа по мере разбора.
+        
+        Фигуры пересчитываются по одной; с нормализацией диаграмма пересчитывается
+        целиком, как при потоковой конвертации. Документ BPMN 2.0 не конвертируется.
+        """
+        bounds: Dict[str, List[float]] = {}
+        convert = version != '2.0'
+        whole_diagram = convert and self.di_transform.normalize
+        stack = []
+        diagram_depth = None
+        plane_depth = None
+        shape_depth = None
+        
+        for event, elem in events:
+            name = _local_name(elem.tag)
+            
+            if event == 'start':
+                depth = len(stack)
+                stack.append(elem)
+                if diagram_depth is None:
+                    if name == 'BPMNDiagram':
+                        diagram_depth = depth
+                elif convert and plane_depth is None and name == 'BPMNPlane':
+                    plane_depth = depth
+                elif not convert and shape_depth is None and name == 'BPMNShape':
+                    shape_depth = depth
+                continue
+            
+            stack.pop()
+            depth = len(stack)
+            
+            if depth == diagram_depth:
+                if whole_diagram:
+                    diagram_bounds(self._build_diagram(elem, self.backend.index(elem)), bounds)
+                diagram_depth = None
+            elif depth == shape_depth:
+                diagram_bounds(elem, bounds)
+                shape_depth = None
+            elif depth == plane_depth:
+                plane_depth = None
+            elif (not whole_diagram and plane_depth is not None and depth == plane_depth + 1
+                  and name == 'BPMNShape'):
+                # Фигура разобрана целиком: конвертируется отдельно с пересчетом координат
+                holder = ET.Element('bpmndi:BPMNPlane')
+                coordinates = self._coordinate_buffer()
+                self._convert_di_element(elem, holder, coordinates)
+                if coordinates is not None:
+                    coordinates.apply(self.di_transform)
+                diagram_bounds(holder, bounds)
+            
+            # Сохраняются поддеревья, которые еще обрабатываются целиком
+            if whole_diagram:
+                keep = diagram_depth is not None
+            elif shape_depth is not None:
+                keep = depth > shape_depth
+            else:
+                keep = plane_depth is not None and depth > plane_depth + 1
+            if stack and not keep:
+                stack[-1].remove(elem)
+        
+        return bounds
+    
+    def _stream_graph_processes(self, events, version: str,
+                                bounds: Dict[str, List[float]]) -> Iterator[Dict[str, Any]]:
+        """Графы процессов по мере разбора: прямые потомки процесса конвертируются по одному"""
+        convert = version != '2.0'
+        stack = []
+        process_depth = None
+        process_count = 0
+        
+        for event, elem in events:
+            if event == 'start':
+                depth = len(stack)
+                stack.append(elem)
+                if process_depth is None and _local_name(elem.tag) == 'process':
+                    process_depth = depth
+                    process_count += 1
+                    graph = empty_process_graph(self._create_process(elem, process_count) if convert else elem)
+                continue
+            
+            stack.pop()
+            depth = len(stack)
+            
+            if process_depth is not None and depth == process_depth + 1:
+                if not convert:
+                    extend_process_graph(graph, (elem,), bounds)
+                else:
+                    entry = self._lookup(elem.tag)
+                    if entry is not None:
+                        holder = ET.Element('process')
+                        self._convert_element(elem, holder, entry, self.backend.index(elem))
+                        extend_process_graph(graph, holder, bounds)
+            elif depth == process_depth:
+                yield graph
+                process_depth = None
+            
+            if stack and not (process_depth is not None and depth > process_depth + 1):
+                stack[-1].remove(elem)
+    
+    def _stream_custom_graphs(self, events) -> Iterator[Dict[str, Any]]:
+        """Графы процессов нестандартного формата: по одной BusinessProcessDiagram"""
+        stack = []
+        diagram_depth = None
+        
+        for event, elem in events:
+            if event == 'start':
+                if diagram_depth is None and elem.tag == 'BusinessProcessDiagram':
+                    diagram_depth = len(stack)
+                stack.append(elem)
+                continue
+            
+            stack.pop()
+            depth = len(stack)
+            if depth == diagram_depth:
+                yield custom_process_graph(read_custom_diagram(elem))
+                diagram_depth = None
+            if stack and not (diagram_depth is not None and depth > diagram_depth):
+                stack[-1].remove(elem)
+    
+    def _iter_process_graphs(self, root: ET.Element, version: str) -> Iterator[Dict[str, Any]]:
+        """Графы процессов документа в порядке convert_to_bpmn20"""
+        if self._is_custom_format(root, version):
+            processes, element_count = read_custom_document(root)
+            if self.metrics is not None:
+                self.metrics.observe('bpmn_document_elements', element_count)
+            for process in processes:
+                yield custom_process_graph(process)
+            return
+        
+        index = self.backend.index(root)
+        if self.metrics is not None:
+            self.metrics.observe('bpmn_document_elements', index.element_count)
+        # Диаграммы идут после процессов, поэтому границы фигур собираются заранее
+        bounds: Dict[str, List[float]] = {}
+        if version == '2.0':
+            for diagram in index.elements('BPMNDiagram'):
+                diagram_bounds(diagram, bounds)
+            for process in index.elements('process'):
+                yield process_graph(process, bounds)
+            return
+        
+        for diagram in index.elements('BPMNDiagram'):
+            diagram_bounds(self._build_diagram(diagram, index), bounds)
+        for number, process in enumerate(index.elements('process'), 1):
+            yield process_graph(self._build_process(process, number, index), bounds)
+    
+    def _count_elements(self, events):
+        """Подсчет элементов потока событий для метрик"""
+        count = 0
+        for event, elem in events:
+            if event == 'end':
+                count += 1
+            yield event, elem
+        # Корень документа не считается, как и в BPMNIndex.element_count
+        self.metrics.observe('bpmn_document_elements', max(count - 1, 0))
+    
+    def _track_progress(self, events, source: BinaryIO, progress: Callable[[float], None],
+                        interval: int = 10000):
+        """Передача доли прочитанного файла в callback каждые interval событий"""
+        start = source.tell()
+        total = ((_document_size(source) or 0) - start) or 1
+        for count, item in enumerate(events):
+            if count % interval == 0:
+                progress(min((source.tell() - start) / total, 1.0))
+            yield item
+    
+    def _stream_processes(self, events, writer: _StreamWriter):
+        """Потоковая конвертация процессов и диаграмм стандартного формата"""
+        stack = []
+        process_depth = None
+        diagram_depth = None
+        plane_depth = None
+        process_count = 0
+        # Нормализация сдвигает диаграмму на минимум ее координат, поэтому такая диаграмма
+        # конвертируется целиком; иначе фигуры и ребра пишутся по мере разбора
+        stream_di = not self.di_transform.normalize
+        
+        # Диаграммы идут в выходном файле после всех процессов,
+        # с префиксами namespace корня результата
+        namespaces = writer.namespaces
+        with tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_MAX_SIZE, mode='w+',
+                                           encoding='utf-8') as spool:
+            diagrams = _XMLSerializer(spool, writer.serializer.pretty)
+            diagram_writer = _StreamWriter(diagrams)
+            
+            for event, elem in events:
+                name = _local_name(elem.tag)
+                
+                if event == 'start':
+                    depth = len(stack)
+                    stack.append(elem)
+                    
+                    if process_depth is None and name == 'process':
+                        process_depth = depth
+                        process_count += 1
+                        writer.open(self._create_process(elem, process_count), 1)
+                    elif diagram_depth is None and name == 'BPMNDiagram':
+                        diagram_depth = depth
+                        if stream_di:
+                            diagram_writer.open(self._create_diagram(elem), 1, namespaces)
+                            shapes, shape_coordinates = [], self._coordinate_buffer()
+                            styles, style_coordinates = [], self._coordinate_buffer()
+                    elif stream_di and diagram_depth is not None and plane_depth is None and name == 'BPMNPlane':
+                        plane_depth = depth
+                        diagram_writer.open(self._create_plane(elem), 2)
+                    continue
+                
+                stack.pop()
+                depth = len(stack)
+                
+                if process_depth is not None and depth == process_depth + 1:
+                    # Прямой потомок процесса разобран целиком - конвертируем его
+                    entry = self._lookup(elem.tag)
+                    if entry is not None:
+                        holder = ET.Element('process')
+                        self._convert_element(elem, holder, entry, self.backend.index(elem))
+                        writer.fragment(holder[0], 2)
+                elif depth == process_depth:
+                    writer.close()
+                    process_depth = None
+                elif plane_depth is not None and depth == plane_depth + 1:
+                    # Фигура или ребро разобраны целиком
+                    holder = ET.Element('bpmndi:BPMNPlane')
+                    self._convert_di_element(elem, holder, shape_coordinates)
+                    shapes.extend(holder)
+                    if len(shapes) >= STREAM_DI_BATCH_SIZE:
+                        self._write_di_batch(diagram_writer, shapes, shape_coordinates, 3)
+                        shapes, shape_coordinates = [], self._coordinate_buffer()
+                elif depth == plane_depth:
+                    self._write_di_batch(diagram_writer, shapes, shape_coordinates, 3)
+                    shapes, shape_coordinates = [], self._coordinate_buffer()
+                    diagram_writer.close()
+                    plane_depth = None
+                elif depth == diagram_depth:
+                    if stream_di:
+                        # Стили подписей идут после плоскостей, как при конвертации дерева
+                        self._write_di_batch(diagram_writer, styles, style_coordinates, 2)
+                        diagram_writer.close()
+                    else:
+                        # Диаграмма конвертируется целиком: координаты пересчитываются разом
+                        diagrams.element(self._build_diagram(elem, self.backend.index(elem)), 1, namespaces)
+                    diagram_depth = None
+                
+                if stream_di and diagram_depth is not None and name == 'BPMNLabelStyle':
+                    holder = ET.Element('bpmndi:BPMNDiagram')
+                    self._convert_di_element(elem, holder, style_coordinates)
+                    styles.extend(holder)
+                
+                # Освобождаем память: поддеревья, которые еще конвертируются целиком
+                # (потомки процесса, фигуры и ребра, диаграмма с нормализацией), сохраняются
+                if process_depth is not None:
+                    keep = depth > process_depth + 1
+                elif diagram_depth is not None:
+                    keep = not stream_di or depth > (diagram_depth if plane_depth is None else plane_depth) + 1
+                else:
+                    keep = False
+                if stack and not keep:
+                    stack[-1].remove(elem)
+            
+            diagrams.flush()
+            writer.copy(spool)
+    
+    def _coordinate_buffer(self) -> Optional[CoordinateBuffer]:
+        """Буфер координат для пересчета; None - координаты переносятся как есть"""
+        return None if self.di_transform.identity else CoordinateBuffer()
+    
+    def _write_di_batch(self, writer: _StreamWriter, elements: List[ET.Element],
+                        coordinates: Optional[CoordinateBuffer], level: int):
+        """Запись порции сконвертированных элементов DI после пересчета их координат"""
+        if coordinates is not None:
+            coordinates.apply(self.di_transform)
+        for element in elements:
+            writer.fragment(element, level)
+    
+    def _stream_custom_format(self, events, writer: _StreamWriter):
+        """Потоковая конвертация нестандартного формата BPMN"""
+        stack = []
+        diagram_depth = None
+        process_depth = None
+        
+        for event, elem in events:
+            if event == 'start':
+                depth = len(stack)
+                stack.append(elem)
+                
+                if diagram_depth is None and elem.tag == 'BusinessProcessDiagram':
+                    diagram_depth = depth
+                    process_name = None
+                    has_processes = False
+                    # Имя процесса может встретиться после элементов, поэтому
+                    # сконвертированные элементы копятся во временном буфере
+                    spool = tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_MAX_SIZE, mode='w+',
+                                                          encoding='utf-8')
+                    elements = _XMLSerializer(spool, writer.serializer.pretty)
+                elif diagram_depth is not None and process_depth is None and elem.tag == 'Process':
+                    process_depth = depth
+                    has_processes = True
+                continue
+            
+            stack.pop()
+            depth = len(stack)
+            
+            if depth == process_depth:
+                self._write_custom_nodes(elements, read_custom_nodes(elem), 2)
+                process_depth = None
+            elif diagram_depth is not None and depth == diagram_depth + 1 and elem.tag == 'Name':
+                if process_name is None:
+                    process_name = elem.text or ''
+            elif depth == diagram_depth:
+                elements.flush()
+                process = CustomProcess(custom_process_id(elem), process_name,
+                                        [] if has_processes else default_nodes())
+                serializer = writer.direct()
+                if spool.tell():
+                    serializer.open_element('process', process.attributes(), 1)
+                    writer.copy(spool)
+                    serializer.end_tag('process', 1)
+                else:
+                    self._write_custom_process(serializer, process, 1)
+                spool.close()
+                diagram_depth = None
+            
+            if stack and process_depth is None:
+                stack[-1].remove(elem)
+    
+    def _root_namespaces(self, document: Document) -> Dict[str, str]:
+        """Namespace для объявления на корне результата: объявленные с префиксом на корне
+        исходного документа, кроме namespace BPMN, DI и самого корня, в порядке объявления.
+        
+        Объявления читаются из начала документа, поэтому не зависят от способа конвертации;
+        namespace, объявленные ниже корня, объявляются на использующих их элементах.
+        """
+        vocabulary = set(self.namespaces.values())
+        uris: List[str] = []
+        parser = self.backend.pullparser(('start-ns', 'start'))
+        with _open_input(document) as source:
+            start = None if _is_path(document) else source.tell()
+            try:
+                for _ in range(SNIFF_MAX_SIZE // SNIFF_CHUNK_SIZE):
+                    chunk = source.read(SNIFF_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    parser.feed(chunk)
+                    for event, value in parser.read_events():
+                        if event == 'start':
+                            root_namespace = value.tag[1:].split('}', 1)[0] if value.tag[:1] == '{' else None
+                            return _XMLSerializer.assign_prefixes([uri for uri in uris if uri != root_namespace])
+                        prefix, uri = value
+                        if prefix and uri not in vocabulary and uri not in uris:
+                            uris.append(uri)
+            except self.backend.ParseError:
+                # О синтаксической ошибке сообщит разбор документа
+                pass
+            finally:
+                if start is not None:
+                    source.seek(start)
+        return _XMLSerializer.assign_prefixes(uris)
+    
+    def _output_prefixes(self) -> Dict[str, str]:
+        """Префиксы, объявленные атрибутами корня результата (_create_bpmn20_structure)"""
+        return {self.namespaces[prefix]: prefix for prefix in ('bpmndi', 'omgdc', 'omgdi', 'xsi')}
+    
     def _create_bpmn20_structure(self) -> ET.Element:
         """Создание базовой структуры BPMN 2.0"""
         root = ET.Element('definitions')
@@ -177,39 +1709,52 @@ class BPMNConverter:
         root.set('xmlns:xsi', self.namespaces['xsi'])
         root.set('targetNamespace', 'http://www.activiti.org/bpmn')
         root.set('exporter', 'BPMN Converter')
-        root.set('exporterVersion', '1.0')
+        root.set('exporterVersion', self.VERSION)
         
         return root
     
-    def _convert_processes(self, old_root: ET.Element, new_root: ET.Element):
+    def _convert_processes(self, index: BPMNIndex, new_root: ET.Element):
         """Конвертация процессов"""
         # Находим все процессы в старом формате
-        processes = old_root.findall('.//process') or old_root.findall('.//{*}process')
+        processes = index.elements('process')
         
-        for old_process in processes:
-            new_process = ET.SubElement(new_root, 'process')
-            
-            # Копируем атрибуты процесса
-            process_id = old_process.get('id', f'process_{len(new_root.findall("process")) + 1}')
-            new_process.set('id', process_id)
-            new_process.set('isExecutable', old_process.get('isExecutable', 'true'))
-            
-            if old_process.get('name'):
-                new_process.set('name', old_process.get('name'))
-            
-            # Конвертируем элементы процесса
-            self._convert_process_elements(old_process, new_process)
+        for number, old_process in enumerate(processes, 1):
+            new_root.append(self._build_process(old_process, number, index))
+    
+    def _build_process(self, old_process: ET.Element, number: int, index: BPMNIndex) -> ET.Element:
+        """Процесс BPMN 2.0 со всеми сконвертированными элементами"""
+        new_process = self._create_process(old_process, number)
+        
+        # Конвертируем элементы процесса
+        self._convert_process_elements(old_process, new_process, index)
+        return new_process
+    
+    def _create_process(self, old_process: ET.Element, number: int) -> ET.Element:
+        """Создание процесса BPMN 2.0 по атрибутам исходного процесса"""
+        new_process = ET.Element('process')
+        
+        # Копируем атрибуты процесса (нумерация по умолчанию сохранена с прежних версий)
+        process_id = old_process.get('id', f'process_{number + 1}')
+        new_process.set('id', process_id)
+        new_process.set('isExecutable', old_process.get('isExecutable', 'true'))
+        
+        if old_process.get('name'):
+            new_process.set('name', old_process.get('name'))
+        
+        return new_process
     
-    def _convert_process_elements(self, old_process: ET.Element, new_process: ET.Element):
+    def _convert_process_elements(self, old_process: ET.Element, new_process: ET.Element, index: BPMNIndex):
         """Конвертация элементов процесса"""
+        lookup = self._lookup
         for child in old_process:
-            element_name = child.tag.split('}')[-1] if '}' in child.tag else child.tag
-            
-            if element_name in self.element_mapping:
-                self._convert_element(child, new_process, self.element_mapping[element_name])
+            entry = lookup(child.tag)
+            if entry is not None:
+                self._convert_element(child, new_process, entry, index)
     
-    def _convert_element(self, old_element: ET.Element, parent: ET.Element, new_tag: str):
-        """Конвертация отдельного элемента"""
+    def _convert_element(self, old_element: ET.Element, parent: ET.Element,
+                         entry: Tuple[str, Optional[ElementHandler]], index: BPMNIndex):
+        """Конвертация отдельного элемента по записи таблицы конвертации"""
+        new_tag, handler = entry
         new_element = ET.SubElement(parent, new_tag)
         
         # Копируем основные атрибуты
@@ -218,196 +1763,163 @@ class BPMNConverter:
                 new_element.set(attr_name, attr_value)
         
         # Обрабатываем специфичные элементы
-        if new_tag == 'sequenceFlow':
-            self._convert_sequence_flow(old_element, new_element)
-        elif new_tag in ['startEvent', 'endEvent', 'intermediateCatchEvent', 'intermediateThrowEvent']:
-            self._convert_event(old_element, new_element)
-        elif new_tag in ['exclusiveGateway', 'parallelGateway', 'inclusiveGateway']:
-            self._convert_gateway(old_element, new_element)
-        elif 'Task' in new_tag:
-            self._convert_task(old_element, new_element)
+        if handler is not None:
+            handler(old_element, new_element, index)
         
         # Копируем дочерние элементы
         for child in old_element:
-            child_name = child.tag.split('}')[-1] if '}' in child.tag else child.tag
-            if child_name in ['documentation', 'extensionElements']:
+            child_name = _local_name(child.tag)
+            if child_name == 'documentation' or child_name == 'extensionElements':
                 new_child = ET.SubElement(new_element, child_name)
                 new_child.text = child.text
                 for attr_name, attr_value in child.attrib.items():
                     new_child.set(attr_name, attr_value)
     
-    def _convert_sequence_flow(self, old_element: ET.Element, new_element: ET.Element):
+    def _convert_sequence_flow(self, old_element: ET.Element, new_element: ET.Element, index: BPMNIndex):
         """Конвертация sequence flow"""
         # Обработка условных выражений
-        condition = old_element.find('.//conditionExpression') or old_element.find('.//{*}conditionExpression')
+        condition = index.first_descendant(old_element, 'conditionExpression')
         if condition is not None:
             new_condition = ET.SubElement(new_element, 'conditionExpression')
             new_condition.set('xsi:type', 'tFormalExpression')
             new_condition.text = condition.text
     
-    def _convert_event(self, old_element: ET.Element, new_element: ET.Element):
+    def _convert_event(self, old_element: ET.Element, new_element: ET.Element, index: BPMNIndex):
         """Конвертация событий"""
         # Обработка определений событий
         for event_def in old_element:
-            event_def_name = event_def.tag.split('}')[-1] if '}' in event_def.tag else event_def.tag
+            event_def_name = _local_name(event_def.tag)
             if event_def_name.endswith('EventDefinition'):
                 new_event_def = ET.SubElement(new_element, event_def_name)
                 for attr_name, attr_value in event_def.attrib.items():
                     new_event_def.set(attr_name, attr_value)
     
-    def _convert_gateway(self, old_element: ET.Element, new_element: ET.Element):
+    def _convert_gateway(self, old_element: ET.Element, new_element: ET.Element, index: BPMNIndex):
         """Конвертация шлюзов"""
         # Шлюзы обычно не требуют специальной обработки
         pass
     
-    def _convert_task(self, old_element: ET.Element, new_element: ET.Element):
+    def _convert_task(self, old_element: ET.Element, new_element: ET.Element, index: BPMNIndex):
         """Конвертация задач"""
         # Обработка специфичных атрибутов задач
         pass
     
-    def _convert_diagrams(self, old_root: ET.Element, new_root: ET.Element):
+    def _convert_diagrams(self, index: BPMNIndex, new_root: ET.Element):
         """Конвертация диаграмм"""
         # Поиск диаграмм в старом формате
-        diagrams = old_root.findall('.//BPMNDiagram') or old_root.findall('.//{*}BPMNDiagram')
+        diagrams = index.elements('BPMNDiagram')
         
         for old_diagram in diagrams:
-            new_diagram = ET.SubElement(new_root, 'bpmndi:BPMNDiagram')
-            
-            if old_diagram.get('id'):
-                new_diagram.set('id', old_diagram.get('id'))
-            
-            # Конвертируем плоскость диаграммы
-            planes = old_diagram.findall('.//BPMNPlane') or old_diagram.findall('.//{*}BPMNPlane')
-            for old_plane in planes:
-                new_plane = ET.SubElement(new_diagram, 'bpmndi:BPMNPlane')
-                
-                if old_plane.get('id'):
-                    new_plane.set('id', old_plane.get('id'))
-                if old_plane.get('bpmnElement'):
-                    new_plane.set('bpmnElement', old_plane.get('bpmnElement'))
+            new_root.append(self._build_diagram(old_diagram, index))
     
-    def _convert_custom_format(self, old_root: ET.Element, new_root: ET.Element):
-        """Конвертация нестандартного формата BPMN"""
-        # Ищем BusinessProcessDiagram элементы
-        diagrams = old_root.findall('.//BusinessProcessDiagram')
+    def _build_diagram(self, old_diagram: ET.Element, index: BPMNIndex) -> ET.Element:
+        """Диаграмма BPMN 2.0 с плоскостями, фигурами, ребрами и стилями подписей"""
+        new_diagram = self._create_diagram(old_diagram)
+        # Координаты пересчитываются разом для всей диаграммы
+        coordinates = self._coordinate_buffer()
         
-        for diagram in diagrams:
-            # Создаем новый процесс
-            new_process = ET.SubElement(new_root, 'process')
-            
-            # Получаем ID и имя из диаграммы
-            process_id = diagram.get('id', 'process_1').strip('()')
-            process_name = ''
-            
-            # Ищем имя процесса
-            name_elem = diagram.find('Name')
-            if name_elem is not None and name_elem.text:
-                process_name = name_elem.text
-            
-            new_process.set('id', process_id)
-            new_process.set('isExecutable', 'true')
-            if process_name:
-                new_process.set('name', process_name)
-            
-            # Ищем Process элементы внутри диаграммы
-            processes = diagram.findall('.//Process')
-            
-            for process in processes:
-                # Конвертируем элементы процесса
-                self._convert_custom_process_elements(process, new_process)
-            
-            # Если процессов нет, создаем минимальный процесс
+        # Конвертируем плоскость диаграммы
+        planes = index.descendants(old_diagram, 'BPMNPlane')
+        for old_plane in planes:
+            new_plane = self._create_plane(old_plane)
+            for child in old_plane:
+                self._convert_di_element(child, new_plane, coordinates)
+            new_diagram.append(new_plane)
+        
+        for label_style in index.descendants(old_diagram, 'BPMNLabelStyle'):
+            self._convert_di_element(label_style, new_diagram, coordinates)
+        
+        if coordinates is not None:
+            coordinates.apply(self.di_transform)
+        return new_diagram
+    
+    def _create_diagram(self, old_diagram: ET.Element) -> ET.Element:
+        """Создание диаграммы BPMN 2.0"""
+        new_diagram = ET.Element('bpmndi:BPMNDiagram')
+        
+        if old_diagram.get('id'):
+            new_diagram.set('id', old_diagram.get('id'))
+        
+        return new_diagram
+    
+    def _create_plane(self, old_plane: ET.Element) -> ET.Element:
+        """Создание плоскости диаграммы BPMN 2.0"""
+        new_plane = ET.Element('bpmndi:BPMNPlane')
+        
+        if old_plane.get('id'):
+            new_plane.set('id', old_plane.get('id'))
+        if old_plane.get('bpmnElement'):
+            new_plane.set('bpmnElement', old_plane.get('bpmnElement'))
+        
+        return new_plane
+    
+    def _convert_di_element(self, old_element: ET.Element, parent: ET.Element,
+                            coordinates: Optional[CoordinateBuffer]):
+        """Конвертация элемента DI с потомками; неизвестные элементы пропускаются"""
+        name = _local_name(old_element.tag)
+        new_tag = DI_ELEMENTS.get(name)
+        if new_tag is None:
+            return
+        
+        new_element = ET.SubElement(parent, new_tag)
+        # Атрибуты копируются все: пересчитанные координаты перезаписываются на своих местах
+        for attr_name, attr_value in old_element.attrib.items():
+            if attr_name not in ['xmlns', 'xmlns:xsi']:
+                new_element.set(attr_name, attr_value)
+        if coordinates is not None and (name == 'Bounds' or name == 'waypoint'):
+            coordinates.add(name, new_element, old_element)
+        
+        for child in old_element:
+            self._convert_di_element(child, new_element, coordinates)
+    
+    def _write_custom_process(self, serializer: _XMLSerializer, process: CustomProcess, level: int):
+        """Запись процесса промежуточной модели нестандартного формата"""
+        if not process.nodes:
+            serializer.empty_element('process', process.attributes(), level)
+            return
+        serializer.open_element('process', process.attributes(), level)
+        self._write_custom_nodes(serializer, process.nodes, level + 1)
+        serializer.end_tag('process', level)
+    
+    def _write_custom_nodes(self, serializer: _XMLSerializer, nodes: List[CustomNode], level: int):
+        """Запись элементов процесса промежуточной модели"""
+        for node in nodes:
+            serializer.empty_element(node.tag, node.attributes(), level)
+    
+    def _serialize_custom_process(self, diagram: ET.Element, pretty: bool) -> str:
+        """Фрагмент процесса BPMN 2.0 для BusinessProcessDiagram без построения дерева результата"""
+        buffer = io.StringIO()
+        serializer = _XMLSerializer(buffer, pretty)
+        self._write_custom_process(serializer, read_custom_diagram(diagram), 1)
+        serializer.flush()
+        return buffer.getvalue()
+    
+    def _save_custom_model(self, processes: List[CustomProcess], output: Document, pretty: bool = True,
+                           root_namespaces: Optional[Dict[str, str]] = None):
+        """Сохранение документа BPMN 2.0 из промежуточной модели нестандартного формата"""
+        root = self._create_bpmn20_structure()
+        with _open_output(output) as stream:
+            serializer = _XMLSerializer(stream, pretty)
+            serializer.declaration()
             if not processes:
-                # Создаем простое стартовое событие
-                start_event = ET.SubElement(new_process, 'startEvent')
-                start_event.set('id', 'start_1')
-                start_event.set('name', 'Start')
-                
-                # Создаем конечное событие
-                end_event = ET.SubElement(new_process, 'endEvent')
-                end_event.set('id', 'end_1')
-                end_event.set('name', 'End')
-    
-    def _convert_custom_process_elements(self, old_process: ET.Element, new_process: ET.Element):
-        """Конвертация элементов из нестандартного формата"""
-        # Обрабатываем различные типы элементов
-        
-        # Обрабатываем Tasks
-        tasks = old_process.findall('.//Tasks')
-        for task_group in tasks:
-            for task in task_group:
-                if task.tag != 'Tasks':
-                    new_task = ET.SubElement(new_process, 'task')
-                    task_id = task.get('id', '').strip('()')
-                    if task_id:
-                        new_task.set('id', task_id)
-                    
-                    # Ищем имя задачи
-                    name_elem = task.find('Name')
-                    if name_elem is not None and name_elem.text:
-                        new_task.set('name', name_elem.text)
-        
-        # Обрабатываем SubProcesses
-        subprocesses = old_process.findall('.//SubProcesses')
-        for subprocess_group in subprocesses:
-            for subprocess in subprocess_group:
-                if subprocess.tag == 'SubProcess':
-                    new_subprocess = ET.SubElement(new_process, 'subProcess')
-                    subprocess_id = subprocess.get('id', '').strip('()')
-                    if subprocess_id:
-                        new_subprocess.set('id', subprocess_id)
-                    
-                    # Ищем имя подпроцесса
-                    name_elem = subprocess.find('Name')
-                    if name_elem is not None and name_elem.text:
-                        new_subprocess.set('name', name_elem.text)
-        
-        # Обрабатываем Events
-        events = old_process.findall('.//Events')
-        for event_group in events:
-            for event in event_group:
-                if event.tag != 'Events':
-                    # Определяем тип события по имени тега
-                    event_type = 'intermediateThrowEvent'
-                    if 'Start' in event.tag:
-                        event_type = 'startEvent'
-                    elif 'End' in event.tag:
-                        event_type = 'endEvent'
-                    
-                    new_event = ET.SubElement(new_process, event_type)
-                    event_id = event.get('id', '').strip('()')
-                    if event_id:
-                        new_event.set('id', event_id)
-                    
-                    # Ищем имя события
-                    name_elem = event.find('Name')
-                    if name_elem is not None and name_elem.text:
-                        new_event.set('name', name_elem.text)
-        
-        # Обрабатываем Gateways
-        gateways = old_process.findall('.//Gateways')
-        for gateway_group in gateways:
-            for gateway in gateway_group:
-                if gateway.tag != 'Gateways':
-                    new_gateway = ET.SubElement(new_process, 'exclusiveGateway')
-                    gateway_id = gateway.get('id', '').strip('()')
-                    if gateway_id:
-                        new_gateway.set('id', gateway_id)
-                    
-                    # Ищем имя шлюза
-                    name_elem = gateway.find('Name')
-                    if name_elem is not None and name_elem.text:
-                        new_gateway.set('name', name_elem.text)
-
-    def _save_formatted_xml(self, root: ET.Element, output_path: str):
-        """Сохранение XML с форматированием"""
-        # Преобразуем в строку
-        xml_str = ET.tostring(root, encoding='unicode')
-        
-        # Форматируем
-        dom = minidom.parseString(xml_str)
-        formatted_xml = dom.toprettyxml(indent='  ', encoding='utf-8')
-        
-        # Сохраняем в файл
-        with open(output_path, 'wb') as f:
-            f.write(formatted_xml) 
\ No newline at end of file
+                serializer.element(root, 0, self._output_prefixes(), root_namespaces)
+            else:
+                serializer.start_tag(root, 0, self._output_prefixes(), root_namespaces)
+                for process in processes:
+                    self._write_custom_process(serializer, process, 1)
+                serializer.end_tag(root.tag)
+            serializer.flush()
+
+    def _save_formatted_xml(self, root: ET.Element, output: Document, pretty: bool = True,
+                            root_namespaces: Optional[Dict[str, str]] = None):
+        """Сохранение XML с форматированием за один проход"""
+        with _open_output(output) as stream:
+            self._write_xml(root, stream, pretty, root_namespaces)
+    
+    def _write_xml(self, root: ET.Element, stream: TextIO, pretty: bool,
+                   root_namespaces: Optional[Dict[str, str]] = None):
+        """Запись документа в текстовый поток; root_namespaces - объявляемые на корне (см. _root_namespaces)"""
+        serializer = _XMLSerializer(stream, pretty)
+        serializer.declaration()
+        serializer.element(root, 0, self._output_prefixes(), root_namespaces)
+        serializer.flush()
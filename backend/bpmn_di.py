@@ -0,0 +1,112 @@
+import xml.etree.ElementTree as ET
+from array import array
+from itertools import chain, repeat
+from operator import add, mul
+from typing import Iterable, List
+
+# Элементы слоя DI: локальное имя -> тег BPMN 2.0
+DI_ELEMENTS = {
+    'BPMNShape': 'bpmndi:BPMNShape',
+    'BPMNEdge': 'bpmndi:BPMNEdge',
+    'BPMNLabel': 'bpmndi:BPMNLabel',
+    'BPMNLabelStyle': 'bpmndi:BPMNLabelStyle',
+    'Bounds': 'omgdc:Bounds',
+    'Font': 'omgdc:Font',
+    'waypoint': 'omgdi:waypoint'
+}
+
+# Знаков после запятой в пересчитанных координатах
+COORDINATE_PRECISION = 2
+
+
+class DITransform:
+    """Преобразование координат диаграмм: нормализация, масштаб и смещение"""
+
+    def __init__(self, scale: float = 1.0, offset_x: float = 0.0, offset_y: float = 0.0,
+                 normalize: bool = False):
+        if scale <= 0:
+            raise ValueError('Масштаб диаграммы должен быть положительным')
+        self.scale = float(scale)
+        self.offset_x = float(offset_x)
+        self.offset_y = float(offset_y)
+        # Сдвиг диаграммы в начало координат (до смещения)
+        self.normalize = normalize
+
+    @property
+    def identity(self) -> bool:
+        """Координаты переносятся без изменений"""
+        return self.scale == 1.0 and self.offset_x == 0.0 and self.offset_y == 0.0 and not self.normalize
+
+    def __repr__(self) -> str:
+        return (f'DITransform(scale={self.scale!r}, offset_x={self.offset_x!r}, '
+                f'offset_y={self.offset_y!r}, normalize={self.normalize!r})')
+
+
+class CoordinateBuffer:
+    """Координаты Bounds и waypoint диаграммы для пакетного пересчета в массивах array('d')"""
+
+    def __init__(self):
+        self._bounds: List[ET.Element] = []
+        self._points: List[ET.Element] = []
+        # Исходные значения подряд: x, y, width, height для Bounds и x, y для waypoint
+        self._bounds_values: List[str] = []
+        self._point_values: List[str] = []
+
+    def add(self, name: str, new_element: ET.Element, old_element: ET.Element):
+        """Регистрация элемента Bounds или waypoint; атрибуты координат записываются в apply"""
+        get = old_element.get
+        if name == 'Bounds':
+            self._bounds.append(new_element)
+            self._bounds_values += (get('x', '0'), get('y', '0'), get('width', '0'), get('height', '0'))
+        else:
+            self._points.append(new_element)
+            self._point_values += (get('x', '0'), get('y', '0'))
+
+    def apply(self, transform: DITransform):
+        """Пересчет всех координат и запись их в элементы"""
+        bounds = array('d', map(float, self._bounds_values))
+        points = array('d', map(float, self._point_values))
+        x, y, width, height = bounds[0::4], bounds[1::4], bounds[2::4], bounds[3::4]
+        point_x, point_y = points[0::2], points[1::2]
+
+        # Отрицательные размеры: угол переносится, размер берется по модулю
+        x = array('d', map(min, x, map(add, x, width)))
+        y = array('d', map(min, y, map(add, y, height)))
+        width = array('d', map(abs, width))
+        height = array('d', map(abs, height))
+
+        scale = transform.scale
+        shift_x, shift_y = transform.offset_x, transform.offset_y
+        if transform.normalize and (x or point_x):
+            shift_x -= min(chain(x, point_x)) * scale
+            shift_y -= min(chain(y, point_y)) * scale
+
+        columns = (self._scale(x, scale, shift_x), self._scale(y, scale, shift_y),
+                   self._scale(width, scale, 0.0), self._scale(height, scale, 0.0))
+        for element, value_x, value_y, value_width, value_height in zip(self._bounds, *map(self._format, columns)):
+            element.set('x', value_x)
+            element.set('y', value_y)
+            element.set('width', value_width)
+            element.set('height', value_height)
+
+        columns = (self._scale(point_x, scale, shift_x), self._scale(point_y, scale, shift_y))
+        for element, value_x, value_y in zip(self._points, *map(self._format, columns)):
+            element.set('x', value_x)
+            element.set('y', value_y)
+
+    @staticmethod
+    def _scale(values: array, scale: float, shift: float) -> array:
+        """values * scale + shift без цикла на уровне Python"""
+        if scale != 1.0:
+            values = map(mul, values, repeat(scale))
+        if shift:
+            values = map(add, values, repeat(shift))
+        return array('d', values)
+
+    @staticmethod
+    def _format(values: array) -> Iterable[str]:
+        """Строковые значения без лишних нулей: 100, 12.5, 0.25"""
+        # Округление и прибавление 0.0 убирают -0 из результата
+        rounded = map(add, map(round, values, repeat(COORDINATE_PRECISION)), repeat(0.0))
+        text = map(format, rounded, repeat(f'.{COORDINATE_PRECISION}f'))
+        return map(str.rstrip, map(str.rstrip, text, repeat('0')), repeat('.'))
@@ -0,0 +1,102 @@
+import json
+import math
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Iterable, List, Optional, TextIO
+
+from bpmn_graph import FLOW_NODES
+from custom_model import CustomProcess
+
+# Форматы выгрузки графа: JSON документ целиком или NDJSON - строка на процесс
+GRAPH_FORMATS = ('json', 'ndjson')
+
+# Узлы, внутри которых есть собственные узлы и потоки
+CONTAINERS = {'subProcess', 'transaction', 'adHocSubProcess'}
+
+# Границы фигуры: [x, y, width, height]
+Bounds = List[float]
+
+
+def _local_name(tag) -> str:
+    """Локальное имя тега: {namespace}name или prefix:name"""
+    if not isinstance(tag, str):
+        return ''
+    return tag.rsplit('}', 1)[-1].rsplit(':', 1)[-1]
+
+
+def diagram_bounds(diagram: ET.Element, bounds: Dict[str, Bounds]):
+    """Границы фигур диаграммы по id элемента процесса (первая фигура элемента)"""
+    for shape in diagram.iter():
+        if _local_name(shape.tag) != 'BPMNShape':
+            continue
+        element_id = shape.get('bpmnElement')
+        if not element_id or element_id in bounds:
+            continue
+        for child in shape:
+            if _local_name(child.tag) == 'Bounds':
+                try:
+                    values = [float(child.get(name)) for name in ('x', 'y', 'width', 'height')]
+                except (TypeError, ValueError):
+                    break
+                if all(math.isfinite(value) for value in values):
+                    bounds[element_id] = values
+                break
+
+
+def process_graph(process: ET.Element, bounds: Dict[str, Bounds]) -> Dict[str, Any]:
+    """Граф процесса BPMN 2.0: узлы с типом, именем и границами фигуры, потоки управления"""
+    graph = empty_process_graph(process)
+    extend_process_graph(graph, process, bounds)
+    return graph
+
+
+def empty_process_graph(process: ET.Element) -> Dict[str, Any]:
+    """Граф процесса без узлов и потоков (по атрибутам процесса)"""
+    return {'id': process.get('id'), 'name': process.get('name'), 'nodes': [], 'flows': []}
+
+
+def extend_process_graph(graph: Dict[str, Any], elements: Iterable[ET.Element], bounds: Dict[str, Bounds]):
+    """Узлы и потоки элементов процесса в граф; при потоковой выгрузке - по мере разбора"""
+    _collect(elements, None, bounds, graph['nodes'], graph['flows'])
+
+
+def _collect(container: Iterable[ET.Element], parent: Optional[str], bounds: Dict[str, Bounds],
+             nodes: List[Dict[str, Any]], flows: List[Dict[str, Any]]):
+    """Узлы и потоки контейнера; parent - id подпроцесса (None - сам процесс)"""
+    for child in container:
+        tag = _local_name(child.tag)
+        element_id = child.get('id') if tag else None
+        if tag == 'sequenceFlow':
+            flows.append({'id': element_id, 'source': child.get('sourceRef'), 'target': child.get('targetRef'),
+                          'name': child.get('name'), 'parent': parent})
+        elif element_id is not None and tag in FLOW_NODES:
+            nodes.append({'id': element_id, 'type': tag, 'name': child.get('name'), 'parent': parent,
+                          'bounds': bounds.get(element_id)})
+            if tag in CONTAINERS:
+                _collect(child, element_id, bounds, nodes, flows)
+
+
+def custom_process_graph(process: CustomProcess) -> Dict[str, Any]:
+    """Граф процесса промежуточной модели нестандартного формата (без потоков и диаграмм)"""
+    nodes = [{'id': node.id, 'type': node.tag, 'name': node.name, 'parent': None, 'bounds': None}
+             for node in process.nodes]
+    return {'id': process.id, 'name': process.name or None, 'nodes': nodes, 'flows': []}
+
+
+def write_graph(graphs: Iterable[Dict[str, Any]], stream: TextIO, graph_format: str = 'json'):
+    """Запись графов процессов по мере получения.
+
+    json - {"processes": [...]}, ndjson - по строке JSON на процесс.
+    """
+    if graph_format not in GRAPH_FORMATS:
+        raise ValueError(f'Неизвестный формат графа: {graph_format}')
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), check_circular=False)
+    if graph_format == 'ndjson':
+        for graph in graphs:
+            stream.write(encoder.encode(graph) + '\n')
+        return
+    stream.write('{"processes":[')
+    separator = ''
+    for graph in graphs:
+        stream.write(separator + encoder.encode(graph))
+        separator = ','
+    stream.write(']}\n')
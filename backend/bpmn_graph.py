@@ -0,0 +1,205 @@
+import xml.etree.ElementTree as ET
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Сколько проблем каждого вида возвращать в результате (остальные только считаются)
+MAX_GRAPH_ISSUES = 50
+
+# Соединения BPMN 2.0: узлами графа не являются. Ссылки sourceRef/targetRef проверяются
+# у sequenceFlow и association; messageFlow по определению ведет в другой процесс
+CONNECTIONS = {'sequenceFlow', 'messageFlow', 'association'}
+
+# Узлы графа - только элементы потока BPMN 2.0: события, операции и шлюзы.
+# Прочие элементы процесса с id (дорожки, данные, аннотации, группы, ioSpecification)
+# в потоке управления не участвуют. Общий набор для проверки целостности и выгрузки графа
+FLOW_NODES = frozenset({
+    'startEvent', 'endEvent', 'intermediateCatchEvent', 'intermediateThrowEvent', 'boundaryEvent',
+    'implicitThrowEvent',
+    'task', 'userTask', 'serviceTask', 'scriptTask', 'businessRuleTask', 'receiveTask', 'sendTask',
+    'manualTask', 'callActivity', 'subProcess', 'transaction', 'adHocSubProcess',
+    'exclusiveGateway', 'parallelGateway', 'inclusiveGateway', 'complexGateway', 'eventBasedGateway'
+})
+
+# Тег BPMN 2.0, в который конвертируется исходный тег (None - элемент не переносится)
+TagResolver = Callable[[str], Optional[str]]
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+class ProcessGraph:
+    """Граф потока управления одного процесса в том виде, в каком он попадет в результат конвертации.
+
+    Строится за один проход по элементам процесса: id -> номер узла и списки
+    смежности по sequenceFlow. Ссылки на элементы, которые конвертер не переносит,
+    считаются висячими, как и ссылки на несуществующие id.
+    """
+
+    def __init__(self, process: ET.Element, resolve: TagResolver):
+        self.process_id = process.get('id', '')
+        # Узлы: id и тег BPMN 2.0
+        self.node_ids: List[str] = []
+        self.node_tags: List[str] = []
+        self._number: Dict[str, int] = {}
+        # Узлы, с которых процесс может начаться без входящих потоков
+        self._entries: List[int] = []
+        # id всех элементов процесса, которые попадут в результат
+        self._present: set = set()
+        # id элементов процесса, которые не попадут в результат
+        self._dropped: Dict[str, str] = {}
+        # Ссылки: (id элемента, атрибут, id цели)
+        self._references: List[Tuple[str, str, str]] = []
+        self._edges: List[Tuple[str, str]] = []
+
+        self._build(process, resolve)
+
+    def _build(self, process: ET.Element, resolve: TagResolver):
+        """Проход по дочерним элементам процесса (конвертер переносит только их)"""
+        number = self._number
+        present = self._present
+        references = self._references
+        # Теги повторяются: разрешаем каждый один раз
+        resolved: Dict[str, Optional[str]] = {}
+        for child in process:
+            element_id = child.get('id')
+            tag = child.tag
+            try:
+                new_tag = resolved[tag]
+            except KeyError:
+                new_tag = resolved[tag] = resolve(tag)
+            if new_tag is None:
+                if element_id is not None:
+                    self._dropped.setdefault(element_id, _local_name(child.tag))
+                continue
+            if element_id is not None:
+                present.add(element_id)
+
+            if new_tag in CONNECTIONS:
+                if new_tag == 'messageFlow':
+                    continue
+                source, target = child.get('sourceRef') or '', child.get('targetRef') or ''
+                references.append((element_id or '', 'sourceRef', source))
+                references.append((element_id or '', 'targetRef', target))
+                if new_tag == 'sequenceFlow':
+                    self._edges.append((source, target))
+                continue
+
+            if new_tag == 'boundaryEvent':
+                # Граничное событие достижимо вместе с операцией, к которой прикреплено
+                host = child.get('attachedToRef') or ''
+                references.append((element_id or '', 'attachedToRef', host))
+                self._edges.append((host, element_id or ''))
+
+            if element_id is not None and new_tag in FLOW_NODES and element_id not in number:
+                if self._is_entry(child, new_tag):
+                    self._entries.append(len(self.node_ids))
+                number[element_id] = len(self.node_ids)
+                self.node_ids.append(element_id)
+                self.node_tags.append(new_tag)
+
+    def dangling_references(self) -> Iterable[Dict[str, str]]:
+        """Ссылки на элементы, которых не будет в результате конвертации"""
+        present = self._present
+        dropped = self._dropped
+        for element_id, attribute, target in self._references:
+            if target in present:
+                continue
+            if target in dropped:
+                reason = f'элемент {dropped[target]} не переносится при конвертации'
+            elif not target:
+                reason = 'ссылка не задана'
+            else:
+                reason = 'элемент не найден'
+            yield {'process': self.process_id, 'element': element_id, 'attribute': attribute,
+                   'ref': target, 'reason': reason}
+
+    def unreachable_nodes(self) -> Iterable[str]:
+        """Узлы, недостижимые от стартовых событий (без стартовых - от узлов без входящих потоков)"""
+        count = len(self.node_ids)
+        number = self._number
+        sources = array('l')
+        targets = array('l')
+        for source, target in self._edges:
+            source_number, target_number = number.get(source), number.get(target)
+            if source_number is not None and target_number is not None:
+                sources.append(source_number)
+                targets.append(target_number)
+
+        # Списки смежности в сжатом виде (CSR): потомки узла n - adjacent[offsets[n]:offsets[n + 1]]
+        offsets = array('l', bytes(array('l').itemsize * (count + 1)))
+        incoming = bytearray(count)
+        for source, target in zip(sources, targets):
+            offsets[source + 1] += 1
+            incoming[target] = 1
+        for n in range(count):
+            offsets[n + 1] += offsets[n]
+        adjacent = array('l', bytes(targets.itemsize * len(targets)))
+        fill = offsets[:-1]
+        for source, target in zip(sources, targets):
+            adjacent[fill[source]] = target
+            fill[source] += 1
+
+        roots = list(self._entries)
+        if not any(self.node_tags[n] == 'startEvent' for n in roots):
+            roots += [n for n in range(count) if not incoming[n]]
+
+        reached = bytearray(count)
+        for n in roots:
+            reached[n] = 1
+        # Обход в ширину; очередь - сам список roots
+        for n in roots:
+            for target in adjacent[offsets[n]:offsets[n + 1]]:
+                if not reached[target]:
+                    reached[target] = 1
+                    roots.append(target)
+
+        return (self.node_ids[n] for n in range(count) if not reached[n])
+
+    @staticmethod
+    def _is_entry(element: ET.Element, tag: str) -> bool:
+        """Узел, с которого процесс может начаться без входящих потоков"""
+        if tag == 'startEvent':
+            return True
+        # Событийные подпроцессы и обработчики компенсации запускаются событием, а не потоком
+        return element.get('triggeredByEvent') == 'true' or element.get('isForCompensation') == 'true'
+
+    def count(self, tag: str) -> int:
+        """Количество узлов с тегом BPMN 2.0"""
+        return self.node_tags.count(tag)
+
+
+def analyze_integrity(processes: Iterable[ET.Element], resolve: TagResolver) -> Dict[str, Any]:
+    """Ссылочная целостность процессов: висячие ссылки, недостижимые узлы,
+    процессы без стартовых и конечных событий. Время линейно от размера процессов.
+    """
+    dangling: List[Dict[str, str]] = []
+    unreachable: List[Dict[str, str]] = []
+    dangling_count = unreachable_count = 0
+    without_start: List[str] = []
+    without_end: List[str] = []
+
+    for process in processes:
+        graph = ProcessGraph(process, resolve)
+        for issue in graph.dangling_references():
+            dangling_count += 1
+            if dangling_count <= MAX_GRAPH_ISSUES:
+                dangling.append(issue)
+        for node_id in graph.unreachable_nodes():
+            unreachable_count += 1
+            if unreachable_count <= MAX_GRAPH_ISSUES:
+                unreachable.append({'process': graph.process_id, 'element': node_id})
+        if not graph.count('startEvent'):
+            without_start.append(graph.process_id)
+        if not graph.count('endEvent'):
+            without_end.append(graph.process_id)
+
+    return {
+        'integrity_valid': not (dangling_count or unreachable_count or without_start or without_end),
+        'dangling_references': dangling,
+        'dangling_reference_count': dangling_count,
+        'unreachable_nodes': unreachable,
+        'unreachable_node_count': unreachable_count,
+        'processes_without_start': without_start,
+        'processes_without_end': without_end
+    }
@@ -0,0 +1,138 @@
+import xml.etree.ElementTree as ET
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+
+class BPMNIndex:
+    """Индекс элементов BPMN документа, построенный за один обход дерева"""
+
+    def __init__(self, root: ET.Element):
+        self.root = root
+        # Элементы по локальному имени тега в порядке документа
+        self.by_name: Dict[str, List[ET.Element]] = {}
+        # Элементы по атрибуту id
+        self.by_id: Dict[str, ET.Element] = {}
+        # Количество элементов без учета корня
+        self.element_count = 0
+
+        # Номера элементов в прямом порядке обхода
+        self._positions: Dict[str, List[int]] = {}
+        self._order: Dict[ET.Element, int] = {}
+
+        self._build()
+
+    def _build(self):
+        """Обход дерева в прямом порядке"""
+        by_name = self.by_name
+        positions = self._positions
+        order = self._order
+        by_id = self.by_id
+        count = 0
+
+        for position, element in enumerate(self.root.iter()):
+            order[element] = position
+            tag = element.tag
+            if not isinstance(tag, str):
+                # Комментарии и инструкции обработки не индексируем
+                continue
+
+            count += 1
+            name = tag.split('}')[-1] if '}' in tag else tag
+            if name in by_name:
+                by_name[name].append(element)
+                positions[name].append(position)
+            else:
+                by_name[name] = [element]
+                positions[name] = [position]
+
+            element_id = element.get('id')
+            if element_id is not None and element_id not in by_id:
+                by_id[element_id] = element
+
+        self.element_count = count - 1
+
+    def _span(self, element: ET.Element) -> Tuple[int, int]:
+        """Границы поддерева элемента в порядке обхода"""
+        last = element
+        while len(last):
+            last = last[-1]
+        return self._order[element], self._order[last]
+
+    def elements(self, name: str) -> List[ET.Element]:
+        """Все элементы документа с указанным локальным именем"""
+        return self.by_name.get(name, [])
+
+    def get(self, element_id: str) -> Optional[ET.Element]:
+        """Элемент по id"""
+        return self.by_id.get(element_id)
+
+    def descendants(self, element: ET.Element, name: str) -> List[ET.Element]:
+        """Потомки элемента с указанным локальным именем (аналог findall('.//{*}name'))"""
+        positions = self._positions.get(name)
+        if not positions:
+            return []
+
+        start, end = self._span(element)
+        first = bisect_right(positions, start)
+        last = bisect_right(positions, end, first)
+        return self.by_name[name][first:last]
+
+    def first_descendant(self, element: ET.Element, name: str) -> Optional[ET.Element]:
+        """Первый потомок элемента с указанным локальным именем"""
+        positions = self._positions.get(name)
+        if not positions:
+            return None
+
+        start, end = self._span(element)
+        first = bisect_right(positions, start)
+        if first < len(positions) and positions[first] <= end:
+            return self.by_name[name][first]
+        return None
+
+
+class LxmlBPMNIndex:
+    """Индекс для деревьев lxml: выборки выполняются обходом на уровне C по запросу"""
+
+    def __init__(self, root):
+        self.root = root
+        self._by_name: Dict[str, list] = {}
+        self._by_id: Optional[Dict[str, object]] = None
+
+    @property
+    def element_count(self) -> int:
+        """Количество элементов без учета корня (подсчет без создания Python объектов)"""
+        return int(self.root.xpath('count(.//*)'))
+
+    @staticmethod
+    def _tag(name: str) -> str:
+        # {*} - элемент с таким локальным именем в любом namespace или без него
+        return '{*}' + name
+
+    def elements(self, name: str) -> list:
+        """Все элементы документа с указанным локальным именем"""
+        found = self._by_name.get(name)
+        if found is None:
+            found = self._by_name[name] = list(self.root.iter(self._tag(name)))
+        return found
+
+    def get(self, element_id: str):
+        """Элемент по id"""
+        if self._by_id is None:
+            self._by_id = {}
+            for element in self.root.xpath('descendant-or-self::*[@id]'):
+                self._by_id.setdefault(element.get('id'), element)
+        return self._by_id.get(element_id)
+
+    def descendants(self, element, name: str) -> list:
+        """Потомки элемента с указанным локальным именем (аналог findall('.//{*}name'))"""
+        found = list(element.iter(self._tag(name)))
+        if found and found[0] is element:
+            del found[0]
+        return found
+
+    def first_descendant(self, element, name: str):
+        """Первый потомок элемента с указанным локальным именем"""
+        for found in element.iter(self._tag(name)):
+            if found is not element:
+                return found
+        return None
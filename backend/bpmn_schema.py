@@ -0,0 +1,89 @@
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import xmlschema
+except ImportError:  # xmlschema не установлен - проверка по схеме недоступна
+    xmlschema = None
+
+# Каталог XSD схем (по умолчанию - schemas рядом с модулем)
+SCHEMA_DIR = os.environ.get('BPMN_SCHEMA_DIR',
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schemas'))
+
+# Главный файл схемы для каждой версии BPMN относительно SCHEMA_DIR.
+# В поставке есть схемы OMG BPMN 2.0; схемы версий 1.8/1.9 можно положить рядом
+SCHEMA_FILES = {
+    '2.0': os.path.join('bpmn20', 'BPMN20.xsd'),
+    '1.9': os.path.join('bpmn19', 'BPMN20.xsd'),
+    '1.8': os.path.join('bpmn18', 'BPMN20.xsd')
+}
+
+# Сколько ошибок схемы возвращать в результате (остальные только считаются)
+MAX_SCHEMA_ERRORS = 50
+
+
+class SchemaUnavailableError(Exception):
+    """Схема для версии BPMN недоступна"""
+
+
+# Скомпилированные схемы процесса: компиляция XSD намного дороже проверки документа
+_schemas: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def get_schema(version: str):
+    """Скомпилированная схема версии BPMN; компилируется один раз на процесс"""
+    schema = _schemas.get(version)
+    if schema is not None:
+        return schema
+
+    if xmlschema is None:
+        raise SchemaUnavailableError('Проверка по схеме недоступна: xmlschema не установлен')
+    relative = SCHEMA_FILES.get(version)
+    path = os.path.join(SCHEMA_DIR, relative) if relative else None
+    if path is None or not os.path.exists(path):
+        raise SchemaUnavailableError(f'Схема BPMN {version} не найдена')
+
+    with _lock:
+        schema = _schemas.get(version)
+        if schema is None:
+            # allow='local': импортируемые схемы читаются только с диска, без сети
+            schema = _schemas[version] = xmlschema.XMLSchema(path, allow='local')
+    return schema
+
+
+def preload_schemas() -> List[str]:
+    """Компиляция всех доступных схем заранее; возвращает загруженные версии"""
+    loaded = []
+    for version in SCHEMA_FILES:
+        try:
+            get_schema(version)
+            loaded.append(version)
+        except SchemaUnavailableError:
+            pass
+    return loaded
+
+
+def iter_document_errors(schema, source) -> Iterator[str]:
+    """Ошибки проверки документа целиком (путь или бинарный поток)"""
+    for error in schema.iter_errors(source):
+        yield _format_error(error)
+
+
+def iter_element_errors(schema, element, namespaces: Dict[str, str]) -> Iterator[str]:
+    """Ошибки проверки отдельного элемента по его глобальному объявлению в схеме.
+
+    namespaces - префиксы документа, нужные для значений xsi:type и других QName.
+    """
+    xsd_element = schema.maps.elements.get(element.tag)
+    if xsd_element is None:
+        yield f'{element.tag}: элемент не объявлен в схеме'
+        return
+    for error in xsd_element.iter_errors(element, namespaces=namespaces):
+        yield _format_error(error)
+
+
+def _format_error(error) -> str:
+    path: Optional[str] = error.path
+    return f'{path}: {error.reason}' if path else str(error.reason)
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Пакетная конвертация каталога BPMN файлов без веб-сервиса
+"""
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+from bpmn_converter import BPMNConverter, STREAMING_THRESHOLD
+from bpmn_di import DITransform
+from result_cache import ResultCache
+
+# Файл состояния для возобновления прерванного запуска
+STATE_FILENAME = '.bpmn_convert_state.json'
+# Как часто (в завершенных файлах) сохранять состояние
+STATE_SAVE_INTERVAL = 50
+# Сколько задач на рабочий процесс передается пулу заранее: очередь ограничена,
+# чтобы при прерывании не приходилось дожидаться (или отменять) весь список файлов
+SUBMIT_WINDOW_PER_WORKER = 2
+# Как часто (в секундах) основной процесс проверяет запрос на остановку
+STOP_POLL_INTERVAL = 0.5
+# Каталог фрагментов инкрементальной конвертации (внутри выходного каталога)
+FRAGMENTS_DIRNAME = '.bpmn_fragments'
+FRAGMENTS_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# Конвертер, хранилище фрагментов и признак остановки рабочего процесса
+_worker_converter: Optional[BPMNConverter] = None
+_worker_fragments: Optional[ResultCache] = None
+_worker_stop = None
+
+
+def _init_worker(fragments_dir: Optional[str] = None, di_transform: Optional[DITransform] = None,
+                 stop_event=None):
+    """Инициализация рабочего процесса пула"""
+    global _worker_converter, _worker_fragments, _worker_stop
+    # Ctrl+C из терминала получает вся группа процессов; остановкой управляет основной процесс
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_stop = stop_event
+    _worker_converter = BPMNConverter(di_transform=di_transform)
+    if fragments_dir:
+        _worker_fragments = ResultCache(disk_dir=fragments_dir, disk_max_bytes=FRAGMENTS_MAX_BYTES)
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def convert_file(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Конвертация одного файла в рабочем процессе"""
+    converter = _worker_converter or BPMNConverter()
+    source, target = task['source'], task['target']
+    started = time.perf_counter()
+    result = {'file': task['file'], 'output': task['output']}
+    if _worker_stop is not None and _worker_stop.is_set():
+        # Запуск прерван: задачи, уже переданные в очередь пула, не выполняются
+        result['status'] = 'cancelled'
+        return result
+    # Пишем во временный файл, чтобы прерванная запись не выглядела готовым результатом
+    temp_target = f'{target}.{os.getpid()}.part'
+
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if _worker_fragments is not None:
+            success = converter.convert_to_bpmn20_incremental(source, temp_target, _worker_fragments,
+                                                              task['pretty'])
+            result['fragments'] = dict(converter.last_fragments)
+        elif os.path.getsize(source) > STREAMING_THRESHOLD:
+            success = converter.convert_to_bpmn20_streaming(source, temp_target, task['pretty'])
+        else:
+            success = converter.convert_to_bpmn20(source, temp_target, task['pretty'])
+
+        if success:
+            os.replace(temp_target, target)
+            result['status'] = 'converted'
+            result['sha256'] = file_hash(source)
+        else:
+            result['status'] = 'failed'
+            result['error'] = converter.last_error or 'Ошибка конвертации BPMN'
+            if os.path.exists(temp_target):
+                os.remove(temp_target)
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+
+    result['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+class BulkConverter:
+    """Конвертация дерева каталогов на пуле процессов с возобновлением"""
+
+    def __init__(self, input_dir: str, output_dir: str, patterns: List[str], workers: int,
+                 check: str = 'mtime', pretty: bool = True, force: bool = False, incremental: bool = False,
+                 di_transform: Optional[DITransform] = None):
+        self.input_dir = os.path.abspath(input_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        self.patterns = patterns
+        self.workers = workers
+        self.check = check
+        self.pretty = pretty
+        self.force = force
+        self.incremental = incremental
+        self.di_transform = di_transform
+        self.state_path = os.path.join(self.output_dir, STATE_FILENAME)
+        self.state: Dict[str, Dict[str, Any]] = {}
+
+    def find_inputs(self) -> List[str]:
+        """Поиск входных файлов по шаблонам (пути относительно входного каталога)"""
+        files = set()
+        for pattern in self.patterns:
+            for path in glob.glob(os.path.join(self.input_dir, pattern), recursive=True):
+                if os.path.isfile(path) and not path.startswith(self.output_dir + os.sep):
+                    files.add(os.path.relpath(path, self.input_dir))
+        return sorted(files)
+
+    def load_state(self):
+        """Загрузка состояния предыдущего запуска"""
+        if self.force or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            print('⚠️  Файл состояния повреждён, начинаем заново')
+            self.state = {}
+
+    def save_state(self):
+        """Атомарное сохранение состояния"""
+        temp_path = self.state_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(temp_path, self.state_path)
+
+    def is_up_to_date(self, relative: str) -> bool:
+        """Результат существует и соответствует текущему входному файлу"""
+        if self.force:
+            return False
+
+        source = os.path.join(self.input_dir, relative)
+        target = os.path.join(self.output_dir, relative)
+        if not os.path.exists(target):
+            return False
+
+        entry = self.state.get(relative)
+        if self.check == 'hash':
+            return bool(entry) and entry.get('status') == 'converted' and entry.get('sha256') == file_hash(source)
+        return os.path.getmtime(target) >= os.path.getmtime(source)
+
+    def _collect(self, future: Future, relative: str, results: List[Dict[str, Any]], total: int):
+        """Учет завершенной задачи: результат сразу попадает в состояние"""
+        if future.cancelled():
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            # Рабочий процесс завершился аварийно (BrokenProcessPool)
+            result = {'file': relative, 'output': relative, 'status': 'failed', 'error': str(e)}
+        if result['status'] == 'cancelled':
+            # Файл не конвертировался и остается к конвертации
+            return
+
+        results.append(result)
+        self.state[result['file']] = {key: value for key, value in result.items() if key != 'file'}
+
+        if result['status'] == 'failed':
+            print(f"❌ {result['file']}: {result['error']}")
+        if len(results) % STATE_SAVE_INTERVAL == 0:
+            self.save_state()
+            print(f'⏳ {len(results)}/{total}')
+
+    def run(self) -> Dict[str, Any]:
+        """Запуск конвертации; возвращает сводку"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.load_state()
+        started = time.time()
+
+        inputs = self.find_inputs()
+        tasks = []
+        skipped = 0
+        for relative in inputs:
+            if self.is_up_to_date(relative):
+                skipped += 1
+                continue
+            tasks.append({
+                'file': relative,
+                'output': relative,
+                'source': os.path.join(self.input_dir, relative),
+                'target': os.path.join(self.output_dir, relative),
+                'pretty': self.pretty
+            })
+
+        print(f'📂 Найдено файлов: {len(inputs)}, актуальных: {skipped}, к конвертации: {len(tasks)}')
+
+        results: List[Dict[str, Any]] = []
+        interrupted = False
+        fragments_dir = os.path.join(self.output_dir, FRAGMENTS_DIRNAME) if self.incremental else None
+        stop_event = multiprocessing.Event()
+        previous_handler = signal.getsignal(signal.SIGINT)
+
+        def interrupt(signum, frame):
+            # Ctrl+C только останавливает выдачу задач: KeyboardInterrupt посреди работы
+            # с пулом оставляет его в несогласованном состоянии
+            stop_event.set()
+
+        # Обработчик устанавливается до создания пула и наследуется его процессами
+        signal.signal(signal.SIGINT, interrupt)
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                   initargs=(fragments_dir, self.di_transform, stop_event))
+        queue = iter(tasks)
+        running: Dict[Future, str] = {}
+
+        def submit_next():
+            task = next(queue, None)
+            if task is not None:
+                running[pool.submit(convert_file, task)] = task['file']
+
+        try:
+            for _ in range(self.workers * SUBMIT_WINDOW_PER_WORKER):
+                submit_next()
+            while running:
+                finished, _ = wait(list(running), timeout=STOP_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    self._collect(future, running.pop(future), results, len(tasks))
+                    if not stop_event.is_set():
+                        submit_next()
+
+                if stop_event.is_set() and not interrupted:
+                    interrupted = True
+                    # Не начатые задачи отменяются (переданные в очередь пула пропускаются рабочими),
+                    # запущенные дописываются и учитываются, чтобы состояние совпадало с диском
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    # Отмененные задачи wait() не возвращает - они остаются к конвертации
+                    for future in list(running):
+                        if future.cancel():
+                            del running[future]
+                    print(f'\n🛑 Прервано, ожидаем завершения запущенных задач: {len(running)}')
+        finally:
+            signal.signal(signal.SIGINT, previous_handler)
+            pool.shutdown(wait=False, cancel_futures=True)
+            self.save_state()
+
+        if interrupted:
+            print('🛑 Состояние сохранено - повторный запуск продолжит с места остановки')
+
+        summary = {
+            'input_dir': self.input_dir,
+            'output_dir': self.output_dir,
+            'total': len(inputs),
+            'up_to_date': skipped,
+            'converted': sum(1 for r in results if r['status'] == 'converted'),
+            'failed': sum(1 for r in results if r['status'] == 'failed'),
+            'pending': len(tasks) - len(results),
+            'interrupted': interrupted,
+            'duration_s': round(time.time() - started, 2),
+            'files': sorted(results, key=lambda r: r['file'])
+        }
+        return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Точка входа командной строки"""
+    parser = argparse.ArgumentParser(description='Пакетная конвертация BPMN 1.8/1.9 в BPMN 2.0')
+    parser.add_argument('input_dir', help='Каталог с исходными файлами')
+    parser.add_argument('output_dir', help='Каталог для результатов (структура подкаталогов сохраняется)')
+    parser.add_argument('-p', '--pattern', action='append', dest='patterns',
+                        help='Glob шаблон входных файлов (по умолчанию **/*.xml и **/*.bpmn)')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='Количество рабочих процессов (по умолчанию - число ядер)')
+    parser.add_argument('--check', choices=['mtime', 'hash'], default='mtime',
+                        help='Как определять актуальность результата')
+    parser.add_argument('--compact', action='store_true', help='Компактный XML без отступов')
+    parser.add_argument('--force', action='store_true', help='Конвертировать все файлы заново')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Повторно использовать результаты неизмененных процессов и диаграмм '
+                             f'(хранятся в <output_dir>/{FRAGMENTS_DIRNAME})')
+    parser.add_argument('--di-scale', type=float, default=1.0, help='Масштаб координат диаграмм')
+    parser.add_argument('--di-offset', default='0,0', help='Смещение координат диаграмм: X,Y')
+    parser.add_argument('--di-normalize', action='store_true',
+                        help='Сдвинуть диаграммы в начало координат (до смещения)')
+    parser.add_argument('--summary', help='Путь к JSON сводке (по умолчанию <output_dir>/conversion_summary.json)')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.input_dir):
+        print(f'❌ Каталог не найден: {args.input_dir}')
+        return 2
+
+    try:
+        offset_x, offset_y = (float(value) for value in args.di_offset.split(','))
+        di_transform = DITransform(args.di_scale, offset_x, offset_y, args.di_normalize)
+    except ValueError as e:
+        print(f'❌ Некорректные параметры диаграмм: {e}')
+        return 2
+
+    converter = BulkConverter(args.input_dir, args.output_dir, args.patterns or ['**/*.xml', '**/*.bpmn'],
+                              max(1, args.workers), check=args.check, pretty=not args.compact,
+                              force=args.force, incremental=args.incremental, di_transform=di_transform)
+    summary = converter.run()
+
+    summary_path = args.summary or os.path.join(converter.output_dir, 'conversion_summary.json')
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ Конвертировано: {summary['converted']}, ошибок: {summary['failed']}, "
+          f"актуальных: {summary['up_to_date']}, время: {summary['duration_s']} с")
+    print(f'📄 Сводка: {summary_path}')
+
+    if summary['interrupted']:
+        return 130
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,322 @@
+import gzip
+import io
+import json
+import os
+import re
+import threading
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows - порции одной загрузки упорядочиваются только внутри процесса
+    fcntl = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard не установлен - загрузки в zstd не принимаются
+    zstandard = None
+
+# Сигнатуры сжатых данных
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# Кодировки загрузок: auto - по сигнатуре первых байт при завершении загрузки
+ENCODINGS = ('auto', 'identity', 'gzip', 'zstd')
+
+# Размер блока при записи порций и распаковке
+COPY_BLOCK_SIZE = 1024 * 1024
+
+# Ошибки поврежденных сжатых данных
+_DECOMPRESS_ERRORS = (OSError, EOFError, zlib.error) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+
+class UploadError(Exception):
+    """Ошибка загрузки по частям"""
+
+
+class UploadNotFoundError(UploadError):
+    """Загрузка не найдена или устарела"""
+
+
+class UploadOffsetError(UploadError):
+    """Смещение порции не совпадает с уже принятым объемом"""
+
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        self.offset = offset
+
+
+class UploadTooLargeError(UploadError):
+    """Превышен допустимый размер загрузки или распакованного документа"""
+
+
+def detect_encoding(path: str) -> str:
+    """Кодировка файла по сигнатуре: gzip, zstd или identity"""
+    with open(path, 'rb') as f:
+        head = f.read(4)
+    if head.startswith(GZIP_MAGIC):
+        return 'gzip'
+    if head.startswith(ZSTD_MAGIC):
+        return 'zstd'
+    return 'identity'
+
+
+class DecompressedFile(io.RawIOBase):
+    """Поток распакованных данных файла, не больше max_size байт.
+
+    Возврат назад начинает распаковку заново (как gzip.GzipFile), поэтому документ
+    можно перечитать с начала, не сохраняя распакованные данные на диск. Размер
+    распакованных данных заранее неизвестен: позиционирование от конца не поддерживается.
+    """
+
+    def __init__(self, path: str, encoding: str, max_size: Optional[int] = None):
+        super().__init__()
+        self.encoding = encoding
+        self.max_size = max_size
+        self._file = open(path, 'rb')
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._stream: Optional[BinaryIO] = None
+        self._position = 0
+        try:
+            self._restart()
+        except Exception:
+            self._file.close()
+            raise
+
+    @property
+    def progress(self) -> float:
+        """Доля прочитанного сжатого файла"""
+        return min(self._file.tell() / self._size, 1.0) if self._size else 1.0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        try:
+            data = self._stream.read(len(buffer))
+        except _DECOMPRESS_ERRORS as e:
+            raise UploadError(f'Не удалось распаковать загрузку ({self.encoding}): {e}')
+        size = len(data)
+        buffer[:size] = data
+        self._position += size
+        if self.max_size is not None and self._position > self.max_size:
+            raise UploadTooLargeError(f'Распакованный документ больше {self.max_size} байт')
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation('Размер распакованных данных заранее неизвестен')
+        if offset < 0:
+            raise ValueError(f'Недопустимая позиция: {offset}')
+        if offset < self._position:
+            self._restart()
+        while self._position < offset:
+            if not self.read(min(COPY_BLOCK_SIZE, offset - self._position)):
+                break
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            if self._stream is not None and self._stream is not self._file:
+                self._stream.close()
+            self._file.close()
+        super().close()
+
+    def _restart(self):
+        """Распаковка с начала файла"""
+        if self._stream is not None and self._stream is not self._file:
+            self._stream.close()
+        self._file.seek(0)
+        self._position = 0
+        if self.encoding == 'gzip':
+            self._stream = gzip.GzipFile(fileobj=self._file, mode='rb')
+        elif self.encoding == 'zstd':
+            if zstandard is None:
+                raise UploadError('Загрузки в формате zstd не поддерживаются: zstandard не установлен')
+            self._stream = zstandard.ZstdDecompressor().stream_reader(self._file, read_across_frames=True,
+                                                                      closefd=False)
+        else:
+            self._stream = self._file
+
+
+def open_decompressed(path: str, encoding: str, max_size: Optional[int] = None) -> DecompressedFile:
+    """Поток распакованных данных файла; больше max_size не читается (защита от сжатых "бомб")"""
+    return DecompressedFile(path, encoding, max_size)
+
+
+class ChunkedUploadStore:
+    """Загрузки по частям: порции дописываются в файл загрузки по смещению.
+
+    Состояние хранится в каталоге (файл порций и описание в JSON), поэтому порции
+    одной загрузки могут приходить в разные процессы сервиса, а после обрыва связи
+    загрузка продолжается с принятого смещения.
+    """
+
+    def __init__(self, directory: str, max_size: int = 1024 * 1024 * 1024, ttl: int = 24 * 3600):
+        self.directory = directory
+        # Предельный размер загрузки (в том виде, в каком она передается - возможно, сжатой)
+        self.max_size = max_size
+        # Незавершенные загрузки удаляются после ttl секунд без новых порций
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def create(self, filename: str, size: Optional[int] = None, encoding: str = 'auto') -> Dict[str, Any]:
+        """Новая загрузка; size - ожидаемый размер, если известен"""
+        if encoding not in ENCODINGS:
+            raise UploadError(f'Неизвестная кодировка загрузки: {encoding}')
+        if encoding == 'zstd' and zstandard is None:
+            raise UploadError('Загрузки в формате zstd не поддерживаются: zstandard не установлен')
+        if size is not None and (size < 0 or size > self.max_size):
+            raise UploadTooLargeError(f'Размер загрузки больше допустимого ({self.max_size} байт)')
+
+        self._purge_expired()
+        now = time.time()
+        state = {
+            'upload_id': uuid.uuid4().hex,
+            'filename': filename,
+            'size': size,
+            'encoding': encoding,
+            'created_at': now,
+            'updated_at': now
+        }
+        open(self._part_path(state['upload_id']), 'wb').close()
+        self._save_state(state)
+        return self._with_offset(state)
+
+    def status(self, upload_id: str) -> Dict[str, Any]:
+        """Состояние загрузки с принятым смещением"""
+        return self._with_offset(self._load_state(upload_id))
+
+    def append(self, upload_id: str, offset: int, stream: BinaryIO) -> Dict[str, Any]:
+        """Запись порции из потока по смещению offset.
+
+        Смещение должно совпадать с уже принятым объемом (иначе UploadOffsetError
+        с текущим смещением). При обрыве передачи принятая часть порции сохраняется.
+        """
+        state = self._load_state(upload_id)
+        limit = state['size'] if state['size'] is not None else self.max_size
+        with open(self._part_path(upload_id), 'r+b') as part, self._locked(part):
+            current = os.fstat(part.fileno()).st_size
+            if offset != current:
+                raise UploadOffsetError(f'Ожидалась порция со смещения {current}', current)
+            part.seek(offset)
+            try:
+                for block in iter(lambda: stream.read(COPY_BLOCK_SIZE), b''):
+                    if part.tell() + len(block) > limit:
+                        raise UploadTooLargeError(f'Размер загрузки больше допустимого ({limit} байт)')
+                    part.write(block)
+            finally:
+                part.flush()
+                state['updated_at'] = time.time()
+                self._save_state(state)
+        return self._with_offset(state)
+
+    def finish(self, upload_id: str) -> Dict[str, Any]:
+        """Проверка полноты загрузки и определение кодировки.
+
+        Возвращает состояние с путем к файлу порций (part_path). Загрузка остается
+        в хранилище до release: при ошибке постановки в очередь завершение можно повторить.
+        """
+        state = self._with_offset(self._load_state(upload_id))
+        if state['size'] is not None and state['offset'] != state['size']:
+            raise UploadOffsetError(f'Загрузка не завершена: принято {state["offset"]} из {state["size"]} байт',
+                                    state['offset'])
+        if state['offset'] == 0:
+            raise UploadError('Загрузка пуста')
+
+        part_path = self._part_path(upload_id)
+        if state['encoding'] == 'auto':
+            state['encoding'] = detect_encoding(part_path)
+        if state['encoding'] == 'zstd' and zstandard is None:
+            raise UploadError('Загрузки в формате zstd не поддерживаются: zstandard не установлен')
+        state['part_path'] = part_path
+        return state
+
+    def release(self, upload_id: str):
+        """Удаление описания загрузки; файл порций передается новому владельцу"""
+        _remove_file(self._state_path(upload_id))
+
+    def remove(self, upload_id: str):
+        """Отмена загрузки с удалением принятых данных"""
+        self._load_state(upload_id)
+        _remove_file(self._part_path(upload_id))
+        _remove_file(self._state_path(upload_id))
+
+    @contextmanager
+    def _locked(self, part: BinaryIO):
+        """Исключительный доступ к файлу порций: в пределах процесса и между процессами сервиса"""
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(part.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(part.fileno(), fcntl.LOCK_UN)
+
+    def _with_offset(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            offset = os.path.getsize(self._part_path(state['upload_id']))
+        except OSError:
+            raise UploadNotFoundError('Загрузка не найдена')
+        return dict(state, offset=offset)
+
+    def _part_path(self, upload_id: str) -> str:
+        return os.path.join(self.directory, f'{upload_id}.part')
+
+    def _state_path(self, upload_id: str) -> str:
+        return os.path.join(self.directory, f'{upload_id}.json')
+
+    def _load_state(self, upload_id: str) -> Dict[str, Any]:
+        # Идентификатор попадает в путь: принимаем только сгенерированные create
+        if not re.fullmatch(r'[0-9a-f]{32}', upload_id):
+            raise UploadNotFoundError('Загрузка не найдена')
+        try:
+            with open(self._state_path(upload_id), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise UploadNotFoundError('Загрузка не найдена')
+
+    def _save_state(self, state: Dict[str, Any]):
+        """Атомарная запись описания загрузки"""
+        path = self._state_path(state['upload_id'])
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    def _purge_expired(self):
+        """Удаление загрузок без новых порций дольше ttl"""
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, encoding='utf-8') as f:
+                    updated_at = json.load(f)['updated_at']
+            except (OSError, ValueError, KeyError):
+                continue
+            if now - updated_at > self.ttl:
+                _remove_file(os.path.join(self.directory, name[:-len('.json')] + '.part'))
+                _remove_file(path)
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
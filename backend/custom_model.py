@@ -0,0 +1,137 @@
+import xml.etree.ElementTree as ET
+from typing import List, Optional, Tuple
+
+# Группы элементов процесса нестандартного формата в порядке вывода
+GROUPS = ('Tasks', 'SubProcesses', 'Events', 'Gateways')
+_GROUP_POSITIONS = {name: position for position, name in enumerate(GROUPS)}
+
+# Теги BPMN 2.0; строки общие для всех узлов модели
+TASK = 'task'
+SUB_PROCESS = 'subProcess'
+START_EVENT = 'startEvent'
+END_EVENT = 'endEvent'
+INTERMEDIATE_EVENT = 'intermediateThrowEvent'
+GATEWAY = 'exclusiveGateway'
+
+
+class CustomNode:
+    """Элемент процесса: тег BPMN 2.0, id и имя (пустые значения - None)"""
+
+    __slots__ = ('tag', 'id', 'name')
+
+    def __init__(self, tag: str, node_id: Optional[str], name: Optional[str]):
+        self.tag = tag
+        self.id = node_id
+        self.name = name
+
+    def attributes(self) -> List[Tuple[str, str]]:
+        """Атрибуты элемента BPMN 2.0 в порядке записи"""
+        attributes = []
+        if self.id:
+            attributes.append(('id', self.id))
+        if self.name:
+            attributes.append(('name', self.name))
+        return attributes
+
+
+class CustomProcess:
+    """Процесс BPMN 2.0 для одной BusinessProcessDiagram"""
+
+    __slots__ = ('id', 'name', 'nodes')
+
+    def __init__(self, process_id: str, name: Optional[str], nodes: List[CustomNode]):
+        self.id = process_id
+        self.name = name
+        self.nodes = nodes
+
+    def attributes(self) -> List[Tuple[str, str]]:
+        """Атрибуты процесса BPMN 2.0 в порядке записи"""
+        attributes = [('id', self.id), ('isExecutable', 'true')]
+        if self.name:
+            attributes.append(('name', self.name))
+        return attributes
+
+
+def default_nodes() -> List[CustomNode]:
+    """Минимальный процесс из стартового и конечного событий (диаграмма без Process)"""
+    return [CustomNode(START_EVENT, 'start_1', 'Start'), CustomNode(END_EVENT, 'end_1', 'End')]
+
+
+def _local_name(tag) -> str:
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+
+def _child_name(element: ET.Element) -> Optional[str]:
+    """Текст первого дочернего Name"""
+    name = element.find('Name')
+    if name is not None:
+        return name.text
+    return None
+
+
+def _node(tag: str, element: ET.Element) -> CustomNode:
+    return CustomNode(tag, element.get('id', '').strip('()') or None, _child_name(element) or None)
+
+
+def read_custom_nodes(process: ET.Element) -> List[CustomNode]:
+    """Элементы Process за один проход по его поддереву.
+
+    Дочерние элементы групп Tasks, SubProcesses, Events и Gateways (на любой
+    глубине) выводятся по группам в порядке GROUPS, внутри группы - в порядке документа.
+    """
+    groups: Tuple[List[CustomNode], ...] = ([], [], [], [])
+    tasks, subprocesses, events, gateways = groups
+    for group in process.iter():
+        position = _GROUP_POSITIONS.get(_local_name(group.tag))
+        if position is None or group is process:
+            continue
+        if position == 0:
+            tasks.extend(_node(TASK, task) for task in group if task.tag != 'Tasks')
+        elif position == 1:
+            subprocesses.extend(_node(SUB_PROCESS, subprocess) for subprocess in group
+                                if subprocess.tag == 'SubProcess')
+        elif position == 2:
+            for event in group:
+                if event.tag == 'Events':
+                    continue
+                # Тип события - по имени тега
+                if 'Start' in event.tag:
+                    event_type = START_EVENT
+                elif 'End' in event.tag:
+                    event_type = END_EVENT
+                else:
+                    event_type = INTERMEDIATE_EVENT
+                events.append(_node(event_type, event))
+        else:
+            gateways.extend(_node(GATEWAY, gateway) for gateway in group if gateway.tag != 'Gateways')
+    return tasks + subprocesses + events + gateways
+
+
+def custom_process_id(diagram: ET.Element) -> str:
+    """id процесса BPMN 2.0 по BusinessProcessDiagram"""
+    return diagram.get('id', 'process_1').strip('()')
+
+
+def read_custom_diagram(diagram: ET.Element) -> CustomProcess:
+    """Процесс BPMN 2.0 по разобранной BusinessProcessDiagram"""
+    nodes: List[CustomNode] = []
+    has_processes = False
+    for process in diagram.iter():
+        if process is not diagram and _local_name(process.tag) == 'Process':
+            has_processes = True
+            nodes.extend(read_custom_nodes(process))
+    return CustomProcess(custom_process_id(diagram), _child_name(diagram),
+                         nodes if has_processes else default_nodes())
+
+
+def read_custom_document(root: ET.Element) -> Tuple[List[CustomProcess], int]:
+    """Процессы BPMN 2.0 для всех BusinessProcessDiagram документа и число элементов без корня"""
+    processes = []
+    count = 0
+    for element in root.iter():
+        if not isinstance(element.tag, str):
+            continue
+        count += 1
+        if _local_name(element.tag) == 'BusinessProcessDiagram':
+            processes.append(read_custom_diagram(element))
+    return processes, count - 1
@@ -0,0 +1,78 @@
+"""
+Конфигурация gunicorn для промышленного запуска сервиса:
+
+    cd backend && gunicorn -c gunicorn.conf.py
+
+Параметры задаются переменными окружения BPMN_*
+"""
+import multiprocessing
+import os
+
+# Фабрика вызывается в каждом рабочем процессе после fork: каталоги, пулы, потоки
+# и прогрев создаются там, где будут обслуживаться запросы
+wsgi_app = 'app:create_app()'
+# Каталоги uploads и outputs задаются относительно backend
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = os.environ.get('BPMN_BIND', '0.0.0.0:5001')
+
+# Конвертация нагружает процессор, поэтому сервис масштабируется процессами:
+# по одному на ядро. Каждый процесс загружает приложение сам (без preload_app),
+# потому что потоки очереди заданий не переживают fork
+workers = int(os.environ.get('BPMN_WORKERS', multiprocessing.cpu_count()))
+# Потоки в процессе ускоряют медленные загрузки, но не конвертацию (GIL)
+threads = int(os.environ.get('BPMN_THREADS', 1))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Предельное время обработки запроса, секунды: процесс, превысивший его, перезапускается.
+# С потоками (gthread) это таймаут зависшего процесса, а не отдельного запроса
+timeout = int(os.environ.get('BPMN_TIMEOUT', 120))
+# Время на завершение текущих запросов и фоновых заданий при остановке (SIGTERM)
+graceful_timeout = int(os.environ.get('BPMN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('BPMN_KEEPALIVE', 5))
+
+# Перезапуск процесса после N запросов возвращает память, занятую большими документами
+max_requests = int(os.environ.get('BPMN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+# Пул пакетной конвертации каждого процесса делит ядра с остальными процессами
+os.environ.setdefault('BPMN_BATCH_WORKERS', str(max(1, multiprocessing.cpu_count() // max(workers, 1))))
+
+# Пульс процессов в памяти, а не на диске (в контейнерах /tmp может быть медленным)
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+# Снимки метрик рабочих процессов: /api/metrics любого процесса отдает их сумму
+os.environ.setdefault('BPMN_METRICS_DIR', os.path.join(chdir, 'outputs', 'metrics'))
+
+accesslog = '-'
+loglevel = os.environ.get('BPMN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    """Снимки метрик предыдущего запуска не учитываются"""
+    from metrics import SharedMetrics
+    SharedMetrics.reset(os.environ['BPMN_METRICS_DIR'])
+
+
+def post_fork(server, worker):
+    """Изолированные процессы обработки заново выполняют главный модуль - сценарий gunicorn;
+    его модули загружаются в сервер изолированных процессов заранее"""
+    from resource_limits import SANDBOX_PRELOAD
+    SANDBOX_PRELOAD.append('gunicorn.app.wsgiapp')
+
+
+def post_worker_init(worker):
+    """Приложение загружено и прогрето (app.create_app) до первого запроса"""
+    worker.log.info('Рабочий процесс %s готов к запросам', worker.pid)
+
+
+def worker_exit(server, worker):
+    """Остановка очереди заданий и пула пакетной конвертации процесса"""
+    from app import shutdown
+    shutdown()
+
+
+def child_exit(server, worker):
+    """Метрики завершившегося процесса (в том числе снятого по таймауту) сохраняются в общей сумме"""
+    from metrics import SharedMetrics
+    SharedMetrics.retire(os.environ['BPMN_METRICS_DIR'], worker.pid)
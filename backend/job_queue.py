@@ -0,0 +1,260 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, List, Optional
+
+from bpmn_converter import convert_document
+from chunked_upload import open_decompressed
+from metrics import MetricsRegistry
+from resource_limits import LimitExceededError, ResourceLimits, check_document, run_limited
+
+# Как часто сохранять прогресс задания в каталог состояния, секунды
+PROGRESS_SAVE_INTERVAL = 1.0
+
+# Предельный размер распакованного входного файла задания
+MAX_DECOMPRESSED_SIZE = 4 * 1024 * 1024 * 1024
+
+
+def convert_job(output: Optional[BinaryIO], input_path: str, encoding: Optional[str], output_path: str,
+                pretty: bool, limits: ResourceLimits,
+                progress: Optional[Callable[[float], None]] = None) -> Dict[str, Any]:
+    """Конвертация входного файла задания (для изолированного процесса): {'success', 'error', 'metrics'}.
+
+    Документ предварительно проверяется по бюджету задания (LimitExceededError): большой
+    файл проверяется здесь, в фоне, а не в запросе, который ставит задание в очередь.
+    """
+    if encoding and encoding != 'identity':
+        # Сжатый файл распаковывается по мере разбора, без распакованной копии на диске
+        source = open_decompressed(input_path, encoding, MAX_DECOMPRESSED_SIZE)
+    else:
+        source = open(input_path, 'rb')
+
+    def update_progress(value: float):
+        # Размер распакованного документа заранее неизвестен: прогресс - по сжатому файлу
+        if progress is not None:
+            progress(getattr(source, 'progress', value))
+
+    try:
+        check_document(source, limits)
+        return convert_document(output_path, source, 'convert_to_bpmn20_streaming', pretty, update_progress)
+    finally:
+        source.close()
+
+
+class QueueFullError(Exception):
+    """Очередь заданий заполнена"""
+
+
+class ConversionJob:
+    """Задание на фоновую конвертацию"""
+
+    def __init__(self, job_id: str, filename: str, input_path: str, output_path: str, pretty: bool,
+                 encoding: Optional[str] = None):
+        self.id = job_id
+        self.filename = filename
+        self.input_path = input_path
+        self.output_path = output_path
+        self.pretty = pretty
+        # Сжатие входного файла (gzip, zstd); распаковывается перед конвертацией
+        self.encoding = encoding
+        self.status = 'queued'
+        self.progress = 0.0
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('completed', 'failed')
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Состояние задания для ответа API"""
+        result = {
+            'job_id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'progress': round(self.progress, 3),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+        if self.error:
+            result['error'] = self.error
+        return result
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> 'ConversionJob':
+        """Задание из сохраненного состояния (для опроса из другого процесса)"""
+        job = cls(state['job_id'], state['filename'], state['input_path'], state['output_path'], state['pretty'],
+                  state.get('encoding'))
+        job.status = state['status']
+        job.progress = state['progress']
+        job.error = state.get('error')
+        job.created_at = state['created_at']
+        job.started_at = state['started_at']
+        job.finished_at = state['finished_at']
+        return job
+
+
+class ConversionJobQueue:
+    """Ограниченная очередь фоновых конвертаций с опросом статуса"""
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 16, result_ttl: int = 3600,
+                 metrics: Optional[MetricsRegistry] = None, state_dir: Optional[str] = None,
+                 limits: Optional[ResourceLimits] = None):
+        self.max_workers = max_workers
+        # Сколько заданий может ожидать или выполняться одновременно
+        self.max_pending = max_pending
+        # Время хранения результатов завершенных заданий, секунды
+        self.result_ttl = result_ttl
+        self.metrics = metrics
+        # Бюджет одного задания: конвертация идет в изолированном процессе
+        self.limits = limits or ResourceLimits()
+        # Каталог состояния заданий: при нескольких процессах сервиса статус и результат
+        # доступны из любого процесса (None - задания видны только своему процессу)
+        self.state_dir = state_dir
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bpmn-job')
+        self._jobs: Dict[str, ConversionJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, filename: str, input_path: str, output_path: str, pretty: bool = True,
+               encoding: Optional[str] = None) -> ConversionJob:
+        """Постановка задания в очередь; при переполнении - QueueFullError.
+        
+        encoding - сжатие входного файла (gzip, zstd; None - без сжатия).
+        """
+        with self._lock:
+            self._purge_expired()
+            active = sum(1 for job in self._jobs.values() if not job.finished)
+            if active >= self.max_pending:
+                raise QueueFullError('Очередь конвертации заполнена, повторите запрос позже')
+
+            job = ConversionJob(uuid.uuid4().hex, filename, input_path, output_path, pretty, encoding)
+            self._jobs[job.id] = job
+
+        self._save_state(job)
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ConversionJob]:
+        """Задание по идентификатору (в том числе выполняемое другим процессом)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.state_dir and re.fullmatch(r'[0-9a-f]{32}', job_id):
+            job = self._load_state(job_id)
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        """Количество заданий по статусам"""
+        with self._lock:
+            counts = {'queued': 0, 'running': 0, 'completed': 0, 'failed': 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            counts['capacity'] = self.max_pending
+            return counts
+
+    def shutdown(self):
+        """Остановка исполнителя с ожиданием текущих заданий"""
+        self._executor.shutdown(wait=True)
+
+    def _run(self, job: ConversionJob):
+        """Выполнение задания в фоновом потоке"""
+        job.status = 'running'
+        job.started_at = time.time()
+        if self.metrics is not None:
+            self.metrics.observe('bpmn_phase_duration_seconds', job.started_at - job.created_at, phase='queue')
+
+        self._save_state(job)
+        saved_at = time.time()
+
+        def update_progress(value: float):
+            nonlocal saved_at
+            job.progress = value
+            if time.time() - saved_at >= PROGRESS_SAVE_INTERVAL:
+                self._save_state(job)
+                saved_at = time.time()
+
+        try:
+            result = run_limited(convert_job, (job.input_path, job.encoding, job.output_path, job.pretty,
+                                               self.limits), None, self.limits, progress=update_progress)
+            if self.metrics is not None:
+                self.metrics.merge(result['metrics'])
+            if result['success']:
+                job.progress = 1.0
+                job.status = 'completed'
+            else:
+                job.error = result['error'] or 'Ошибка конвертации BPMN'
+                job.status = 'failed'
+        except LimitExceededError as e:
+            if self.metrics is not None:
+                self.metrics.inc('bpmn_limit_rejections_total', limit=e.kind)
+            job.error = str(e)
+            job.status = 'failed'
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+            if job.status == 'failed':
+                # Частичный результат прерванной конвертации не нужен
+                self._remove_file(job.output_path)
+            self._remove_file(job.input_path)
+            self._save_state(job)
+
+    def _purge_expired(self):
+        """Удаление устаревших завершенных заданий и их файлов"""
+        now = time.time()
+        expired: List[str] = [job_id for job_id, job in self._jobs.items()
+                              if job.finished and now - job.finished_at > self.result_ttl]
+        for job_id in expired:
+            job = self._jobs.pop(job_id)
+            self._remove_file(job.output_path)
+            if self.state_dir:
+                self._remove_file(self._state_path(job_id))
+
+    def _state_path(self, job_id: str) -> str:
+        return os.path.join(self.state_dir, f'{job_id}.json')
+
+    def _save_state(self, job: ConversionJob):
+        """Атомарная запись состояния задания в каталог состояния"""
+        if not self.state_dir:
+            return
+        state = job.to_dict()
+        state.update(input_path=job.input_path, output_path=job.output_path, pretty=job.pretty,
+                     progress=job.progress, encoding=job.encoding)
+        path = self._state_path(job.id)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except OSError:
+            self._remove_file(temp_path)
+
+    def _load_state(self, job_id: str) -> Optional[ConversionJob]:
+        """Задание другого процесса из каталога состояния; устаревшие удаляются"""
+        path = self._state_path(job_id)
+        try:
+            with open(path, encoding='utf-8') as f:
+                job = ConversionJob.from_state(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+        if job.finished and time.time() - job.finished_at > self.result_ttl:
+            self._remove_file(job.output_path)
+            self._remove_file(path)
+            return None
+        return job
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,323 @@
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Границы гистограмм длительности, секунды
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Границы гистограмм размеров, байты
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2,
+                64 * 1024 ** 2, 256 * 1024 ** 2, 1024 ** 3)
+# Границы гистограмм количества элементов
+COUNT_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000, 10000000)
+
+# Описание метрик: имя -> (тип, описание, границы гистограммы)
+METRICS = {
+    'bpmn_phase_duration_seconds': ('histogram', 'Длительность фаз конвертации и валидации', DURATION_BUCKETS),
+    'bpmn_document_elements': ('histogram', 'Количество элементов в обработанных документах', COUNT_BUCKETS),
+    'bpmn_input_bytes': ('histogram', 'Размер входных документов', SIZE_BUCKETS),
+    'bpmn_output_bytes': ('histogram', 'Размер результатов конвертации', SIZE_BUCKETS),
+    'bpmn_conversions_total': ('counter', 'Количество конвертаций по режиму и результату', None),
+    'bpmn_validations_total': ('counter', 'Количество валидаций по результату', None),
+    'bpmn_errors_total': ('counter', 'Количество ошибок по типу', None),
+    'bpmn_fragments_total': ('counter', 'Фрагменты инкрементальной конвертации: повторно использованные и новые', None),
+    'bpmn_http_requests_total': ('counter', 'Количество HTTP запросов', None),
+    'bpmn_http_request_duration_seconds': ('histogram', 'Длительность обработки HTTP запросов', DURATION_BUCKETS),
+    'bpmn_cache_events_total': ('counter', 'Обращения к кэшу результатов', None),
+    'bpmn_cache_bytes': ('gauge', 'Объем кэша результатов', None),
+    'bpmn_jobs': ('gauge', 'Задания фоновой конвертации по статусу', None),
+    'bpmn_limit_rejections_total': ('counter', 'Запросы, отклоненные по превышению бюджета обработки', None)
+}
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+class _Histogram:
+    """Гистограмма с накопительными корзинами в стиле Prometheus"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = tuple(buckets) + (math.inf,)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[position] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Потокобезопасный реестр счетчиков, гистограмм и показателей"""
+
+    def __init__(self):
+        self._values: Dict[str, Dict[LabelSet, float]] = {}
+        self._histograms: Dict[str, Dict[LabelSet, _Histogram]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _labels(labels: Dict[str, object]) -> LabelSet:
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Увеличение счетчика"""
+        key = self._labels(labels)
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """Установка текущего значения показателя"""
+        key = self._labels(labels)
+        with self._lock:
+            self._values.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        """Добавление наблюдения в гистограмму"""
+        key = self._labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(METRICS[name][2])
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Замер длительности блока в гистограмму"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def get(self, name: str, **labels) -> Optional[float]:
+        """Текущее значение счетчика или показателя"""
+        with self._lock:
+            return self._values.get(name, {}).get(self._labels(labels))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Значения метрик для передачи из другого процесса (см. merge)"""
+        with self._lock:
+            return {
+                'values': {name: dict(series) for name, series in self._values.items()},
+                'histograms': {name: {labels: (list(histogram.counts), histogram.sum, histogram.count)
+                                      for labels, histogram in series.items()}
+                               for name, series in self._histograms.items()}
+            }
+
+    def merge(self, snapshot: Dict[str, Any], sum_gauges: bool = False):
+        """Добавление метрик другого процесса: счетчики и гистограммы складываются,
+        показатели заменяются (или складываются при sum_gauges)"""
+        with self._lock:
+            for name, series in snapshot['values'].items():
+                values = self._values.setdefault(name, {})
+                gauge = METRICS.get(name, ('counter',))[0] == 'gauge' and not sum_gauges
+                for labels, value in series.items():
+                    values[labels] = value if gauge else values.get(labels, 0) + value
+            for name, series in snapshot['histograms'].items():
+                histograms = self._histograms.setdefault(name, {})
+                for labels, (counts, total, count) in series.items():
+                    histogram = histograms.get(labels)
+                    if histogram is None:
+                        histogram = histograms[labels] = _Histogram(METRICS[name][2])
+                    histogram.counts = [own + other for own, other in zip(histogram.counts, counts)]
+                    histogram.sum += total
+                    histogram.count += count
+
+    def render(self) -> str:
+        """Текстовый формат экспозиции Prometheus"""
+        lines: List[str] = []
+        with self._lock:
+            for name in sorted(set(self._values) | set(self._histograms)):
+                kind, description = METRICS.get(name, ('untyped', ''))[:2]
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} {kind}')
+
+                for labels, value in sorted(self._values.get(name, {}).items()):
+                    lines.append(f'{name}{self._format_labels(labels)} {self._format_value(value)}')
+
+                for labels, histogram in sorted(self._histograms.get(name, {}).items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        bucket_labels = labels + (('le', '+Inf' if bound == math.inf else self._format_value(bound)),)
+                        lines.append(f'{name}_bucket{self._format_labels(bucket_labels)} {cumulative}')
+                    lines.append(f'{name}_sum{self._format_labels(labels)} {self._format_value(histogram.sum)}')
+                    lines.append(f'{name}_count{self._format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _format_labels(labels: LabelSet) -> str:
+        if not labels:
+            return ''
+        escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+    @staticmethod
+    def _format_value(value: float) -> str:
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return repr(value) if isinstance(value, float) else str(value)
+
+
+def _dump_snapshot(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    """Снимок реестра в виде, пригодном для JSON (наборы меток - списки пар)"""
+    return {
+        'values': {name: [[list(labels), value] for labels, value in series.items()]
+                   for name, series in snapshot['values'].items()},
+        'histograms': {name: [[list(labels), counts, total, count]
+                              for labels, (counts, total, count) in series.items()]
+                       for name, series in snapshot['histograms'].items()}
+    }
+
+
+def _load_snapshot(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Обратное преобразование _dump_snapshot"""
+    def labels(pairs) -> LabelSet:
+        return tuple((name, value) for name, value in pairs)
+
+    return {
+        'values': {name: {labels(pairs): value for pairs, value in series}
+                   for name, series in data['values'].items()},
+        'histograms': {name: {labels(pairs): (counts, total, count) for pairs, counts, total, count in series}
+                       for name, series in data['histograms'].items()}
+    }
+
+
+class SharedMetrics:
+    """Метрики всех рабочих процессов сервиса через снимки в общем каталоге.
+
+    Каждый процесс раз в interval секунд сохраняет снимок своего реестра в файл
+    <pid>-<токен>.json, а запрос метрик складывает снимки всех процессов. Показатели
+    живых процессов суммируются. Снимок завершившегося процесса переносится в
+    retired.json (retire), чтобы счетчики не уменьшались при перезапуске процессов
+    """
+
+    RETIRED = 'retired.json'
+
+    def __init__(self, registry: MetricsRegistry, directory: str, interval: float = 2.0,
+                 refresh: Optional[Callable[[], None]] = None):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        # Обновление показателей процесса перед сохранением снимка
+        self.refresh = refresh
+        self.filename = f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json'
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        """Запуск фонового сохранения снимков"""
+        self.publish()
+        self._thread = threading.Thread(target=self._loop, name='bpmn-metrics', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Остановка фонового сохранения с последним снимком"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.publish()
+
+    def publish(self):
+        """Сохранение снимка метрик текущего процесса"""
+        if self.refresh is not None:
+            self.refresh()
+        self._write(self.directory, self.filename, _dump_snapshot(self.registry.snapshot()))
+
+    def collect(self) -> MetricsRegistry:
+        """Сумма метрик всех процессов: завершившихся, живых и текущего"""
+        if self.refresh is not None:
+            self.refresh()
+        merged = MetricsRegistry()
+        retired = self._read(self.directory, self.RETIRED)
+        skip = {self.filename, self.RETIRED}
+        if retired is not None:
+            merged.merge(_load_snapshot(retired['metrics']))
+            # Файл процесса мог еще не удалиться после переноса в retired.json
+            skip.update(retired['sources'])
+        for name in self._snapshot_files(self.directory):
+            data = self._read(self.directory, name)
+            if name not in skip and data is not None:
+                merged.merge(_load_snapshot(data), sum_gauges=True)
+        # Свой процесс - по текущему реестру, а не по последнему снимку
+        merged.merge(self.registry.snapshot(), sum_gauges=True)
+        return merged
+
+    @classmethod
+    def retire(cls, directory: str, pid: int):
+        """Перенос снимков завершившегося процесса в retired.json (вызывается главным процессом)"""
+        names = [name for name in cls._snapshot_files(directory) if name.startswith(f'{pid}-')]
+        if not names:
+            return
+        retired = cls._read(directory, cls.RETIRED)
+        merged = MetricsRegistry()
+        if retired is not None:
+            merged.merge(_load_snapshot(retired['metrics']))
+        for name in names:
+            data = cls._read(directory, name)
+            if data is None:
+                continue
+            # Показатели описывают живой процесс и после его завершения не учитываются
+            data['values'] = {metric: series for metric, series in data['values'].items()
+                              if METRICS.get(metric, ('counter',))[0] != 'gauge'}
+            merged.merge(_load_snapshot(data))
+        # Уже удаленные файлы из списка источников больше не нужны
+        sources = [name for name in (retired or {}).get('sources', [])
+                   if os.path.exists(os.path.join(directory, name))]
+        cls._write(directory, cls.RETIRED, {'sources': sources + names,
+                                            'metrics': _dump_snapshot(merged.snapshot())})
+        for name in names:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+    @classmethod
+    def reset(cls, directory: str):
+        """Удаление снимков предыдущего запуска сервиса"""
+        os.makedirs(directory, exist_ok=True)
+        for name in cls._snapshot_files(directory) + [cls.RETIRED]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+    def _loop(self):
+        while not self._stopped.wait(self.interval):
+            self.publish()
+
+    @classmethod
+    def _snapshot_files(cls, directory: str) -> List[str]:
+        try:
+            return [name for name in os.listdir(directory) if name.endswith('.json') and name != cls.RETIRED]
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def _read(directory: str, name: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(directory, name), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _write(directory: str, name: str, data: Dict[str, Any]):
+        # Атомарная замена: читатели видят либо старый, либо новый снимок
+        temp_path = os.path.join(directory, f'.{name}.{os.getpid()}.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file)
+        os.replace(temp_path, os.path.join(directory, name))
@@ -0,0 +1,364 @@
+import io
+import multiprocessing
+import os
+import signal
+import tempfile
+import time
+from typing import Any, BinaryIO, Callable, Optional, Sequence
+from xml.parsers import expat
+
+try:
+    import resource
+except ImportError:  # Windows - ограничения процесса недоступны, обработка идет в процессе сервиса
+    resource = None
+
+# Порция чтения при предварительной проверке документа
+CHECK_CHUNK_SIZE = 64 * 1024
+
+# Порция, которой документ передается изолированному процессу, а результат - обратно
+SANDBOX_CHUNK_SIZE = 64 * 1024
+
+# Документ держится в памяти изолированного процесса до этого размера, больше - во временном файле
+SANDBOX_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+# Время на запуск изолированного процесса и прием документа, секунды (в бюджет не входит)
+SANDBOX_START_TIMEOUT = 30
+
+# Изолированные процессы порождает forkserver: fork однопоточного сервера, запущенного заранее,
+# а не процесса сервиса, где потоки могут держать блокировки в момент fork. Модули сервиса
+# загружаются в сервер один раз: процесс заново выполняет только тело главного модуля
+SANDBOX_PRELOAD = ['app']
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SANDBOX_AVAILABLE = resource is not None and 'forkserver' in multiprocessing.get_all_start_methods()
+
+# Превышения, при которых документ отклоняется как некорректный (422); остальные - 413
+STRUCTURE_LIMITS = {'depth', 'entities'}
+
+
+class ResourceLimits:
+    """Бюджет обработки одного запроса; 0 - без ограничения"""
+
+    def __init__(self, max_depth: int = 256, max_elements: int = 2000000, max_attributes: int = 256,
+                 max_seconds: float = 60, max_memory: int = 1024 * 1024 * 1024, sandbox: Optional[bool] = None):
+        # Вложенность элементов, число элементов документа и атрибутов одного элемента
+        self.max_depth = max_depth
+        self.max_elements = max_elements
+        self.max_attributes = max_attributes
+        # Время обработки, секунды (с учетом передачи результата клиенту)
+        self.max_seconds = max_seconds
+        # Память, которую обработка может занять сверх унаследованной от процесса сервиса, байты
+        self.max_memory = max_memory
+        # Обработка в изолированном процессе; без него время и память не ограничиваются
+        self.sandbox = SANDBOX_AVAILABLE if sandbox is None else sandbox and SANDBOX_AVAILABLE
+
+    @classmethod
+    def from_env(cls, prefix: str = 'BPMN_', max_elements: int = 2000000, max_seconds: float = 60) -> 'ResourceLimits':
+        """Бюджет из переменных окружения {prefix}MAX_* и BPMN_SANDBOX; max_elements и max_seconds -
+        значения по умолчанию. Вложенность, атрибуты и память общие для всех бюджетов (BPMN_MAX_*)"""
+        sandbox = os.environ.get('BPMN_SANDBOX')
+        return cls(max_depth=int(os.environ.get('BPMN_MAX_DEPTH', 256)),
+                   max_elements=int(os.environ.get(f'{prefix}MAX_ELEMENTS', max_elements)),
+                   max_attributes=int(os.environ.get('BPMN_MAX_ATTRIBUTES', 256)),
+                   max_seconds=float(os.environ.get(f'{prefix}MAX_SECONDS', max_seconds)),
+                   max_memory=int(os.environ.get('BPMN_MAX_MEMORY_MB', 1024)) * 1024 * 1024,
+                   sandbox=None if sandbox is None else sandbox.lower() in ('1', 'true', 'yes'))
+
+    def message(self, kind: str) -> str:
+        """Текст ошибки превышения бюджета"""
+        return {
+            'depth': f'Вложенность элементов больше {self.max_depth}',
+            'elements': f'Документ содержит больше {self.max_elements} элементов',
+            'attributes': f'Элемент содержит больше {self.max_attributes} атрибутов',
+            'entities': 'Объявления сущностей (DTD) не допускаются',
+            'time': f'Обработка заняла больше {self.max_seconds:g} с',
+            'memory': f'Обработке требуется больше {self.max_memory // (1024 * 1024)} МБ памяти'
+        }[kind]
+
+
+class LimitExceededError(Exception):
+    """Превышен бюджет обработки запроса"""
+
+    def __init__(self, kind: str, message: str):
+        super().__init__(message)
+        self.kind = kind
+
+    @property
+    def status(self) -> int:
+        """HTTP статус ответа: 422 - недопустимая структура, 413 - слишком большой документ"""
+        return 422 if self.kind in STRUCTURE_LIMITS else 413
+
+
+class SandboxError(Exception):
+    """Ошибка обработки в изолированном процессе"""
+
+
+def check_document(source: BinaryIO, limits: ResourceLimits) -> int:
+    """Предварительная проверка документа по бюджету без построения дерева; возвращает число элементов.
+
+    Документ читается порциями и отклоняется на первом превышении (LimitExceededError),
+    не дожидаясь полного разбора. Синтаксические ошибки не проверяются: о них сообщит
+    основной разбор. Поток возвращается в исходную позицию.
+    """
+    max_depth = limits.max_depth or float('inf')
+    max_elements = limits.max_elements or float('inf')
+    # Атрибуты передаются списком [имя, значение, ...]
+    max_attribute_items = 2 * limits.max_attributes or float('inf')
+    depth = 0
+    count = 0
+
+    def start_element(name, attributes):
+        nonlocal depth, count
+        depth += 1
+        count += 1
+        if depth > max_depth:
+            raise LimitExceededError('depth', limits.message('depth'))
+        if count > max_elements:
+            raise LimitExceededError('elements', limits.message('elements'))
+        if len(attributes) > max_attribute_items:
+            raise LimitExceededError('attributes', limits.message('attributes'))
+
+    def end_element(name):
+        nonlocal depth
+        depth -= 1
+
+    def entity_declaration(*args):
+        raise LimitExceededError('entities', limits.message('entities'))
+
+    parser = expat.ParserCreate()
+    parser.ordered_attributes = True
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    parser.EntityDeclHandler = entity_declaration
+    start = source.tell()
+    try:
+        for chunk in iter(lambda: source.read(CHECK_CHUNK_SIZE), b''):
+            parser.Parse(chunk, False)
+        parser.Parse(b'', True)
+    except expat.ExpatError:
+        pass
+    finally:
+        source.seek(start)
+    return count
+
+
+def is_well_formed(source: BinaryIO) -> bool:
+    """Проверка корректности XML без построения дерева (expat почти не расходует память)"""
+    parser = expat.ParserCreate()
+    try:
+        parser.ParseFile(source)
+        return True
+    except expat.ExpatError:
+        return False
+
+
+class _SandboxOutput(io.BufferedIOBase):
+    """Выходной поток изолированного процесса: записанное передается порциями через соединение"""
+
+    def __init__(self, connection):
+        super().__init__()
+        self._connection = connection
+        self._buffer = bytearray()
+        self._written = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._written += len(data)
+        if len(self._buffer) >= SANDBOX_CHUNK_SIZE:
+            self.flush()
+        return len(data)
+
+    def tell(self) -> int:
+        return self._written
+
+    def flush(self):
+        if self._buffer:
+            self._connection.send(('data', bytes(self._buffer)))
+            self._buffer.clear()
+
+
+def _data_size() -> int:
+    """Текущий объем памяти данных процесса (VmData), 0 - неизвестен"""
+    try:
+        with open('/proc/self/status', 'rb') as f:
+            for line in f:
+                if line.startswith(b'VmData:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+class _StreamArgument:
+    """Место потока в аргументах изолированного процесса: данные передаются через соединение"""
+
+
+def _receive_stream(connection) -> BinaryIO:
+    """Прием потока, переданного процессом сервиса порциями (пустая порция - конец)"""
+    spool = tempfile.SpooledTemporaryFile(max_size=SANDBOX_SPOOL_MAX_SIZE)
+    for chunk in iter(connection.recv_bytes, b''):
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def _send_stream(connection, stream: BinaryIO):
+    """Передача потока с текущей позиции; позиция потока восстанавливается"""
+    start = stream.tell()
+    try:
+        for chunk in iter(lambda: stream.read(SANDBOX_CHUNK_SIZE), b''):
+            connection.send_bytes(chunk)
+        connection.send_bytes(b'')
+    finally:
+        stream.seek(start)
+
+
+def _sandbox_main(connection, limits: ResourceLimits, target: Callable, args: Sequence, report_progress: bool):
+    """Точка входа изолированного процесса"""
+    args = [_receive_stream(connection) if isinstance(arg, _StreamArgument) else arg for arg in args]
+
+    # Бюджет отсчитывается с начала работы. Память данных ограничивается ядром; процессорное
+    # время - страховка на случай, если процесс сервиса не успеет завершить изолированный процесс
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    if limits.max_memory:
+        memory = _data_size() + limits.max_memory
+        resource.setrlimit(resource.RLIMIT_DATA, (memory, memory))
+    if limits.max_seconds:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu_seconds = int(usage.ru_utime + usage.ru_stime + limits.max_seconds) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    connection.send(('ready',))
+
+    output = _SandboxOutput(connection)
+    options = {}
+    if report_progress:
+        options['progress'] = lambda value: connection.send(('progress', value))
+    try:
+        result = target(output, *args, **options)
+        output.flush()
+        message = ('done', result)
+    except MemoryError:
+        message = ('limit', 'memory')
+    except LimitExceededError as e:
+        message = ('limit', e.kind)
+    except Exception as e:
+        message = ('error', f'{type(e).__name__}: {e}')
+    try:
+        connection.send(message)
+    except OSError:
+        pass
+    finally:
+        connection.close()
+
+
+def _exit_error(process, limits: ResourceLimits) -> Exception:
+    """Ошибка по коду завершения изолированного процесса, не передавшего результат"""
+    process.join(1)
+    if process.exitcode == -signal.SIGXCPU:
+        return LimitExceededError('time', limits.message('time'))
+    if process.exitcode == -signal.SIGKILL:
+        # Процесс завершен системой при нехватке памяти
+        return LimitExceededError('memory', limits.message('memory'))
+    return SandboxError(f'Процесс обработки завершился с кодом {process.exitcode}')
+
+
+def start_sandbox():
+    """Запуск сервера изолированных процессов до первого запроса (без него сервер запускается
+    первым запросом и не загружает модули сервиса заранее)"""
+    if not SANDBOX_AVAILABLE:
+        return
+    from multiprocessing import forkserver
+    _sandbox_context()
+    # Сервер не получает sys.path процесса сервиса, модули backend он находит через PYTHONPATH
+    python_path = os.environ.get('PYTHONPATH')
+    os.environ['PYTHONPATH'] = os.pathsep.join(filter(None, [BACKEND_DIR, python_path]))
+    try:
+        forkserver.ensure_running()
+    finally:
+        if python_path is None:
+            del os.environ['PYTHONPATH']
+        else:
+            os.environ['PYTHONPATH'] = python_path
+
+
+def _sandbox_context():
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(SANDBOX_PRELOAD)
+    return context
+
+
+def run_limited(target: Callable, args: Sequence, output: Optional[BinaryIO], limits: ResourceLimits,
+                progress: Optional[Callable[[float], None]] = None) -> Any:
+    """Выполнение target(output, *args) в изолированном процессе в пределах бюджета.
+
+    Записанное target в output передается в output по мере записи. Бинарные потоки среди args
+    (тело запроса) передаются процессу через соединение, остальные аргументы - pickle. Время
+    отсчитывается с момента, когда процесс принял документ и начал работу. Процесс завершается
+    при превышении времени или памяти (LimitExceededError); исключение target - SandboxError.
+    Результат target должен сериализоваться pickle. С progress target получает одноименный
+    аргумент, вызовы которого передаются в progress процесса сервиса.
+    """
+    options = {} if progress is None else {'progress': progress}
+    if not limits.sandbox:
+        try:
+            return target(output, *args, **options)
+        except MemoryError:
+            raise LimitExceededError('memory', limits.message('memory'))
+
+    context = _sandbox_context()
+    connection, child_connection = context.Pipe()
+    streams = [arg for arg in args if hasattr(arg, 'read')]
+    placeholders = [_StreamArgument() if hasattr(arg, 'read') else arg for arg in args]
+    process = context.Process(target=_sandbox_main, name='bpmn-sandbox', daemon=True,
+                              args=(child_connection, limits, target, placeholders, progress is not None))
+    process.start()
+    child_connection.close()
+    started = False
+    deadline = None
+    try:
+        try:
+            for stream in streams:
+                _send_stream(connection, stream)
+        except OSError:
+            # Процесс завершился, не приняв документ
+            raise _exit_error(process, limits)
+
+        while True:
+            if not started:
+                timeout = SANDBOX_START_TIMEOUT
+            elif deadline is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    raise LimitExceededError('time', limits.message('time'))
+            else:
+                timeout = None
+            if not connection.poll(timeout):
+                if not started:
+                    raise SandboxError('Процесс обработки не запустился')
+                raise LimitExceededError('time', limits.message('time'))
+            try:
+                message = connection.recv()
+            except (EOFError, OSError):
+                raise _exit_error(process, limits)
+            kind = message[0]
+            if kind == 'data':
+                output.write(message[1])
+            elif kind == 'progress':
+                progress(message[1])
+            elif kind == 'ready':
+                started = True
+                if limits.max_seconds:
+                    deadline = time.monotonic() + limits.max_seconds
+            elif kind == 'done':
+                return message[1]
+            elif kind == 'limit':
+                raise LimitExceededError(message[1], limits.message(message[1]))
+            else:
+                raise SandboxError(message[1])
+    finally:
+        connection.close()
+        if process.is_alive():
+            process.kill()
+        process.join()
@@ -0,0 +1,185 @@
+import io
+import queue
+import threading
+import zlib
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # zstandard не установлен - ответы сжимаются только gzip
+    zstandard = None
+
+# Кодировки ответа в порядке предпочтения сервера
+RESPONSE_ENCODINGS = (['zstd'] if zstandard is not None else []) + ['gzip', 'identity']
+
+# Уровни сжатия: быстрые, ответ сжимается на лету
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Размер порции ответа и сколько порций может ждать медленного клиента
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_MAX_PENDING = 16
+
+# Конец потока в очереди порций
+_END = object()
+
+
+class ConversionStreamError(Exception):
+    """Конвертация прервалась после начала передачи ответа"""
+
+
+def negotiate_encoding(accept_encodings) -> str:
+    """Кодировка ответа по заголовку Accept-Encoding (werkzeug Accept)"""
+    return accept_encodings.best_match(RESPONSE_ENCODINGS, default='identity') or 'identity'
+
+
+def _compressor(encoding: str):
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    # wbits=31 - формат gzip (заголовок и контрольная сумма)
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+
+def compress_chunks(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """Сжатие последовательности порций на лету (identity - без изменений)"""
+    if encoding == 'identity':
+        yield from chunks
+        return
+    compressor = _compressor(encoding)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_bytes(data: bytes, encoding: str) -> bytes:
+    """Сжатие готового ответа целиком"""
+    return b''.join(compress_chunks([data], encoding))
+
+
+def iter_file(stream: BinaryIO, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """Чтение потока порциями; поток закрывается по окончании"""
+    try:
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            yield chunk
+    finally:
+        stream.close()
+
+
+class _OutputPipe(io.BufferedIOBase):
+    """Выходной поток конвертера, передающий записанное в очередь порций ответа"""
+
+    def __init__(self, chunks: 'queue.Queue', cancelled: threading.Event, chunk_size: int):
+        super().__init__()
+        self._chunks = chunks
+        self._cancelled = cancelled
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._written = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._written += len(data)
+        if len(self._buffer) >= self._chunk_size:
+            self.put(bytes(self._buffer))
+            self._buffer.clear()
+        return len(data)
+
+    def tell(self) -> int:
+        return self._written
+
+    def put(self, item):
+        """Передача порции; ждет, пока клиент заберет предыдущие"""
+        while True:
+            if self._cancelled.is_set():
+                raise BrokenPipeError('Клиент закрыл соединение')
+            try:
+                self._chunks.put(item, timeout=1.0)
+                return
+            except queue.Full:
+                continue
+
+    def finish(self):
+        """Передача остатка"""
+        if self._buffer:
+            self.put(bytes(self._buffer))
+            self._buffer.clear()
+
+
+class ConversionStream:
+    """Ответ, который передается клиенту по мере записи конвертером.
+
+    convert(output) выполняется в отдельном потоке и пишет результат в output;
+    записанное отдается порциями итерацией по объекту. Медленный клиент
+    притормаживает конвертацию (очередь порций ограничена), закрытое соединение
+    прерывает ее.
+    """
+
+    def __init__(self, convert: Callable[[BinaryIO], bool], chunk_size: int = STREAM_CHUNK_SIZE,
+                 max_pending: int = STREAM_MAX_PENDING):
+        self._convert = convert
+        self._chunks: 'queue.Queue' = queue.Queue(maxsize=max_pending)
+        self._cancelled = threading.Event()
+        self._output = _OutputPipe(self._chunks, self._cancelled, chunk_size)
+        self._first = _END
+        self.success = False
+        self.error: Optional[str] = None
+        # Исключение, прервавшее конвертацию
+        self.exception: Optional[Exception] = None
+
+    def start(self) -> bool:
+        """Запуск конвертации и ожидание первой порции.
+
+        False - конвертация завершилась ошибкой, не записав ничего: ответ еще можно
+        заменить сообщением об ошибке.
+        """
+        threading.Thread(target=self._run, name='bpmn-response', daemon=True).start()
+        self._first = self._chunks.get()
+        return self._first is not _END or self.success
+
+    def __iter__(self) -> Iterator[bytes]:
+        item = self._first
+        try:
+            while item is not _END:
+                yield item
+                item = self._chunks.get()
+            if not self.success:
+                # Статус ответа уже отправлен: обрыв передачи сообщает клиенту о неполном ответе
+                raise ConversionStreamError(self.error or 'Ошибка конвертации BPMN')
+        finally:
+            self._cancelled.set()
+
+    def _run(self):
+        try:
+            self.success = bool(self._convert(self._output))
+            if self.success:
+                self._output.finish()
+        except Exception as e:
+            self.error = str(e)
+            self.exception = e
+            self.success = False
+        finally:
+            try:
+                self._output.put(_END)
+            except BrokenPipeError:
+                pass
+
+
+def tee_chunks(chunks: Iterable[bytes], max_bytes: int, on_complete: Callable[[bytes], None]) -> Iterator[bytes]:
+    """Передача порций дальше с накоплением копии до max_bytes; по окончании - on_complete(данные)"""
+    collected: Optional[List[bytes]] = []
+    size = 0
+    for chunk in chunks:
+        if collected is not None:
+            size += len(chunk)
+            if size <= max_bytes:
+                collected.append(chunk)
+            else:
+                collected = None
+        yield chunk
+    if collected is not None:
+        on_complete(b''.join(collected))
@@ -0,0 +1,193 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Union
+
+# Версия схемы кэша: увеличивается при любом изменении результатов конвертации
+# или валидации, чтобы старые записи (в том числе на диске) не отдавались.
+# С exporterVersion в выходных документах не связана
+CACHE_VERSION = 3
+
+
+class ResultCache:
+    """Кэш результатов конвертации и валидации с адресацией по содержимому входного файла"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_item_bytes: int = 8 * 1024 * 1024,
+                 disk_dir: Optional[str] = None, disk_max_bytes: int = 512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+
+        # Первый уровень - LRU в памяти, второй (необязательный) - каталог на диске.
+        # Дисковый уровень общий для всех рабочих процессов, поэтому его состояние
+        # не хранится в памяти, а каждый раз берется из файловой системы
+        self._memory: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(data: Union[bytes, BinaryIO], kind: str, **options: Any) -> str:
+        """Ключ кэша: хэш входных данных, вид операции, версия схемы кэша и опции"""
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            digest = hashlib.sha256(data)
+        else:
+            # Поток хэшируется порциями и возвращается в исходную позицию
+            digest = hashlib.sha256()
+            position = data.tell()
+            for chunk in iter(lambda: data.read(1024 * 1024), b''):
+                digest.update(chunk)
+            data.seek(position)
+        params = ';'.join(f'{name}={options[name]}' for name in sorted(options))
+        digest.update(f'\0{kind}\0{CACHE_VERSION}\0{params}'.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Значение из кэша или None"""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return value
+
+        # Диск читается без блокировки: согласованность обеспечивает атомарная замена файлов
+        value = self._read_disk(key) if self.disk_dir else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self._store_memory(key, value)
+            self.hits += 1
+            self.disk_hits += 1
+            return value
+
+    def put(self, key: str, value: bytes):
+        """Сохранение значения в кэше"""
+        if len(value) > self.max_item_bytes:
+            return
+
+        with self._lock:
+            self._store_memory(key, value)
+        if self.disk_dir:
+            self._write_disk(key, value)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Объем записей в памяти процесса (без обхода дискового уровня)"""
+        with self._lock:
+            return self._memory_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика попаданий и заполненности кэша"""
+        disk_entries = self._disk_entries()
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / requests, 3) if requests else 0.0,
+                'entries': len(self._memory),
+                'bytes': self._memory_bytes,
+                'max_bytes': self.max_bytes,
+                'disk_entries': len(disk_entries),
+                'disk_bytes': sum(size for _, size, _ in disk_entries)
+            }
+
+    def clear(self):
+        """Очистка обоих уровней кэша"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            for _, _, path in self._disk_entries():
+                self._remove(path)
+
+    def _store_memory(self, key: str, value: bytes):
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+
+        self._memory[key] = value
+        self._memory_bytes += len(value)
+
+        # Вытесняем давно не использованные записи
+        while self._memory_bytes > self.max_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f'{key}.cache')
+
+    def _disk_entries(self) -> List[Tuple[float, int, str]]:
+        """Записи дискового уровня (время последнего использования, размер, путь)"""
+        if not self.disk_dir:
+            return []
+        entries = []
+        try:
+            with os.scandir(self.disk_dir) as scan:
+                for entry in scan:
+                    if not entry.name.endswith('.cache'):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        # Запись удалена другим процессом во время обхода
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            return []
+        return entries
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = f.read()
+        except OSError:
+            return None
+        # Время изменения файла служит отметкой последнего использования:
+        # atime на многих файловых системах не обновляется (noatime/relatime)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def _write_disk(self, key: str, value: bytes):
+        path = self._disk_path(key)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(value)
+            # Атомарная замена: читатели видят либо старый, либо новый файл целиком
+            os.replace(temp_path, path)
+        except OSError:
+            self._remove(temp_path)
+            return
+        self._trim_disk()
+
+    def _trim_disk(self):
+        """Вытеснение давно не использованных записей по фактическому содержимому каталога"""
+        entries = self._disk_entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
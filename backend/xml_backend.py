@@ -0,0 +1,126 @@
+import os
+import xml.etree.ElementTree as ET
+from typing import Iterator, Optional, Sequence, Tuple
+
+from bpmn_index import BPMNIndex, LxmlBPMNIndex
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:  # lxml не установлен - работаем на стандартной библиотеке
+    lxml_etree = None
+
+# Бэкенд по умолчанию: auto - lxml при наличии, иначе стандартная библиотека
+DEFAULT_BACKEND = os.environ.get('BPMN_XML_BACKEND', 'auto')
+
+
+class StdlibBackend:
+    """Разбор XML средствами xml.etree.ElementTree"""
+
+    name = 'stdlib'
+    ParseError: Tuple[type, ...] = (ET.ParseError,)
+
+    def parse(self, source):
+        """Разбор документа целиком (путь или бинарный поток)"""
+        return ET.parse(source)
+
+    def iterparse(self, source, events: Sequence[str] = ('end',)) -> Iterator:
+        """Инкрементальный разбор с событиями (event, element)"""
+        return ET.iterparse(source, events=events)
+
+    def pullparser(self, events: Sequence[str] = ('end',)):
+        """Парсер, которому данные передаются порциями (feed/read_events/close)"""
+        return ET.XMLPullParser(events=events)
+
+    def index(self, root) -> BPMNIndex:
+        """Индекс элементов разобранного дерева"""
+        return BPMNIndex(root)
+
+    def tostring(self, element) -> bytes:
+        """Сериализация поддерева без текста после закрывающего тега"""
+        tail, element.tail = element.tail, None
+        try:
+            return ET.tostring(element)
+        finally:
+            element.tail = tail
+
+    def fingerprint(self, element) -> bytes:
+        """Каноническое представление поддерева для вычисления отпечатка"""
+        # Прямой обход с числом потомков однозначно задает структуру дерева
+        parts = []
+        append = parts.append
+        for node in element.iter():
+            append(node.tag)
+            append(repr(node.attrib))
+            append(node.text or '')
+            append(str(len(node)))
+            append(node.tail or '')
+        # Текст после закрывающего тега корня к поддереву не относится
+        parts[4] = ''
+        return '\0'.join(parts).encode('utf-8')
+
+
+class LxmlBackend:
+    """Разбор XML средствами lxml: C-реализация iterparse и поддержка очень больших документов"""
+
+    name = 'lxml'
+
+    def __init__(self):
+        if lxml_etree is None:
+            raise ImportError('lxml не установлен')
+        self.ParseError: Tuple[type, ...] = (lxml_etree.XMLSyntaxError,)
+
+    @staticmethod
+    def _parser():
+        # Парсер на каждый вызов: экземпляры lxml нельзя делить между потоками.
+        # Комментарии и инструкции обработки отбрасываются, как в ElementTree
+        return lxml_etree.XMLParser(remove_comments=True, remove_pis=True, huge_tree=True,
+                                    resolve_entities=False)
+
+    def parse(self, source):
+        """Разбор документа целиком (путь или бинарный поток)"""
+        return lxml_etree.parse(source, self._parser())
+
+    def iterparse(self, source, events: Sequence[str] = ('end',)) -> Iterator:
+        """Инкрементальный разбор с событиями (event, element)"""
+        return lxml_etree.iterparse(source, events=tuple(events), remove_comments=True, remove_pis=True,
+                                    huge_tree=True, resolve_entities=False)
+
+    def pullparser(self, events: Sequence[str] = ('end',)):
+        """Парсер, которому данные передаются порциями (feed/read_events/close)"""
+        return lxml_etree.XMLPullParser(events=tuple(events), remove_comments=True, remove_pis=True,
+                                        huge_tree=True, resolve_entities=False)
+
+    def index(self, root) -> LxmlBPMNIndex:
+        """Индекс элементов разобранного дерева"""
+        # Полный обход из Python создает объект на каждый узел lxml,
+        # поэтому выборки делаются по запросу средствами libxml2
+        return LxmlBPMNIndex(root)
+
+    def tostring(self, element) -> bytes:
+        """Сериализация поддерева без текста после закрывающего тега"""
+        return lxml_etree.tostring(element, with_tail=False)
+
+    def fingerprint(self, element) -> bytes:
+        """Каноническое представление поддерева для вычисления отпечатка"""
+        return self.tostring(element)
+
+
+BACKENDS = {
+    'stdlib': StdlibBackend,
+    'lxml': LxmlBackend
+}
+
+
+def available_backends() -> list:
+    """Бэкенды, доступные в текущем окружении"""
+    return [name for name in BACKENDS if name != 'lxml' or lxml_etree is not None]
+
+
+def get_backend(name: Optional[str] = None):
+    """Экземпляр бэкенда по имени (stdlib, lxml или auto)"""
+    name = name or DEFAULT_BACKEND
+    if name == 'auto':
+        name = 'lxml' if lxml_etree is not None else 'stdlib'
+    if name not in BACKENDS:
+        raise ValueError(f'Неизвестный XML бэкенд: {name}')
+    return BACKENDS[name]()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Генератор синтетических BPMN 1.8/1.9 и нестандартных <BPMN> документов для бенчмарков
+"""
+import argparse
+import os
+import random
+import sys
+from typing import Optional, TextIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from bpmn_converter import BPMNConverter  # noqa: E402
+
+# Namespace исходных версий. Ключ bpmn18 в BPMNConverter.namespaces указывает на
+# http://www.omg.org/BPMN20/2010/04/1.0, который определяется как BPMN 2.0 и
+# передается без конвертации, поэтому для 1.8 используется namespace 2008/06
+NAMESPACES = {
+    'bpmn18': 'http://www.omg.org/BPMN20/2008/06/1.0',
+    'bpmn19': 'http://www.omg.org/BPMN20/2009/10/1.0'
+}
+
+# Версия, которую конвертер должен определить для каждого формата: бенчмарк
+# измеряет конвертацию 1.x, а не передачу документа 2.0 как есть
+EXPECTED_VERSIONS = {
+    'bpmn18': '1.8',
+    'bpmn19': '1.9',
+    'custom': '1.9'
+}
+
+TASK_TYPES = ['task', 'userTask', 'serviceTask', 'scriptTask', 'businessRuleTask',
+              'sendTask', 'receiveTask', 'manualTask']
+
+# Примерное количество XML элементов на одну задачу стандартного формата:
+# задача с документацией, поток, фигура с Bounds, ребро с двумя точками
+ELEMENTS_PER_TASK = 8
+# Для нестандартного формата: задача и ее имя
+ELEMENTS_PER_CUSTOM_TASK = 2
+
+FORMATS = ['bpmn18', 'bpmn19', 'custom']
+
+
+def tasks_for_elements(elements: int, fmt: str, processes: int = 1) -> int:
+    """Количество задач на процесс для получения примерно elements элементов"""
+    per_task = ELEMENTS_PER_CUSTOM_TASK if fmt == 'custom' else ELEMENTS_PER_TASK
+    return max(1, elements // (per_task * max(1, processes)))
+
+
+def generate(path: str, fmt: str = 'bpmn19', processes: int = 1, tasks: int = 100,
+             flows: Optional[int] = None, shapes: Optional[int] = None, seed: int = 42):
+    """Запись синтетического документа в файл"""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8', buffering=1024 * 1024) as out:
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        if fmt == 'custom':
+            _write_custom(out, processes, tasks)
+        else:
+            _write_standard(out, NAMESPACES[fmt], processes, tasks, flows, shapes, rng)
+
+    detected = BPMNConverter().sniff_bpmn_version(path)['version']
+    if detected != EXPECTED_VERSIONS[fmt]:
+        raise RuntimeError(f'Конвертер определяет версию {fmt} как {detected}, ожидалась {EXPECTED_VERSIONS[fmt]}')
+
+
+def _write_standard(out: TextIO, namespace: str, processes: int, tasks: int,
+                    flows: Optional[int], shapes: Optional[int], rng: random.Random):
+    """Стандартный формат: процессы с цепочкой задач, шлюзами и диаграммой"""
+    out.write(f'<definitions xmlns="{namespace}" '
+              'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+              'xmlns:bpmndi="http://www.omg.org/spec/BPMN/20100524/DI" '
+              'xmlns:omgdc="http://www.omg.org/spec/DD/20100524/DC" '
+              'xmlns:omgdi="http://www.omg.org/spec/DD/20100524/DI" '
+              'targetNamespace="http://www.activiti.org/bpmn" id="definitions">\n')
+
+    flow_count = tasks + 1 if flows is None else flows
+    shape_count = tasks + 2 if shapes is None else shapes
+
+    for p in range(processes):
+        out.write(f'  <process id="process_{p}" name="Synthetic process {p}" isExecutable="true">\n')
+        nodes = [f'p{p}_start']
+        out.write(f'    <startEvent id="p{p}_start" name="Start"/>\n')
+
+        for t in range(tasks):
+            node_id = f'p{p}_n{t}'
+            nodes.append(node_id)
+            if t % 10 == 9:
+                out.write(f'    <exclusiveGateway id="{node_id}" name="Gateway {t}"/>\n')
+            else:
+                tag = TASK_TYPES[t % len(TASK_TYPES)]
+                out.write(f'    <{tag} id="{node_id}" name="Task {t}">'
+                          f'<documentation>Synthetic task {t}</documentation></{tag}>\n')
+
+        nodes.append(f'p{p}_end')
+        out.write(f'    <endEvent id="p{p}_end" name="End"><terminateEventDefinition/></endEvent>\n')
+
+        edges = []
+        for f in range(flow_count):
+            if f < len(nodes) - 1:
+                source, target = nodes[f], nodes[f + 1]
+            else:
+                # Дополнительные потоки между случайными узлами
+                source, target = rng.choice(nodes), rng.choice(nodes)
+            flow_id = f'p{p}_f{f}'
+            edges.append((flow_id, source, target))
+            if f % 10 == 9:
+                # Каждый десятый поток - условный
+                out.write(f'    <sequenceFlow id="{flow_id}" sourceRef="{source}" targetRef="{target}">'
+                          f'<conditionExpression xsi:type="tFormalExpression">${{x &gt; {f}}}'
+                          f'</conditionExpression></sequenceFlow>\n')
+            else:
+                out.write(f'    <sequenceFlow id="{flow_id}" sourceRef="{source}" targetRef="{target}"/>\n')
+        out.write('  </process>\n')
+
+        # Диаграмма процесса
+        out.write(f'  <bpmndi:BPMNDiagram id="diagram_{p}">\n'
+                  f'    <bpmndi:BPMNPlane id="plane_{p}" bpmnElement="process_{p}">\n')
+        for s, node_id in enumerate(nodes[:shape_count]):
+            x, y = 100 + (s % 50) * 150, 100 + (s // 50) * 120
+            out.write(f'      <bpmndi:BPMNShape id="{node_id}_di" bpmnElement="{node_id}">'
+                      f'<omgdc:Bounds x="{x}" y="{y}" width="100" height="80"/></bpmndi:BPMNShape>\n')
+        for flow_id, source, target in edges[:shape_count]:
+            out.write(f'      <bpmndi:BPMNEdge id="{flow_id}_di" bpmnElement="{flow_id}">'
+                      f'<omgdi:waypoint x="{rng.randint(0, 8000)}" y="{rng.randint(0, 8000)}"/>'
+                      f'<omgdi:waypoint x="{rng.randint(0, 8000)}.5" y="{rng.randint(0, 8000)}"/>'
+                      '</bpmndi:BPMNEdge>\n')
+        out.write('    </bpmndi:BPMNPlane>\n  </bpmndi:BPMNDiagram>\n')
+
+    out.write('</definitions>\n')
+
+
+def _write_custom(out: TextIO, processes: int, tasks: int):
+    """Нестандартный формат <BPMN BPMNVersion="1.9">"""
+    out.write('<BPMN BPMNVersion="1.9">\n')
+    for p in range(processes):
+        out.write(f'  <BusinessProcessDiagram id="(diagram_{p})">\n'
+                  f'    <Name>Synthetic diagram {p}</Name>\n'
+                  f'    <Processes>\n      <Process id="(process_{p})">\n')
+
+        out.write('        <Events>\n'
+                  f'          <StartEvent id="(p{p}_start)"><Name>Start</Name></StartEvent>\n'
+                  f'          <EndEvent id="(p{p}_end)"><Name>End</Name></EndEvent>\n'
+                  '        </Events>\n')
+
+        out.write('        <Tasks>\n')
+        for t in range(tasks):
+            if t % 10 != 9:
+                out.write(f'          <Task id="(p{p}_n{t})"><Name>Task {t}</Name></Task>\n')
+        out.write('        </Tasks>\n        <Gateways>\n')
+        for t in range(9, tasks, 10):
+            out.write(f'          <Gateway id="(p{p}_n{t})"><Name>Gateway {t}</Name></Gateway>\n')
+        out.write('        </Gateways>\n')
+
+        out.write('      </Process>\n    </Processes>\n  </BusinessProcessDiagram>\n')
+    out.write('</BPMN>\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Генерация синтетического BPMN документа')
+    parser.add_argument('output', help='Путь к создаваемому файлу')
+    parser.add_argument('--format', choices=FORMATS, default='bpmn19')
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--tasks', type=int, help='Задач на процесс')
+    parser.add_argument('--elements', type=int, default=1000,
+                        help='Примерное общее число элементов (если не задано --tasks)')
+    parser.add_argument('--flows', type=int, help='Потоков на процесс (по умолчанию tasks + 1)')
+    parser.add_argument('--shapes', type=int, help='Фигур и ребер диаграммы на процесс (по умолчанию все узлы)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    tasks = args.tasks or tasks_for_elements(args.elements, args.format, args.processes)
+    generate(args.output, args.format, args.processes, tasks, args.flows, args.shapes, args.seed)
+
+
+if __name__ == '__main__':
+    main()
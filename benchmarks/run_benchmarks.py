@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Бенчмарки конвертера BPMN: время validate_bpmn, convert_to_bpmn20 и отдельных фаз
+на каждом XML бэкенде, пиковое потребление памяти, сохранение результатов в JSON
+для сравнения между коммитами
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..', 'backend'))
+
+from bpmn_converter import BPMNConverter  # noqa: E402
+from custom_model import read_custom_document  # noqa: E402
+from generate_bpmn import FORMATS, generate, tasks_for_elements  # noqa: E402
+from xml_backend import available_backends  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_SIZES = [10, 1000, 100000]
+OPERATIONS = ['validate', 'convert', 'convert_streaming', 'convert_parallel', 'phases']
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Пиковый RSS текущего процесса в мегабайтах"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В Linux значение в килобайтах, в macOS - в байтах
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _measure(operation: str, input_path: str, backend: str) -> Dict[str, Any]:
+    """Выполнение одной операции в отдельном процессе (чистый счетчик пиковой памяти)"""
+    converter = BPMNConverter(backend=backend)
+    baseline = _peak_rss_mb()
+    result: Dict[str, Any] = {}
+
+    with tempfile.TemporaryDirectory(prefix='bpmn_bench_') as temp_dir:
+        output_path = os.path.join(temp_dir, 'output.xml')
+        started = time.perf_counter()
+
+        if operation == 'validate':
+            result['ok'] = converter.validate_bpmn(input_path).get('valid', False)
+        elif operation == 'convert':
+            result['ok'] = converter.convert_to_bpmn20(input_path, output_path)
+        elif operation == 'convert_streaming':
+            result['ok'] = converter.convert_to_bpmn20_streaming(input_path, output_path)
+        elif operation == 'convert_parallel':
+            result['ok'] = converter.convert_to_bpmn20_parallel(input_path, output_path)
+        elif operation == 'phases':
+            # Те же шаги, что и в convert_to_bpmn20, с замером каждого
+            phase_started = time.perf_counter()
+            root = converter.backend.parse(input_path).getroot()
+            parsed = time.perf_counter()
+
+            namespace = root.tag.split('}')[0].strip('{') if '}' in root.tag else ''
+            version = converter._detect_bpmn_version(namespace, root)
+            if converter._is_custom_format(root, version):
+                # Нестандартный формат пишется из промежуточной модели, без дерева результата
+                processes, _ = read_custom_document(root)
+                converted = time.perf_counter()
+                converter._save_custom_model(processes, output_path)
+            else:
+                new_root = converter._convert_tree(root)
+                converted = time.perf_counter()
+                converter._save_formatted_xml(new_root, output_path)
+            serialized = time.perf_counter()
+
+            result['ok'] = True
+            result['phases'] = {
+                'parse': round(parsed - phase_started, 6),
+                'convert': round(converted - parsed, 6),
+                'serialize': round(serialized - converted, 6)
+            }
+        else:
+            raise ValueError(f'Неизвестная операция: {operation}')
+
+        result['seconds'] = round(time.perf_counter() - started, 6)
+        if os.path.exists(output_path):
+            result['output_bytes'] = os.path.getsize(output_path)
+
+    peak = _peak_rss_mb()
+    if peak is not None:
+        result['peak_rss_mb'] = round(peak, 2)
+        result['peak_rss_delta_mb'] = round(peak - baseline, 2)
+    return result
+
+
+def _run_isolated(operation: str, input_path: str, backend: str) -> Dict[str, Any]:
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(_measure, operation, input_path, backend).result()
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARKS_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes: List[int], formats: List[str], operations: List[str], repeat: int,
+        processes: int, workdir: str, backends: List[str]) -> Dict[str, Any]:
+    """Прогон всех сочетаний размера, формата, бэкенда и операции"""
+    results = []
+    for fmt in formats:
+        for size in sizes:
+            tasks = tasks_for_elements(size, fmt, processes)
+            input_path = os.path.join(workdir, f'{fmt}_{size}_{processes}.xml')
+            if not os.path.exists(input_path):
+                generate(input_path, fmt, processes, tasks)
+            input_bytes = os.path.getsize(input_path)
+            elements = sum(1 for _ in ET.iterparse(input_path))
+
+            for backend in backends:
+                for operation in operations:
+                    runs = [_run_isolated(operation, input_path, backend) for _ in range(repeat)]
+                    # Берем самый быстрый прогон как наименее зашумленный
+                    best = min(runs, key=lambda r: r['seconds'])
+                    entry = {
+                        'format': fmt,
+                        'target_elements': size,
+                        'elements': elements,
+                        'processes': processes,
+                        'input_bytes': input_bytes,
+                        'backend': backend,
+                        'operation': operation,
+                        'repeat': repeat
+                    }
+                    entry.update(best)
+                    results.append(entry)
+                    print(f"{fmt:>7} {elements:>9} эл. {backend:<6} {operation:<18} {best['seconds']:>9.3f} с"
+                          f"  {best.get('peak_rss_delta_mb', '-')} МБ")
+
+    return {
+        'commit': _git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'converter_version': BPMNConverter.VERSION,
+        'results': results
+    }
+
+
+def compare(current: Dict[str, Any], baseline_path: str):
+    """Сравнение с сохраненным прогоном (отношение времени текущий / базовый)"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    def key(entry):
+        # Прогоны до появления бэкендов выполнялись на стандартной библиотеке
+        return (entry['format'], entry['target_elements'], entry['processes'],
+                entry.get('backend', 'stdlib'), entry['operation'])
+
+    previous = {key(entry): entry for entry in baseline['results']}
+    print(f"\nСравнение с {baseline.get('commit') or baseline_path}:")
+    for entry in current['results']:
+        old = previous.get(key(entry))
+        if old and old['seconds'] > 0:
+            ratio = entry['seconds'] / old['seconds']
+            marker = '⚠️ ' if ratio > 1.1 else '  '
+            print(f"{marker}{entry['format']:>7} {entry['target_elements']:>9} {entry['backend']:<6} "
+                  f"{entry['operation']:<18} "
+                  f"{old['seconds']:.3f} -> {entry['seconds']:.3f} с (x{ratio:.2f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарки конвертера BPMN')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='Размеры моделей в элементах через запятую (10..1000000)')
+    parser.add_argument('--formats', default=','.join(FORMATS), help='Форматы через запятую')
+    parser.add_argument('--operations', default=','.join(OPERATIONS), help='Операции через запятую')
+    parser.add_argument('--backends', default=','.join(available_backends()),
+                        help='XML бэкенды через запятую (по умолчанию все доступные)')
+    parser.add_argument('--processes', type=int, default=1, help='Процессов в документе')
+    parser.add_argument('--repeat', type=int, default=3, help='Повторов каждой операции')
+    parser.add_argument('--workdir', help='Каталог для сгенерированных моделей (по умолчанию временный)')
+    parser.add_argument('--output', help='Файл результатов (по умолчанию benchmarks/results/<дата>_<коммит>.json)')
+    parser.add_argument('--compare', help='JSON предыдущего прогона для сравнения')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    formats = args.formats.split(',')
+    operations = args.operations.split(',')
+    backends = args.backends.split(',')
+
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+        report = run(sizes, formats, operations, args.repeat, args.processes, args.workdir, backends)
+    else:
+        with tempfile.TemporaryDirectory(prefix='bpmn_bench_models_') as workdir:
+            report = run(sizes, formats, operations, args.repeat, args.processes, workdir, backends)
+
+    output = args.output
+    if not output:
+        results_dir = os.path.join(BENCHMARKS_DIR, 'results')
+        os.makedirs(results_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        output = os.path.join(results_dir, f"{stamp}_{report['commit'] or 'nogit'}.json")
+
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'\n📄 Результаты: {output}')
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -54,7 +54,7 @@ def install_dependencies():
         print(f"❌ Ошибка установки зависимостей: {e}")
         sys.exit(1)
 
-def start_backend(python_venv):
+def start_backend(python_venv, production=False):
     """Запуск бэкенда"""
     print("🚀 Запуск бэкенда...")
     
@@ -62,8 +62,14 @@ def start_backend(python_venv):
     backend_dir = Path(__file__).parent / 'backend'
     os.chdir(backend_dir)
     
-    # Запускаем Flask приложение с виртуальным окружением
     try:
+        if production:
+            # gunicorn с несколькими рабочими процессами; журнал запросов выводится в консоль
+            if sys.platform == "win32":
+                print("❌ Промышленный режим (gunicorn) недоступен в Windows")
+                sys.exit(1)
+            return subprocess.Popen([python_venv, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'])
+        # Запускаем Flask приложение с виртуальным окружением
         return subprocess.Popen([python_venv, 'app.py'], 
                               stdout=subprocess.PIPE, 
                               stderr=subprocess.PIPE)
@@ -110,6 +116,7 @@ def main():
     
     # Проверка Python версии
     check_python_version()
+    production = '--production' in sys.argv[1:]
     
     # Установка зависимостей и получение пути к Python
     python_venv = install_dependencies()
@@ -118,8 +125,8 @@ def main():
     os.chdir(Path(__file__).parent)
     
     # Запуск бэкенда
-    backend_process = start_backend(python_venv)
-    print("✅ Бэкенд запущен на порту 5000")
+    backend_process = start_backend(python_venv, production)
+    print("✅ Бэкенд запущен на порту 5001" + (" (gunicorn)" if production else ""))
     
     # Ожидание готовности бэкенда
     print("⏳ Ожидание готовности бэкенда...")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули бэкенда импортируются по имени, как в backend/app.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
@@ -0,0 +1,110 @@
+"""
+Загрузка по частям: смещения порций, завершение и потоковая распаковка
+"""
+import gzip
+import io
+import os
+
+import pytest
+
+import app as service
+from chunked_upload import (ChunkedUploadStore, UploadError, UploadNotFoundError, UploadOffsetError,
+                            UploadTooLargeError, open_decompressed)
+
+DATA = b''.join(b'<task id="t%d"/>\n' % i for i in range(20000))
+
+
+def write_gzip(tmp_path, data=DATA):
+    path = tmp_path / 'part.gz'
+    path.write_bytes(gzip.compress(data))
+    return str(path)
+
+
+def test_backward_seek_restarts_decompression(tmp_path):
+    with open_decompressed(write_gzip(tmp_path), 'gzip') as source:
+        assert source.read(100) == DATA[:100]
+        source.seek(50000)
+        assert source.read(10) == DATA[50000:50010]
+        # Возврат назад - распаковка с начала файла
+        source.seek(10)
+        assert source.tell() == 10
+        assert source.read() == DATA[10:]
+        assert source.progress == 1.0
+        with pytest.raises(io.UnsupportedOperation):
+            source.seek(0, io.SEEK_END)
+
+
+def test_decompressed_size_is_capped(tmp_path):
+    with open_decompressed(write_gzip(tmp_path), 'gzip', max_size=len(DATA) - 1) as source:
+        with pytest.raises(UploadTooLargeError):
+            source.read()
+    with open_decompressed(write_gzip(tmp_path), 'gzip', max_size=len(DATA)) as source:
+        assert source.read() == DATA
+
+
+def test_corrupt_data_is_upload_error(tmp_path):
+    path = tmp_path / 'part.gz'
+    path.write_bytes(b'\x1f\x8b' + b'junk' * 10)
+    with pytest.raises(UploadError):
+        with open_decompressed(str(path), 'gzip') as source:
+            source.read()
+
+
+def test_offset_conflict_reports_accepted_offset(tmp_path):
+    store = ChunkedUploadStore(str(tmp_path), max_size=1024)
+    upload_id = store.create('a.xml', size=10)['upload_id']
+    assert store.append(upload_id, 0, io.BytesIO(b'01234'))['offset'] == 5
+
+    # Повтор той же порции и пропуск данных отклоняются с принятым смещением
+    for offset in (0, 7):
+        with pytest.raises(UploadOffsetError) as error:
+            store.append(upload_id, offset, io.BytesIO(b'56789'))
+        assert error.value.offset == 5
+
+    # Незавершенная загрузка не может быть завершена
+    with pytest.raises(UploadOffsetError) as error:
+        store.finish(upload_id)
+    assert error.value.offset == 5
+
+    with pytest.raises(UploadTooLargeError):
+        store.append(upload_id, 5, io.BytesIO(b'56789!'))
+
+
+def test_finish_release_and_remove(tmp_path):
+    store = ChunkedUploadStore(str(tmp_path))
+    upload_id = store.create('a.xml')['upload_id']
+    with pytest.raises(UploadError):
+        store.finish(upload_id)
+
+    store.append(upload_id, 0, io.BytesIO(gzip.compress(DATA)))
+    state = store.finish(upload_id)
+    assert state['encoding'] == 'gzip'
+    # Завершение можно повторить, пока загрузка не передана заданию
+    assert store.finish(upload_id)['part_path'] == state['part_path']
+
+    store.release(upload_id)
+    with pytest.raises(UploadNotFoundError):
+        store.status(upload_id)
+    # Файл порций остается входным файлом задания
+    assert os.path.exists(state['part_path'])
+
+    other = store.create('b.xml')['upload_id']
+    store.append(other, 0, io.BytesIO(DATA))
+    part_path = store.finish(other)['part_path']
+    store.remove(other)
+    assert not os.path.exists(part_path)
+    with pytest.raises(UploadNotFoundError):
+        store.remove(other)
+
+
+def test_finalize_removes_corrupt_upload(tmp_path, monkeypatch):
+    store = ChunkedUploadStore(str(tmp_path))
+    monkeypatch.setattr(service, 'upload_store', store)
+    state = store.create('a.xml', encoding='gzip')
+    store.append(state['upload_id'], 0, io.BytesIO(b'\x1f\x8b' + b'junk' * 10))
+
+    response = service.app.test_client().post(f'/api/uploads/{state["upload_id"]}/finalize')
+    assert response.status_code == 400
+    with pytest.raises(UploadNotFoundError):
+        store.status(state['upload_id'])
+    assert os.listdir(tmp_path) == []
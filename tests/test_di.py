@@ -0,0 +1,104 @@
+"""
+Пересчет координат диаграмм (DITransform) при конвертации
+"""
+import io
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from bpmn_converter import BPMNConverter
+from bpmn_di import DITransform
+
+DC = '{http://www.omg.org/spec/DD/20100524/DC}'
+DI = '{http://www.omg.org/spec/DD/20100524/DI}'
+EXT = '{http://example.com/ext}'
+
+MODEL = b'''<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://www.omg.org/BPMN20/2008/06/1.0"
+             xmlns:bpmndi="http://www.omg.org/spec/BPMN/20100524/DI"
+             xmlns:omgdc="http://www.omg.org/spec/DD/20100524/DC"
+             xmlns:omgdi="http://www.omg.org/spec/DD/20100524/DI"
+             xmlns:ext="http://example.com/ext"
+             targetNamespace="http://example.com/bpmn" id="defs">
+  <process id="p1">
+    <startEvent id="start"/>
+    <task id="t1"/>
+    <task id="t2"/>
+    <sequenceFlow id="f1" sourceRef="start" targetRef="t1"/>
+  </process>
+  <bpmndi:BPMNDiagram id="d1">
+    <bpmndi:BPMNPlane id="pl1" bpmnElement="p1">
+      <bpmndi:BPMNShape id="t1_di" bpmnElement="t1">
+        <omgdc:Bounds x="100" y="80" width="100" height="80" ext:tag="keep"/>
+      </bpmndi:BPMNShape>
+      <bpmndi:BPMNShape id="t2_di" bpmnElement="t2">
+        <omgdc:Bounds x="300" y="200" width="-40" height="-20"/>
+      </bpmndi:BPMNShape>
+      <bpmndi:BPMNShape id="start_di" bpmnElement="start">
+        <omgdc:Bounds x="20" y="30"/>
+      </bpmndi:BPMNShape>
+      <bpmndi:BPMNEdge id="f1_di" bpmnElement="f1">
+        <omgdi:waypoint x="36" y="120" ext:tag="point"/>
+        <omgdi:waypoint x="100.5" y="120"/>
+      </bpmndi:BPMNEdge>
+    </bpmndi:BPMNPlane>
+  </bpmndi:BPMNDiagram>
+</definitions>
+'''
+
+
+def convert(transform, method='convert_to_bpmn20'):
+    converter = BPMNConverter(di_transform=transform)
+    output = io.BytesIO()
+    assert getattr(converter, method)(io.BytesIO(MODEL), output), converter.last_error
+    return output.getvalue()
+
+
+def coordinates(document):
+    """Атрибуты Bounds и waypoint результата по порядку документа"""
+    root = ET.fromstring(document)
+    return [dict(elem.attrib) for elem in root.iter() if elem.tag in (f'{DC}Bounds', f'{DI}waypoint')]
+
+
+def test_identity_copies_attributes_as_is():
+    assert DITransform().identity
+    assert coordinates(convert(DITransform())) == [
+        {'x': '100', 'y': '80', 'width': '100', 'height': '80', f'{EXT}tag': 'keep'},
+        {'x': '300', 'y': '200', 'width': '-40', 'height': '-20'},
+        {'x': '20', 'y': '30'},
+        {'x': '36', 'y': '120', f'{EXT}tag': 'point'},
+        {'x': '100.5', 'y': '120'}
+    ]
+
+
+def test_scale_offset_and_negative_sizes():
+    assert coordinates(convert(DITransform(2.0, 10, 5))) == [
+        {'x': '210', 'y': '165', 'width': '200', 'height': '160', f'{EXT}tag': 'keep'},
+        # Отрицательный размер: угол переносится, размер берется по модулю
+        {'x': '530', 'y': '365', 'width': '80', 'height': '40'},
+        # Bounds без размера остается Bounds
+        {'x': '50', 'y': '65', 'width': '0', 'height': '0'},
+        {'x': '82', 'y': '245', f'{EXT}tag': 'point'},
+        {'x': '211', 'y': '245'}
+    ]
+
+
+def test_normalize_moves_diagram_to_origin():
+    result = coordinates(convert(DITransform(0.5, 0, 0, normalize=True)))
+    assert [(item['x'], item['y']) for item in result] == [
+        ('40', '25'), ('120', '75'), ('0', '0'), ('8', '45'), ('40.25', '45')
+    ]
+    assert result[0][f'{EXT}tag'] == 'keep'
+
+
+def test_invalid_scale():
+    with pytest.raises(ValueError):
+        DITransform(0)
+
+
+@pytest.mark.parametrize('transform', [DITransform(), DITransform(2.0, 10, 5), DITransform(1.5, -3, 0, True)],
+                         ids=repr)
+def test_streaming_matches_tree(transform):
+    expected = convert(transform)
+    for method in ('convert_to_bpmn20_streaming', 'convert_to_bpmn20_parallel'):
+        assert convert(transform, method) == expected, method
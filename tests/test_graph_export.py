@@ -0,0 +1,113 @@
+"""
+Выгрузка графа процессов в JSON и NDJSON: дерево документа и потоковый разбор
+"""
+import io
+import json
+
+import pytest
+
+from bpmn_converter import BPMNConverter
+from bpmn_di import DITransform
+
+MODEL = b'''<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://www.omg.org/BPMN20/2008/06/1.0"
+             xmlns:bpmndi="http://www.omg.org/spec/BPMN/20100524/DI"
+             xmlns:omgdc="http://www.omg.org/spec/DD/20100524/DC"
+             targetNamespace="http://example.com/bpmn" id="defs">
+  <process id="p1" name="Order">
+    <startEvent id="start" name="Start"/>
+    <task id="t1"/>
+    <exclusiveGateway id="g1"/>
+    <sequenceFlow id="f1" sourceRef="start" targetRef="t1"/>
+    <sequenceFlow id="f2" sourceRef="t1" targetRef="g1" name="done"/>
+    <textAnnotation id="ta1"><text>Note</text></textAnnotation>
+  </process>
+  <process id="p2">
+    <endEvent id="end"/>
+  </process>
+  <bpmndi:BPMNDiagram id="d1">
+    <bpmndi:BPMNPlane id="pl1" bpmnElement="p1">
+      <bpmndi:BPMNShape id="start_di" bpmnElement="start">
+        <omgdc:Bounds x="10" y="20" width="36" height="36"/>
+      </bpmndi:BPMNShape>
+      <bpmndi:BPMNShape id="t1_di" bpmnElement="t1">
+        <omgdc:Bounds x="100" y="0" width="200" height="-100"/>
+      </bpmndi:BPMNShape>
+      <bpmndi:BPMNShape id="start_di2" bpmnElement="start">
+        <omgdc:Bounds x="999" y="999" width="1" height="1"/>
+      </bpmndi:BPMNShape>
+    </bpmndi:BPMNPlane>
+  </bpmndi:BPMNDiagram>
+</definitions>
+'''
+
+
+def node(node_id, node_type, name=None, parent=None, bounds=None):
+    return {'id': node_id, 'type': node_type, 'name': name, 'parent': parent, 'bounds': bounds}
+
+
+def flow(flow_id, source, target, name=None):
+    return {'id': flow_id, 'source': source, 'target': target, 'name': name, 'parent': None}
+
+
+def expected(start_bounds, task_bounds):
+    return [
+        {'id': 'p1', 'name': 'Order',
+         'nodes': [node('start', 'startEvent', 'Start', bounds=start_bounds),
+                   node('t1', 'task', bounds=task_bounds),
+                   node('g1', 'exclusiveGateway')],
+         'flows': [flow('f1', 'start', 't1'), flow('f2', 't1', 'g1', 'done')]},
+        {'id': 'p2', 'name': None, 'nodes': [node('end', 'endEvent')], 'flows': []}
+    ]
+
+
+def export(graph_format, streaming, transform=None, document=MODEL):
+    converter = BPMNConverter(di_transform=transform)
+    output = io.BytesIO()
+    assert converter.export_graph(io.BytesIO(document), output, graph_format, streaming), converter.last_error
+    return output.getvalue().decode('utf-8')
+
+
+@pytest.mark.parametrize('streaming', [False, True], ids=['tree', 'streaming'])
+def test_json_and_ndjson(streaming):
+    # Границы берутся из первой фигуры элемента как есть
+    graphs = expected([10, 20, 36, 36], [100, 0, 200, -100])
+    assert json.loads(export('json', streaming)) == {'processes': graphs}
+    lines = export('ndjson', streaming).splitlines()
+    assert [json.loads(line) for line in lines] == graphs
+
+
+@pytest.mark.parametrize('streaming', [False, True], ids=['tree', 'streaming'])
+def test_bounds_follow_di_transform(streaming):
+    # Отрицательная высота исправляется, координаты сдвигаются в начало и масштабируются
+    graphs = expected([0, 240, 72, 72], [180, 0, 400, 200])
+    assert json.loads(export('json', streaming, DITransform(2.0, normalize=True))) == {'processes': graphs}
+
+
+BPMN20 = b'''<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://www.omg.org/spec/BPMN/20100524/MODEL" id="defs">
+  <process id="p1">
+    <subProcess id="sp1">
+      <startEvent id="inner"/>
+      <sequenceFlow id="f2" sourceRef="inner" targetRef="inner"/>
+    </subProcess>
+    <sequenceFlow id="f1" sourceRef="sp1" targetRef="sp1"/>
+  </process>
+</definitions>
+'''
+
+
+@pytest.mark.parametrize('streaming', [False, True], ids=['tree', 'streaming'])
+def test_subprocess_contents_have_parent(streaming):
+    graph = json.loads(export('ndjson', streaming, document=BPMN20))
+    assert graph['nodes'] == [node('sp1', 'subProcess'), node('inner', 'startEvent', parent='sp1')]
+    assert [(item['id'], item['parent']) for item in graph['flows']] == [('f2', 'sp1'), ('f1', None)]
+
+
+def test_streaming_matches_tree_for_bpmn20():
+    converted = io.BytesIO()
+    assert BPMNConverter().convert_to_bpmn20(io.BytesIO(MODEL), converted)
+    for graph_format in ('json', 'ndjson'):
+        tree = export(graph_format, False, document=converted.getvalue())
+        assert export(graph_format, True, document=converted.getvalue()) == tree
+        assert tree == export(graph_format, False)
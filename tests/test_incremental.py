@@ -0,0 +1,98 @@
+"""
+Инкрементальная конвертация: повторное использование фрагментов из кэша результатов
+"""
+import io
+
+import pytest
+
+from bpmn_converter import BPMNConverter
+from result_cache import ResultCache
+
+MODEL = b'''<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://www.omg.org/BPMN20/2009/10/1.0"
+             xmlns:bpmndi="http://www.omg.org/spec/BPMN/20100524/DI"
+             xmlns:omgdc="http://www.omg.org/spec/DD/20100524/DC"
+             targetNamespace="http://example.com/bpmn" id="defs">
+  <process id="p1" name="Order">
+    <startEvent id="s1"/>
+    <task id="t1" name="Check"/>
+    <sequenceFlow id="f1" sourceRef="s1" targetRef="t1"/>
+  </process>
+  <process id="p2">
+    <userTask id="t2" name="Approve"/>
+  </process>
+  <process>
+    <endEvent id="e3"/>
+  </process>
+  <bpmndi:BPMNDiagram id="d1">
+    <bpmndi:BPMNPlane id="pl1" bpmnElement="p1">
+      <bpmndi:BPMNShape id="t1_di" bpmnElement="t1">
+        <omgdc:Bounds x="100" y="80" width="100" height="80"/>
+      </bpmndi:BPMNShape>
+    </bpmndi:BPMNPlane>
+  </bpmndi:BPMNDiagram>
+</definitions>
+'''
+
+CUSTOM = b'''<?xml version="1.0" encoding="UTF-8"?>
+<BPMN BPMNVersion="1.9">
+  <BusinessProcessDiagram id="(diag1)">
+    <Processes><Process id="(p1)"><Tasks><Task id="(t1)"><Name>One</Name></Task></Tasks></Process></Processes>
+  </BusinessProcessDiagram>
+  <BusinessProcessDiagram id="(diag2)">
+    <Processes><Process id="(p2)"><Tasks><Task id="(t2)"><Name>Two</Name></Task></Tasks></Process></Processes>
+  </BusinessProcessDiagram>
+</BPMN>
+'''
+
+
+def convert(document, store=None, pretty=True):
+    converter = BPMNConverter()
+    output = io.BytesIO()
+    if store is None:
+        assert converter.convert_to_bpmn20(io.BytesIO(document), output, pretty), converter.last_error
+        return output.getvalue(), None
+    assert converter.convert_to_bpmn20_incremental(io.BytesIO(document), output, store, pretty), \
+        converter.last_error
+    return output.getvalue(), converter.last_fragments
+
+
+@pytest.mark.parametrize('pretty', [True, False], ids=['pretty', 'compact'])
+@pytest.mark.parametrize('document', [MODEL, CUSTOM], ids=['standard', 'custom'])
+def test_unchanged_document_is_served_from_store(document, pretty):
+    expected, _ = convert(document, pretty=pretty)
+    store = ResultCache()
+
+    output, fragments = convert(document, store, pretty)
+    assert output == expected
+    assert fragments['reused'] == 0 and fragments['converted'] > 0
+
+    output, repeated = convert(document, store, pretty)
+    assert output == expected
+    assert repeated == {'reused': fragments['converted'], 'converted': 0}
+
+
+def test_changed_process_is_rendered_again():
+    store = ResultCache()
+    convert(MODEL, store)
+
+    changed = MODEL.replace(b'name="Approve"', b'name="Reject"')
+    output, fragments = convert(changed, store)
+    assert output == convert(changed)[0]
+    assert b'Reject' in output and b'Approve' not in output
+    # Заново конвертируется только процесс p2; p1, процесс без id и диаграмма берутся из store
+    assert fragments == {'reused': 3, 'converted': 1}
+
+
+def test_process_without_id_depends_on_position():
+    store = ResultCache()
+    convert(MODEL, store)
+
+    # Процесс без id получает имя по номеру и после перестановки конвертируется заново,
+    # процесс с id берется из store на любой позиции
+    anonymous = b'<process>\n    <endEvent id="e3"/>\n  </process>\n  '
+    assert anonymous in MODEL
+    reordered = MODEL.replace(anonymous, b'').replace(b'<process id="p2">', anonymous + b'<process id="p2">')
+    output, fragments = convert(reordered, store)
+    assert output == convert(reordered)[0]
+    assert fragments == {'reused': 3, 'converted': 1}
@@ -0,0 +1,62 @@
+"""
+Ссылочная целостность: узлы графа - только элементы потока
+"""
+import io
+import xml.etree.ElementTree as ET
+
+from bpmn_converter import BPMNConverter
+from bpmn_export import process_graph
+
+MODEL = '''<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="{namespace}" targetNamespace="http://example.com/bpmn" id="defs">
+  <process id="p1">
+    <ioSpecification id="io1"><dataInput id="in1"/><inputSet id="is1"/><outputSet id="os1"/></ioSpecification>
+    <property id="prop1" name="amount"/>
+    <laneSet id="ls1"><lane id="l1"><flowNodeRef>start</flowNodeRef></lane></laneSet>
+    <dataObject id="do1"/>
+    <dataObjectReference id="dor1" dataObjectRef="do1"/>
+    <dataStoreReference id="dsr1"/>
+    <textAnnotation id="ta1"><text>Проверка</text></textAnnotation>
+    <group id="gr1"/>
+    <startEvent id="start"/>
+    <task id="t1"/>
+    <endEvent id="end"/>
+    <sequenceFlow id="f1" sourceRef="start" targetRef="t1"/>
+    <sequenceFlow id="f2" sourceRef="t1" targetRef="end"/>
+    <association id="a1" sourceRef="ta1" targetRef="t1"/>
+    {extra}
+  </process>
+</definitions>
+'''
+
+NAMESPACES = ['http://www.omg.org/spec/BPMN/20100524/MODEL', 'http://www.omg.org/BPMN20/2009/10/1.0']
+
+
+def validate(namespace, extra=''):
+    document = MODEL.format(namespace=namespace, extra=extra).encode('utf-8')
+    return BPMNConverter().validate_bpmn(io.BytesIO(document))
+
+
+def test_lanes_data_and_annotations_are_not_nodes():
+    result = validate(NAMESPACES[0])
+    assert result['integrity_valid'], result
+    assert result['unreachable_node_count'] == 0
+
+    # Из BPMN 1.9 аннотации не переносятся: ссылка ассоциации висит, но недостижимых узлов нет
+    result = validate(NAMESPACES[1])
+    assert result['unreachable_node_count'] == 0
+    assert [issue['ref'] for issue in result['dangling_references']] == ['ta1']
+
+
+def test_unreachable_flow_node_is_reported():
+    for namespace in NAMESPACES:
+        result = validate(namespace, '<task id="orphan"/>')
+        assert not result['integrity_valid']
+        assert result['unreachable_nodes'] == [{'process': 'p1', 'element': 'orphan'}]
+
+
+def test_graph_export_uses_flow_nodes():
+    root = ET.fromstring(MODEL.format(namespace=NAMESPACES[0], extra='').encode('utf-8'))
+    graph = process_graph(root[0], {})
+    assert [node['id'] for node in graph['nodes']] == ['start', 't1', 'end']
+    assert [flow['id'] for flow in graph['flows']] == ['f1', 'f2']
@@ -0,0 +1,44 @@
+"""
+Сумма метрик рабочих процессов через снимки в общем каталоге
+"""
+from metrics import MetricsRegistry, SharedMetrics
+
+
+def make_process(directory, pid, requests, jobs):
+    """Реестр отдельного процесса со снимком в общем каталоге"""
+    registry = MetricsRegistry()
+    registry.inc('bpmn_http_requests_total', requests, endpoint='/api/convert')
+    registry.observe('bpmn_phase_duration_seconds', 0.2, phase='parse')
+    registry.set_gauge('bpmn_jobs', jobs, status='running')
+    shared = SharedMetrics(registry, str(directory))
+    # Процессы в тесте различаются именем снимка, а не настоящим pid
+    shared.filename = f'{pid}-test.json'
+    shared.publish()
+    return registry, shared
+
+
+def test_collect_sums_all_processes(tmp_path):
+    make_process(tmp_path, 101, requests=3, jobs=1)
+    _, current = make_process(tmp_path, 102, requests=5, jobs=2)
+
+    merged = current.collect()
+    assert merged.get('bpmn_http_requests_total', endpoint='/api/convert') == 8
+    assert merged.get('bpmn_jobs', status='running') == 3
+    assert merged.snapshot()['histograms']['bpmn_phase_duration_seconds'][(('phase', 'parse'),)][2] == 2
+
+
+def test_retired_process_keeps_counters(tmp_path):
+    _, current = make_process(tmp_path, 102, requests=5, jobs=2)
+    make_process(tmp_path, 101, requests=3, jobs=1)
+    SharedMetrics.retire(str(tmp_path), 101)
+    assert not (tmp_path / '101-test.json').exists()
+
+    merged = current.collect()
+    assert merged.get('bpmn_http_requests_total', endpoint='/api/convert') == 8
+    # Показатели завершившегося процесса в сумму не входят
+    assert merged.get('bpmn_jobs', status='running') == 2
+
+    # Следующий завершившийся процесс добавляется к уже перенесенным
+    make_process(tmp_path, 103, requests=10, jobs=4)
+    SharedMetrics.retire(str(tmp_path), 103)
+    assert current.collect().get('bpmn_http_requests_total', endpoint='/api/convert') == 18
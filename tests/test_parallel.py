@@ -0,0 +1,29 @@
+"""
+Параллельная конвертация совпадает с последовательной на сгенерированных документах
+"""
+import io
+import os
+import sys
+
+import pytest
+
+from bpmn_converter import BPMNConverter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from generate_bpmn import generate  # noqa: E402
+
+
+@pytest.mark.parametrize('fmt', ['bpmn18', 'bpmn19', 'custom'])
+def test_parallel_matches_serial(fmt, tmp_path):
+    path = str(tmp_path / f'{fmt}.xml')
+    generate(path, fmt=fmt, processes=6, tasks=40)
+
+    converter = BPMNConverter()
+    serial = io.BytesIO()
+    assert converter.convert_to_bpmn20(path, serial), converter.last_error
+
+    for workers in (1, 3):
+        parallel = io.BytesIO()
+        assert converter.convert_to_bpmn20_parallel(path, parallel, workers=workers), converter.last_error
+        assert parallel.getvalue() == serial.getvalue(), workers
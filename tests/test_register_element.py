@@ -0,0 +1,97 @@
+"""
+Регистрация конвертации нестандартных элементов (register_element) и таблица конвертации
+"""
+import io
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from bpmn_converter import BPMNConverter
+from result_cache import ResultCache
+
+BPMN20 = '{http://www.omg.org/spec/BPMN/20100524/MODEL}'
+VENDOR = 'http://vendor.example.com/bpmn'
+
+MODEL = b'''<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://www.omg.org/BPMN20/2009/10/1.0"
+             xmlns:vendor="http://vendor.example.com/bpmn"
+             xmlns:other="http://other.example.com/bpmn"
+             targetNamespace="http://example.com/bpmn" id="defs">
+  <process id="p1">
+    <startEvent id="start"/>
+    <vendor:approvalStep id="a1" name="Approve" handler="approvals"/>
+    <other:approvalStep id="a2"/>
+    <vendor:auditStep id="u1"/>
+    <mysteryElement id="m1"/>
+    <sequenceFlow id="f1" sourceRef="start" targetRef="a1"/>
+  </process>
+  <process id="p2">
+    <vendor:approvalStep id="a3"/>
+  </process>
+</definitions>
+'''
+
+METHODS = ['convert_to_bpmn20', 'convert_to_bpmn20_streaming', 'convert_to_bpmn20_parallel', 'incremental']
+
+
+# Обработчик на уровне модуля: параллельная конвертация передает его рабочим процессам
+def convert_approval(old, new, index):
+    new.set('implementation', old.get('handler', '##unspecified'))
+
+
+def convert(converter, method, store=None):
+    output = io.BytesIO()
+    if method == 'incremental':
+        ok = converter.convert_to_bpmn20_incremental(io.BytesIO(MODEL), output, store or ResultCache())
+    else:
+        ok = getattr(converter, method)(io.BytesIO(MODEL), output)
+    assert ok, converter.last_error
+    return output.getvalue()
+
+
+def process_children(document):
+    process = ET.fromstring(document).find(f'{BPMN20}process')
+    return [(child.tag.replace(BPMN20, ''), child.get('id')) for child in process]
+
+
+def test_unknown_elements_are_skipped():
+    assert process_children(convert(BPMNConverter(), 'convert_to_bpmn20')) == [
+        ('startEvent', 'start'), ('sequenceFlow', 'f1')
+    ]
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_registered_element_is_converted(method):
+    converter = BPMNConverter()
+    converter.register_element('approvalStep', 'serviceTask', convert_approval, namespace=VENDOR)
+    output = convert(converter, method)
+
+    # Элемент с тем же именем в другом namespace и незарегистрированные элементы пропускаются
+    assert process_children(output) == [('startEvent', 'start'), ('serviceTask', 'a1'), ('sequenceFlow', 'f1')]
+    task = ET.fromstring(output).find(f'{BPMN20}process/{BPMN20}serviceTask')
+    assert task.get('name') == 'Approve'
+    assert task.get('implementation') == 'approvals'
+    # Обработчик применяется и во втором процессе (при параллельной конвертации - в рабочем процессе)
+    assert ET.fromstring(output).find(f'{BPMN20}process[@id="p2"]/{BPMN20}serviceTask').get(
+        'implementation') == '##unspecified'
+    assert output == convert(converter, 'convert_to_bpmn20')
+
+
+def test_registration_without_namespace_and_handler():
+    converter = BPMNConverter()
+    converter.register_element('approvalStep', 'userTask')
+    assert process_children(convert(converter, 'convert_to_bpmn20')) == [
+        ('startEvent', 'start'), ('userTask', 'a1'), ('userTask', 'a2'), ('sequenceFlow', 'f1')
+    ]
+
+
+def test_registration_invalidates_cached_fragments():
+    store = ResultCache()
+    converter = BPMNConverter()
+    convert(converter, 'incremental', store)
+
+    # Таблица конвертации входит в ключ фрагмента: процессы конвертируются заново
+    converter.register_element('approvalStep', 'serviceTask', convert_approval, namespace=VENDOR)
+    output = convert(converter, 'incremental', store)
+    assert converter.last_fragments == {'reused': 0, 'converted': 2}
+    assert ('serviceTask', 'a1') in process_children(output)
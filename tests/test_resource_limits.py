@@ -0,0 +1,99 @@
+"""
+Обработка в изолированном процессе: бюджет пакетной конвертации и проверки по схеме
+"""
+import io
+import time
+
+import pytest
+
+import app as service
+from batch_converter import BatchConverter
+from resource_limits import SANDBOX_AVAILABLE, LimitExceededError, ResourceLimits, run_limited
+from result_cache import ResultCache
+
+DOCUMENT = b'''<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://www.omg.org/BPMN20/2008/06/1.0" id="defs">
+  <process id="p1"><startEvent id="start"/><task id="t1"/></process>
+</definitions>
+'''
+
+BPMN20 = b'''<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://www.omg.org/spec/BPMN/20100524/MODEL" targetNamespace="http://example.com" id="defs">
+  <process id="p1"><startEvent id="start"/></process>
+</definitions>
+'''
+
+sandbox = pytest.mark.skipif(not SANDBOX_AVAILABLE, reason='изолированные процессы недоступны')
+
+
+# Цели изолированного процесса импортируются им по имени модуля
+
+
+def upper(output, source, suffix):
+    output.write(source.read().upper() + suffix)
+    return 'ok'
+
+
+def sleep(output, seconds):
+    time.sleep(seconds)
+
+
+def report(output, progress=None):
+    for value in (0.25, 0.5):
+        progress(value)
+    return 'done'
+
+
+@sandbox
+def test_streams_and_output_are_transferred():
+    source = io.BytesIO(b'xx' + b'abc' * 100000)
+    source.seek(2)
+    output = io.BytesIO()
+    assert run_limited(upper, (source, b'!'), output, ResourceLimits(max_seconds=30)) == 'ok'
+    assert output.getvalue() == b'ABC' * 100000 + b'!'
+    # Позиция потока процесса сервиса не меняется
+    assert source.tell() == 2
+
+
+@sandbox
+def test_time_limit():
+    with pytest.raises(LimitExceededError) as error:
+        run_limited(sleep, (10,), None, ResourceLimits(max_seconds=0.5))
+    assert error.value.kind == 'time'
+
+
+@sandbox
+def test_progress_is_relayed():
+    values = []
+    assert run_limited(report, (), None, ResourceLimits(max_seconds=30), progress=values.append) == 'done'
+    assert values == [0.25, 0.5]
+
+
+def test_batch_member_over_budget_fails_alone():
+    converter = BatchConverter(max_workers=2, limits=ResourceLimits(max_elements=3))
+    try:
+        small = DOCUMENT.replace(b'<task id="t1"/>', b'')
+        results = converter.convert([('big.xml', DOCUMENT), ('small.xml', small)], lambda name: True)
+    finally:
+        converter.shutdown()
+
+    assert results[0]['status'] == 'failed'
+    assert results[0]['limit'] == 'elements'
+    assert results[1]['status'] == 'converted', results[1]
+    assert b'http://www.omg.org/spec/BPMN/20100524/MODEL' in results[1]['output']
+
+
+@pytest.mark.parametrize('document', [DOCUMENT, BPMN20], ids=['converted', 'passthrough'])
+def test_schema_check_runs_under_request_budget(document, monkeypatch):
+    calls = []
+
+    def tracked(target, args, output, limits, **options):
+        calls.append((target.__name__, limits))
+        return run_limited(target, args, output, limits, **options)
+
+    monkeypatch.setattr(service, 'run_limited', tracked)
+    monkeypatch.setattr(service, 'result_cache', ResultCache())
+    response = service.app.test_client().post('/api/convert?validate=1',
+                                              data={'file': (io.BytesIO(document), 'a.xml')})
+    assert response.status_code == 200, response.json
+    assert ('validate_schema_document', service.request_limits) in calls
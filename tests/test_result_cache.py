@@ -0,0 +1,76 @@
+"""
+Кэш результатов: ключи по содержимому, дисковый уровень и вытеснение по времени использования
+"""
+import io
+import os
+import time
+
+import result_cache
+from result_cache import ResultCache
+
+
+def disk_files(path):
+    return sorted(name for name in os.listdir(path) if name.endswith('.cache'))
+
+
+def test_make_key_restores_stream_position():
+    data = b'header' + b'<definitions/>' * 100000
+    stream = io.BytesIO(data)
+    stream.seek(6)
+    key = ResultCache.make_key(stream, 'convert', pretty=True)
+    assert stream.tell() == 6
+    # Хэшируется содержимое от текущей позиции, как у байтов
+    assert key == ResultCache.make_key(data[6:], 'convert', pretty=True)
+    assert key != ResultCache.make_key(data[6:], 'convert', pretty=False)
+    assert key != ResultCache.make_key(data[6:], 'validate', pretty=True)
+
+
+def test_cache_version_invalidates_disk_entries(tmp_path, monkeypatch):
+    key = ResultCache.make_key(b'document', 'convert')
+    ResultCache(disk_dir=str(tmp_path)).put(key, b'result')
+    assert ResultCache(disk_dir=str(tmp_path)).get(key) == b'result'
+
+    # После изменения версии схемы тот же вход дает другой ключ, старая запись не отдается
+    monkeypatch.setattr(result_cache, 'CACHE_VERSION', result_cache.CACHE_VERSION + 1)
+    new_key = ResultCache.make_key(b'document', 'convert')
+    assert new_key != key
+    cache = ResultCache(disk_dir=str(tmp_path))
+    assert cache.get(new_key) is None
+    assert cache.stats()['misses'] == 1
+
+
+def test_disk_tier_is_shared_between_instances(tmp_path):
+    writer = ResultCache(disk_dir=str(tmp_path))
+    writer.put('a', b'value')
+    reader = ResultCache(disk_dir=str(tmp_path))
+    assert reader.get('a') == b'value'
+    # Повторное чтение - из памяти
+    assert reader.get('a') == b'value'
+    stats = reader.stats()
+    assert (stats['hits'], stats['disk_hits'], stats['disk_entries']) == (2, 1, 1)
+
+
+def test_disk_trim_removes_least_recently_used(tmp_path):
+    cache = ResultCache(disk_dir=str(tmp_path), disk_max_bytes=250)
+    cache.put('a', b'a' * 100)
+    cache.put('b', b'b' * 100)
+    now = time.time()
+    os.utime(tmp_path / 'a.cache', (now - 200, now - 200))
+    os.utime(tmp_path / 'b.cache', (now - 100, now - 100))
+
+    # Чтение с диска (другим процессом) обновляет время изменения записи
+    assert ResultCache(disk_dir=str(tmp_path)).get('a') is not None
+    assert os.path.getmtime(tmp_path / 'a.cache') > now - 100
+
+    cache.put('c', b'c' * 100)
+    assert disk_files(tmp_path) == ['a.cache', 'c.cache']
+    assert cache.stats()['disk_bytes'] == 200
+    # Запись в памяти не зависит от дискового уровня
+    assert cache.get('b') == b'b' * 100
+
+
+def test_oversized_items_are_not_stored(tmp_path):
+    cache = ResultCache(max_item_bytes=10, disk_dir=str(tmp_path))
+    cache.put('big', b'x' * 11)
+    assert cache.get('big') is None
+    assert disk_files(tmp_path) == []
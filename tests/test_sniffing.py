@@ -0,0 +1,101 @@
+"""
+Определение версии по началу документа (SNIFF_MAX_SIZE) и переход к полному разбору
+"""
+import io
+
+import pytest
+
+from bpmn_converter import SNIFF_MAX_SIZE, BPMNConverter
+
+BPMN20 = '''<?xml version="1.0" encoding="{encoding}"?>
+{prolog}<bpmn:definitions xmlns:bpmn="http://www.omg.org/spec/BPMN/20100524/MODEL" id="defs">
+  <bpmn:process id="p1"><bpmn:startEvent id="s1" name="Старт"/></bpmn:process>
+</bpmn:definitions>
+'''
+
+BPMN19 = '''<?xml version="1.0" encoding="{encoding}"?>
+{prolog}<definitions xmlns="http://www.omg.org/BPMN20/2009/10/1.0" id="defs">
+  <process id="p1"><startEvent id="s1" name="Старт"/></process>
+</definitions>
+'''
+
+# Корень без namespace BPMN: версию задает дочерний process далеко от начала документа
+LATE_CHILD = '''<?xml version="1.0" encoding="{encoding}"?>
+<definitions id="defs">
+{prolog}  <process id="p1"><startEvent id="s1" name="Старт"/></process>
+</definitions>
+'''
+
+LONG_PROLOG = '<!-- ' + 'x' * SNIFF_MAX_SIZE + ' -->\n'
+
+
+def document(template, encoding='UTF-8', prolog='', bom=False):
+    data = template.format(encoding=encoding, prolog=prolog).encode(encoding)
+    return b'\xef\xbb\xbf' + data if bom else data
+
+
+def convert(backend, data, method='convert_to_bpmn20'):
+    converter = BPMNConverter(backend=backend)
+    output = io.BytesIO()
+    assert getattr(converter, method)(io.BytesIO(data), output), converter.last_error
+    return output.getvalue()
+
+
+@pytest.fixture(params=['stdlib', 'lxml'])
+def backend(request):
+    if request.param == 'lxml':
+        pytest.importorskip('lxml')
+    return request.param
+
+
+@pytest.mark.parametrize('data', [document(BPMN20, bom=True), document(BPMN20, 'UTF-16'),
+                                  document(BPMN20, 'UTF-16LE')],
+                         ids=['utf8-bom', 'utf16', 'utf16le'])
+def test_bom_and_utf16_are_passed_through(backend, data):
+    stream = io.BytesIO(b'junk' + data)
+    stream.seek(4)
+    assert BPMNConverter(backend=backend).sniff_bpmn_version(stream)['version'] == '2.0'
+    # Позиция потока восстанавливается
+    assert stream.tell() == 4
+    for method in ('convert_to_bpmn20', 'convert_to_bpmn20_streaming'):
+        assert convert(backend, data, method) == data, method
+
+
+def test_utf16_bpmn19_is_converted(backend):
+    data = document(BPMN19, 'UTF-16')
+    assert BPMNConverter(backend=backend).sniff_bpmn_version(io.BytesIO(data))['version'] == '1.9'
+    expected = convert(backend, document(BPMN19))
+    assert convert(backend, data) == expected
+    assert convert(backend, data, 'convert_to_bpmn20_streaming') == expected
+
+
+@pytest.mark.parametrize('encoding', ['UTF-8', 'UTF-16'])
+def test_namespace_after_long_prolog(backend, encoding):
+    data = document(BPMN20, encoding, LONG_PROLOG)
+    converter = BPMNConverter(backend=backend)
+    # Начала документа не хватает: версия неизвестна, документ не считается BPMN 2.0
+    assert converter.sniff_bpmn_version(io.BytesIO(data))['version'] is None
+    assert not converter.is_bpmn20(io.BytesIO(data))
+    # Полный разбор определяет 2.0, документ передается без изменений
+    for method in ('convert_to_bpmn20', 'convert_to_bpmn20_streaming', 'convert_to_bpmn20_parallel'):
+        assert convert(backend, data, method) == data, method
+
+    late19 = document(BPMN19, encoding, LONG_PROLOG)
+    assert convert(backend, late19, 'convert_to_bpmn20_streaming') == convert(backend, late19)
+    assert convert(backend, late19) == convert(backend, document(BPMN19))
+
+
+def test_fallback_to_full_detection(backend):
+    data = document(LATE_CHILD, prolog=LONG_PROLOG)
+    converter = BPMNConverter(backend=backend)
+    sniffed = converter.sniff_bpmn_version(io.BytesIO(data))
+    assert sniffed['version'] is None and sniffed['root'] == 'definitions'
+    assert converter._sniff_bpmn_version(io.BytesIO(data))[0] == '1.8/1.9'
+
+    expected = convert(backend, data)
+    assert b'http://www.omg.org/spec/BPMN/20100524/MODEL' in expected
+    assert convert(backend, data, 'convert_to_bpmn20_streaming') == expected
+
+    # Документ прочитан целиком, а версия не определилась
+    unknown = b'<?xml version="1.0"?>\n<definitions id="defs"><item/></definitions>\n'
+    assert converter.sniff_bpmn_version(io.BytesIO(unknown))['version'] == 'unknown'
@@ -0,0 +1,134 @@
+"""
+Одинаковый результат конвертации на бэкендах stdlib и lxml
+"""
+import io
+import os
+
+import pytest
+
+from bpmn_converter import SNIFF_MAX_SIZE, BPMNConverter
+from result_cache import ResultCache
+
+pytest.importorskip('lxml')
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+
+BPMN18 = b'''<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://www.omg.org/BPMN20/2008/06/1.0"
+             xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+             xmlns:bpmndi="http://www.omg.org/spec/BPMN/20100524/DI"
+             xmlns:omgdc="http://www.omg.org/spec/DD/20100524/DC"
+             xmlns:omgdi="http://www.omg.org/spec/DD/20100524/DI"
+             xmlns:ext="http://example.com/ext"
+             targetNamespace="http://example.com/bpmn" id="defs">
+  <process id="p1" name="Order &amp; &quot;delivery&quot;">
+    <startEvent id="start"/>
+    <userTask id="t1" name="Check" ext:priority="high">
+      <documentation>Line one
+line two</documentation>
+    </userTask>
+    <exclusiveGateway id="g1"/>
+    <endEvent id="end"><terminateEventDefinition/></endEvent>
+    <sequenceFlow id="f1" sourceRef="start" targetRef="t1"/>
+    <sequenceFlow id="f2" sourceRef="t1" targetRef="g1"/>
+    <sequenceFlow id="f3" sourceRef="g1" targetRef="end">
+      <conditionExpression xsi:type="tFormalExpression">${x &gt; 1}</conditionExpression>
+    </sequenceFlow>
+  </process>
+  <bpmndi:BPMNDiagram id="d1">
+    <bpmndi:BPMNPlane id="pl1" bpmnElement="p1">
+      <bpmndi:BPMNShape id="t1_di" bpmnElement="t1">
+        <omgdc:Bounds x="100" y="80" width="100" height="80"/>
+      </bpmndi:BPMNShape>
+      <bpmndi:BPMNEdge id="f1_di" bpmnElement="f1">
+        <omgdi:waypoint x="36" y="120"/>
+        <omgdi:waypoint x="100.5" y="120"/>
+      </bpmndi:BPMNEdge>
+    </bpmndi:BPMNPlane>
+  </bpmndi:BPMNDiagram>
+</definitions>
+'''
+
+CUSTOM = b'''<?xml version="1.0" encoding="UTF-8"?>
+<BPMN BPMNVersion="1.9">
+  <BusinessProcessDiagram id="(diag1)">
+    <Name>Custom Diagram</Name>
+    <Processes>
+      <Process id="(p1)">
+        <Tasks>
+          <Task id="(t1)"><Name>Task &amp; "one"</Name></Task>
+        </Tasks>
+        <Events>
+          <StartEvent id="(e1)"><Name>Start</Name></StartEvent>
+          <EndEvent id="(e2)"/>
+        </Events>
+        <Gateways>
+          <Gateway id="(g1)"><Name>Gw</Name></Gateway>
+        </Gateways>
+      </Process>
+    </Processes>
+  </BusinessProcessDiagram>
+</BPMN>
+'''
+
+BPMN20 = b'''<?xml version="1.0" encoding="UTF-8"?>
+<bpmn:definitions xmlns:bpmn="http://www.omg.org/spec/BPMN/20100524/MODEL" id="defs">
+  <bpmn:process id="p1"><bpmn:startEvent id="s1"/></bpmn:process>
+</bpmn:definitions>
+'''
+
+# Корень за пределами начала документа: версия определяется только после разбора
+BPMN20_LATE_ROOT = BPMN20.replace(b'?>\n', b'?>\n<!-- ' + b'x' * SNIFF_MAX_SIZE + b' -->\n', 1)
+
+
+def _example(name: str) -> bytes:
+    with open(os.path.join(EXAMPLES_DIR, name), 'rb') as f:
+        return f.read()
+
+
+DOCUMENTS = {
+    'bpmn18': BPMN18,
+    'bpmn19': _example('example_bpmn19_complex.xml'),
+    'custom': CUSTOM,
+    'bpmn20': BPMN20,
+    'bpmn20_example': _example('example_bpmn18.xml'),
+    'bpmn20_late_root': BPMN20_LATE_ROOT
+}
+
+PASSTHROUGH = {'bpmn20', 'bpmn20_example', 'bpmn20_late_root'}
+
+
+def _convert(backend: str, method: str, document: bytes, pretty: bool) -> bytes:
+    converter = BPMNConverter(backend=backend)
+    output = io.BytesIO()
+    if method == 'incremental':
+        ok = converter.convert_to_bpmn20_incremental(io.BytesIO(document), output, ResultCache(), pretty)
+    else:
+        ok = getattr(converter, f'convert_to_bpmn20{method}')(io.BytesIO(document), output, pretty)
+    assert ok, converter.last_error
+    return output.getvalue()
+
+
+@pytest.mark.parametrize('pretty', [True, False], ids=['pretty', 'compact'])
+@pytest.mark.parametrize('method', ['', '_streaming', '_parallel', 'incremental'],
+                         ids=['tree', 'streaming', 'parallel', 'incremental'])
+@pytest.mark.parametrize('name', sorted(DOCUMENTS))
+def test_backends_produce_identical_output(name, method, pretty):
+    document = DOCUMENTS[name]
+    stdlib_output = _convert('stdlib', method, document, pretty)
+    lxml_output = _convert('lxml', method, document, pretty)
+
+    assert stdlib_output == lxml_output
+    if name in PASSTHROUGH:
+        # Документ BPMN 2.0 передается без изменений
+        assert stdlib_output == document
+    else:
+        assert b'http://www.omg.org/spec/BPMN/20100524/MODEL' in stdlib_output
+
+
+@pytest.mark.parametrize('name', sorted(set(DOCUMENTS) - PASSTHROUGH))
+def test_conversion_methods_agree(name):
+    """Потоковая, параллельная и инкрементальная конвертация совпадают с конвертацией дерева"""
+    expected = _convert('stdlib', '', DOCUMENTS[name], True)
+    for method in ('_streaming', '_parallel', 'incremental'):
+        assert _convert('lxml', method, DOCUMENTS[name], True) == expected, method